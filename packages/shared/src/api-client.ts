@@ -284,19 +284,33 @@ export class APIClient {
 
       if (!reader) return;
 
+      // Events can span reads, and multi-line text arrives as several data: lines
+      let buffer = '';
+      let data: string[] = [];
+      let event = 'message';
+
       while (true) {
         const { done, value } = await reader.read();
         if (done) break;
 
-        const chunk = decoder.decode(value);
-        const lines = chunk.split('\n');
+        buffer += decoder.decode(value, { stream: true });
+        const lines = buffer.split('\n');
+        buffer = lines.pop() ?? '';
 
         for (const line of lines) {
-          if (line.startsWith('data: ')) {
-            const data = line.slice(6);
-            if (data === '[DONE]') return;
-            onChunk(data);
+          if (line === '') {
+            const text = data.join('\n');
+            if (event === 'error') throw new Error(text);
+            if (text === '[DONE]') return;
+            if (data.length) onChunk(text);
+            data = [];
+            event = 'message';
+          } else if (line.startsWith('data:')) {
+            data.push(line.slice(line.startsWith('data: ') ? 6 : 5));
+          } else if (line.startsWith('event:')) {
+            event = line.slice(6).trim();
           }
+          // id: lines (resume offsets) and : heartbeats need no handling here
         }
       }
     }
@@ -2,6 +2,7 @@
 Django settings for backend project.
 """
 
+import json
 import os
 from pathlib import Path
 from datetime import timedelta
@@ -25,6 +26,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
+    'django.contrib.postgres',
     
     # Third-party
     'rest_framework',
@@ -164,6 +166,92 @@ CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
+# Generations are long-running: take one task at a time, ack after it finishes
+CELERY_WORKER_PREFETCH_MULTIPLIER = 1
+# Interactive generations get their own queue so bulk jobs can't delay them;
+# bulk work is sent to AI_BULK_QUEUE explicitly
+AI_INTERACTIVE_QUEUE = 'ai_interactive'
+AI_BULK_QUEUE = 'ai_bulk'
+CELERY_TASK_ROUTES = {
+    'core.tasks.generate_ai_response_task': {'queue': AI_INTERACTIVE_QUEUE},
+    'core.tasks.run_ai_batch_job': {'queue': AI_BULK_QUEUE},
+}
+# Run with `celery -A backend beat` (or a worker started with -B)
+CELERY_BEAT_SCHEDULE = {
+    'resume-stale-ai-jobs': {
+        'task': 'core.tasks.resume_stale_ai_jobs',
+        'schedule': float(os.environ.get('AI_BATCH_STALE_CHECK_INTERVAL', '60')),
+    },
+}
+
+# Cache: Redis when CACHE_URL is set (docker compose), otherwise in-process
+# so local runs and tests don't need Redis
+CACHE_URL = os.environ.get('CACHE_URL', '')
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'studytree',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+# Cache (user, tree) -> role lookups across requests; only useful with a
+# shared (Redis) cache
+TREE_ROLE_CACHE_ENABLED = os.environ.get('TREE_ROLE_CACHE_ENABLED', 'False') == 'True'
+TREE_ROLE_CACHE_TIMEOUT = int(os.environ.get('TREE_ROLE_CACHE_TIMEOUT', '300'))
+
+# Node context read-model in Redis for the FastAPI service (plain JSON, not pickled)
+NODE_CONTEXT_PROJECTION_ENABLED = os.environ.get('NODE_CONTEXT_PROJECTION_ENABLED', 'True') == 'True'
+NODE_CONTEXT_REDIS_URL = os.environ.get('NODE_CONTEXT_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+NODE_CONTEXT_TTL = int(os.environ.get('NODE_CONTEXT_TTL', '86400'))
+NODE_CONTEXT_MAX_CHILDREN = int(os.environ.get('NODE_CONTEXT_MAX_CHILDREN', '50'))
+
+# Background AI generation (Celery workers)
+AI_PROVIDER = os.environ.get('AI_PROVIDER', 'stub')
+AI_API_KEY = os.environ.get('AI_API_KEY', '')
+AI_MODEL = os.environ.get('AI_MODEL', '')
+AI_BASE_URL = os.environ.get('AI_BASE_URL', '')
+AI_ANTHROPIC_VERSION = os.environ.get('AI_ANTHROPIC_VERSION', '2023-06-01')
+AI_MAX_TOKENS = int(os.environ.get('AI_MAX_TOKENS', '1024'))
+AI_TIMEOUT = float(os.environ.get('AI_TIMEOUT', '60'))
+AI_CONNECT_TIMEOUT = float(os.environ.get('AI_CONNECT_TIMEOUT', '5'))
+AI_STUB_CHUNK_DELAY = float(os.environ.get('AI_STUB_CHUNK_DELAY', '0.01'))
+# Concurrent generations per provider across all workers, e.g. {"openai": 16}
+AI_PROVIDER_CONCURRENCY = json.loads(os.environ.get('AI_PROVIDER_CONCURRENCY') or '{"openai": 16, "anthropic": 16}')
+AI_PROVIDER_BUSY_RETRY_DELAY = int(os.environ.get('AI_PROVIDER_BUSY_RETRY_DELAY', '5'))
+AI_PROVIDER_BUSY_MAX_RETRIES = int(os.environ.get('AI_PROVIDER_BUSY_MAX_RETRIES', '120'))
+# Upper bound on one generation; provider slots and claims expire after it
+AI_GENERATION_TIMEOUT = int(os.environ.get('AI_GENERATION_TIMEOUT', '600'))
+# Whole-tree AI batch jobs: concurrent provider calls per job, results per write
+AI_BATCH_CONCURRENCY = int(os.environ.get('AI_BATCH_CONCURRENCY', '8'))
+AI_BATCH_WRITE_SIZE = int(os.environ.get('AI_BATCH_WRITE_SIZE', '50'))
+AI_BATCH_WRITE_INTERVAL = float(os.environ.get('AI_BATCH_WRITE_INTERVAL', '10'))
+AI_BATCH_STALE_AFTER = int(os.environ.get('AI_BATCH_STALE_AFTER', '300'))
+# A running job renews its claim every write interval; keep it below
+# AI_BATCH_STALE_AFTER so a job that looks stale can always be claimed again
+AI_BATCH_CLAIM_TIMEOUT = int(os.environ.get('AI_BATCH_CLAIM_TIMEOUT', '120'))
+AI_BATCH_MAX_NODES = int(os.environ.get('AI_BATCH_MAX_NODES', '5000'))
+# Progress buffer shared with FastAPI's /ai/streams/{request_id}
+AI_STREAM_REDIS_URL = os.environ.get('AI_STREAM_REDIS_URL', os.environ.get('REDIS_URL', 'redis://localhost:6379/0'))
+AI_STREAM_RESUME_TTL = int(os.environ.get('AI_STREAM_RESUME_TTL', '300'))
+AI_STREAM_FLUSH_INTERVAL = float(os.environ.get('AI_STREAM_FLUSH_INTERVAL', '0.05'))
+
+# AI message retention: most specific matching policy wins, e.g.
+# [{"days": 90}, {"type": "quiz", "days": 30}, {"tree": 12, "days": null}]
+AI_MESSAGE_RETENTION = json.loads(os.environ.get('AI_MESSAGE_RETENTION') or '[{"days": 90}]')
+AI_MESSAGE_CLEANUP_BATCH_SIZE = int(os.environ.get('AI_MESSAGE_CLEANUP_BATCH_SIZE', '1000'))
+AI_MESSAGE_CLEANUP_SLEEP = float(os.environ.get('AI_MESSAGE_CLEANUP_SLEEP', '0.1'))
+AI_MESSAGE_CLEANUP_MAX_SECONDS = int(os.environ.get('AI_MESSAGE_CLEANUP_MAX_SECONDS', '3600'))
+# Monthly partitions of the AI message table (Postgres), once converted with
+# create_ai_message_partitions --convert; see core/partitions.py
+AI_MESSAGE_PARTITION_PREMAKE = int(os.environ.get('AI_MESSAGE_PARTITION_PREMAKE', '3'))
 
 # Service Token for FastAPI
 FASTAPI_SERVICE_TOKEN = os.environ.get('FASTAPI_SERVICE_TOKEN', 'service-token-change-in-prod')
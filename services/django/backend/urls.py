@@ -12,6 +12,11 @@ from core.views import (
     TreeViewSet,
     NodeViewSet,
     AIMessageViewSet,
+    AIMessageIngestView,
+    AIBatchJobViewSet,
+    TokenUsageView,
+    SearchView,
+    NodeContextView,
     MeView,
     TreeInviteView,
 )
@@ -20,12 +25,17 @@ router = routers.DefaultRouter()
 router.register(r'trees', TreeViewSet, basename='tree')
 router.register(r'nodes', NodeViewSet, basename='node')
 router.register(r'ai-messages', AIMessageViewSet, basename='aimessage')
+router.register(r'ai-jobs', AIBatchJobViewSet, basename='aibatchjob')
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/auth/token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
     path('api/auth/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('api/me/', MeView.as_view(), name='me'),
+    path('api/usage/', TokenUsageView.as_view(), name='token-usage'),
+    path('api/search/', SearchView.as_view(), name='search'),
     path('api/trees/<int:pk>/invite/', TreeInviteView.as_view(), name='tree-invite'),
+    path('api/internal/nodes/<int:pk>/context/', NodeContextView.as_view(), name='node-context'),
+    path('api/internal/ai-messages/bulk/', AIMessageIngestView.as_view(), name='aimessage-ingest'),
     path('api/', include(router.urls)),
 ]
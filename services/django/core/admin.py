@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Tree, TreeMember, Node, AIMessage
+from .models import Tree, TreeMember, Node, AIMessage, AIBatchJob, TokenUsage
 
 
 @admin.register(Tree)
@@ -28,3 +28,17 @@ class AIMessageAdmin(admin.ModelAdmin):
     list_display = ['node', 'type', 'model_name', 'tokens_in', 'tokens_out', 'created_at']
     list_filter = ['type', 'created_at']
     search_fields = ['node__title', 'prompt', 'response']
+
+
+
+@admin.register(AIBatchJob)
+class AIBatchJobAdmin(admin.ModelAdmin):
+    list_display = ['tree', 'root', 'type', 'status', 'completed', 'failed', 'total', 'created_at']
+    list_filter = ['status', 'type', 'created_at']
+    search_fields = ['tree__title']
+
+@admin.register(TokenUsage)
+class TokenUsageAdmin(admin.ModelAdmin):
+    list_display = ['day', 'user', 'tree', 'messages', 'tokens_in', 'tokens_out']
+    list_filter = ['day']
+    search_fields = ['user__username']
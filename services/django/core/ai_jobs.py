@@ -0,0 +1,264 @@
+"""
+Whole-tree (or subtree) batch AI generation.
+
+A job loads every target node in one query and builds each prompt from
+that in-memory tree (title, notes, ancestor path, subtopics), so there is
+no per-node context fetch. Provider calls run on a bounded thread pool
+(``AI_BATCH_CONCURRENCY``, within the provider's slot limit), and
+results are written in batches: messages through ``ingest_ai_messages``
+and, if requested, ``ai_notes`` with one ``bulk_update``.
+
+Every node's message has a deterministic request_id, so re-running a job
+after a worker crash skips the nodes that were already written. A running
+job holds a claim (``AI_BATCH_CLAIM_TIMEOUT``) that it renews on every
+write, so a second delivery of the same job waits instead of running it
+twice.
+"""
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import logging
+import time
+
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+
+from .generation import (
+    ProviderBusy, claim_generation, extend_generation_claim, provider_slot, release_generation,
+)
+from .ingest import ingest_ai_messages, INVALID
+from .llm import LLMProviderError, get_llm_client
+from .models import AIBatchJob, AIMessage, Node
+from .usage import count_tokens
+from . import node_context
+
+logger = logging.getLogger(__name__)
+
+NOTES_CHARS = 4000
+MAX_SUBTOPICS = 20
+
+
+class JobClaimed(Exception):
+    """Another worker holds the job's claim; try again once it expires."""
+
+
+PROMPTS = {
+    'explain': (
+        "Please provide a detailed explanation of the following topic:\n\n{context}\n"
+        "Provide a clear, comprehensive explanation suitable for learning and studying."
+    ),
+    'quiz': (
+        "Based on the following topic, generate 5 quiz questions to test understanding:\n\n{context}\n"
+        "Format each question clearly with multiple choice options (A, B, C, D) and indicate the correct answer."
+    ),
+    'summarize': (
+        "Please provide a concise summary of the following:\n\n{context}\n"
+        "Focus on the key points and main ideas."
+    ),
+}
+
+
+def build_prompt(job, node, titles, children):
+    """Prompt for ``node`` using the titles of the nodes loaded for the job."""
+    lines = [f"Title: {node.title}"]
+    if node.user_notes:
+        lines.append(f"Notes: {node.user_notes[:NOTES_CHARS]}")
+    path = [titles[pk] for pk in node.ancestor_ids if pk in titles]
+    if path:
+        lines.append("Path: " + " > ".join(path))
+    subtopics = children.get(node.id, [])[:MAX_SUBTOPICS]
+    if subtopics:
+        lines.append("Subtopics:")
+        lines.extend(f"- {child.title}" for child in subtopics)
+    if job.additional_context:
+        lines.append(f"Additional Context: {job.additional_context}")
+    return PROMPTS[job.type].format(context="\n".join(lines) + "\n")
+
+
+def target_nodes(job):
+    """Nodes the job covers, parents before children."""
+    if job.root_id is not None:
+        nodes = job.root.subtree()
+    else:
+        nodes = Node.objects.filter(tree_id=job.tree_id)
+    return nodes.defer('search_vector').order_by('depth', 'sibling_order', 'id')
+
+
+def _generate(client, prompt):
+    """Response text and token usage for one prompt, waiting for a provider slot."""
+    usage = {}
+    while True:
+        try:
+            with provider_slot(client.provider):
+                response = ''.join(client.stream(prompt, usage))
+            break
+        except ProviderBusy:
+            time.sleep(settings.AI_PROVIDER_BUSY_RETRY_DELAY)
+    return response, usage
+
+
+class _Writer:
+    """Buffers results and writes them (plus progress) in batches."""
+
+    def __init__(self, job, model_name, claim_key):
+        self.job = job
+        self.claim_key = claim_key
+        self.model_name = model_name
+        self.items = []
+        self.nodes = []
+        self.failed = 0
+        self.last_write = time.monotonic()
+
+    def add(self, node, prompt, response, usage):
+        self.items.append({
+            'node': node.id,
+            'type': self.job.type,
+            'prompt': prompt,
+            'response': response,
+            'model_name': self.model_name,
+            'tokens_in': usage.get('input_tokens') or count_tokens(prompt, self.model_name),
+            'tokens_out': usage.get('output_tokens') or count_tokens(response, self.model_name),
+            'request_id': self.job.message_request_id(node.id),
+            'created_by': self.job.created_by_id,
+        })
+        if self.job.save_to_notes:
+            node.ai_notes = response
+            self.nodes.append(node)
+
+    def due(self):
+        # Also write (renewing the claim and updated_at) while nothing has
+        # finished, so a job busy with slow calls doesn't look stale
+        return (
+            len(self.items) + self.failed >= settings.AI_BATCH_WRITE_SIZE
+            or time.monotonic() - self.last_write >= settings.AI_BATCH_WRITE_INTERVAL
+        )
+
+    def write(self):
+        """Store buffered results; returns the job's current status."""
+        written = 0
+        if self.items:
+            results = ingest_ai_messages(self.items)
+            written = sum(result['status'] != INVALID for result in results)
+            # Nodes deleted since the job started come back invalid
+            self.failed += len(results) - written
+        if self.nodes:
+            now = timezone.now()
+            for node in self.nodes:
+                node.updated_at = now
+            Node.objects.bulk_update(self.nodes, ['ai_notes', 'updated_at'], batch_size=500)
+            node_context.project_nodes(self.nodes)
+
+        AIBatchJob.objects.filter(pk=self.job.pk).update(
+            completed=F('completed') + written,
+            failed=F('failed') + self.failed,
+            updated_at=timezone.now(),
+        )
+        extend_generation_claim(self.claim_key, settings.AI_BATCH_CLAIM_TIMEOUT)
+        self.items, self.nodes, self.failed = [], [], 0
+        self.last_write = time.monotonic()
+        return AIBatchJob.objects.values_list('status', flat=True).get(pk=self.job.pk)
+
+
+def run_job(job_id):
+    """
+    Process a job's remaining nodes. Returns the job's final status.
+    
+    Raises JobClaimed if the job is pending (e.g. just resumed) but another
+    worker still holds its claim.
+    """
+    job = AIBatchJob.objects.select_related('root').get(pk=job_id)
+    if job.status not in AIBatchJob.ACTIVE_STATUSES:
+        return job.status
+    claim_key = f'job:{job.pk}'
+    if not claim_generation(claim_key, settings.AI_BATCH_CLAIM_TIMEOUT):
+        if job.status == AIBatchJob.RUNNING:
+            logger.info(f"AI batch job {job.pk} is already running")
+            return job.status
+        # The previous run stops at its next write (the job is no longer
+        # running) or its claim expires
+        raise JobClaimed(f"AI batch job {job.pk} is still claimed")
+
+    try:
+        return _run(job, claim_key)
+    except Exception as exc:
+        logger.error(f"AI batch job {job.pk} failed: {exc}")
+        AIBatchJob.objects.filter(pk=job.pk).update(
+            status=AIBatchJob.FAILED, error=str(exc)[:1000], finished_at=timezone.now()
+        )
+        raise
+    finally:
+        release_generation(claim_key)
+
+
+def _run(job, claim_key):
+    nodes = list(target_nodes(job))
+    titles = {node.id: node.title for node in nodes}
+    if job.root_id is not None:
+        # The subtree root's own ancestors belong in every prompt's path
+        titles.update(Node.objects.filter(pk__in=job.root.ancestor_ids).values_list('id', 'title'))
+    children = {}
+    for node in nodes:
+        children.setdefault(node.parent_id, []).append(node)
+
+    # Resume: skip nodes whose message a previous run already stored
+    done = set()
+    request_ids = [job.message_request_id(node.id) for node in nodes]
+    for start in range(0, len(request_ids), 1000):
+        done.update(AIMessage.objects.filter(
+            request_id__in=request_ids[start:start + 1000]
+        ).values_list('node_id', flat=True))
+    remaining = [node for node in nodes if node.id not in done]
+
+    AIBatchJob.objects.filter(pk=job.pk).update(
+        status=AIBatchJob.RUNNING, total=len(nodes), completed=len(done),
+        failed=0, error='', finished_at=None, updated_at=timezone.now(),
+    )
+    logger.info(f"AI batch job {job.pk}: {len(remaining)} of {len(nodes)} nodes to generate")
+
+    client = get_llm_client()
+    writer = _Writer(job, client.model_name, claim_key)
+    status = AIBatchJob.RUNNING
+    todo = iter(remaining)
+    with ThreadPoolExecutor(max_workers=settings.AI_BATCH_CONCURRENCY) as pool:
+        in_flight = {}
+
+        def submit_next():
+            node = next(todo, None)
+            if node is not None:
+                prompt = build_prompt(job, node, titles, children)
+                in_flight[pool.submit(_generate, client, prompt)] = (node, prompt)
+
+        for _ in range(settings.AI_BATCH_CONCURRENCY):
+            submit_next()
+        try:
+            while in_flight:
+                finished, _ = wait(
+                    in_flight, timeout=settings.AI_BATCH_WRITE_INTERVAL, return_when=FIRST_COMPLETED
+                )
+                for future in finished:
+                    node, prompt = in_flight.pop(future)
+                    try:
+                        response, usage = future.result()
+                        writer.add(node, prompt, response, usage)
+                    except LLMProviderError as exc:
+                        logger.warning(f"AI batch job {job.pk}: node {node.id} failed: {exc}")
+                        writer.failed += 1
+                    if status == AIBatchJob.RUNNING:
+                        submit_next()
+                if writer.due():
+                    status = writer.write()
+                    if status != AIBatchJob.RUNNING:
+                        # Cancelled: let in-flight calls finish, start no more
+                        logger.info(f"AI batch job {job.pk} stopped ({status})")
+        except Exception:
+            # Keep what was already generated; a resumed run skips those nodes
+            writer.write()
+            raise
+    if writer.items or writer.failed:
+        status = writer.write()
+
+    if status == AIBatchJob.RUNNING:
+        status = AIBatchJob.DONE
+        AIBatchJob.objects.filter(pk=job.pk, status=AIBatchJob.RUNNING).update(
+            status=status, finished_at=timezone.now()
+        )
+    return status
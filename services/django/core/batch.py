@@ -0,0 +1,192 @@
+"""
+Batch create/update/move/delete of nodes within a single tree.
+
+Operations are applied in phases inside one transaction: creates (one
+``bulk_create`` per nesting level, so parents get ids before children),
+field updates (one ``bulk_update``), moves, and finally deletes. A node's
+parent only changes through a move, which rewrites the subtree's paths.
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from .models import Node
+from . import node_context
+
+UPDATABLE_FIELDS = ['title', 'user_notes', 'ai_notes', 'sibling_order']
+
+
+def _resolve_parent(ref, temp_ids, existing):
+    """
+    Turn a parent reference into ('temp', temp_id), ('node', Node) or None.
+
+    References that match a temp_id created in this batch win over ids.
+    """
+    if ref is None or ref == '':
+        return None
+    if ref in temp_ids:
+        return ('temp', ref)
+    try:
+        pk = int(ref)
+    except (TypeError, ValueError):
+        raise ValidationError({'parent': f'Unknown parent reference "{ref}".'})
+    if pk not in existing:
+        raise ValidationError({'parent': f'Node {pk} does not belong to this tree.'})
+    return ('node', existing[pk])
+
+
+def _create_nodes(tree, user, creates, existing):
+    """Insert new nodes level by level and return {temp_id: Node}."""
+    temp_ids = {op['temp_id'] for op in creates}
+    parent_refs = {
+        op['temp_id']: _resolve_parent(op.get('parent'), temp_ids, existing)
+        for op in creates
+    }
+
+    # Nesting level within the batch: nodes under existing parents are level 0
+    levels = {}
+    for op in creates:
+        chain = []
+        base = -1
+        temp_id = op['temp_id']
+        while temp_id is not None:
+            if temp_id in levels:
+                base = levels[temp_id]
+                break
+            if temp_id in chain:
+                raise ValidationError({'parent': 'Created nodes cannot form a cycle.'})
+            chain.append(temp_id)
+            ref = parent_refs[temp_id]
+            temp_id = ref[1] if ref is not None and ref[0] == 'temp' else None
+        for offset, pending in enumerate(reversed(chain), start=1):
+            levels[pending] = base + offset
+
+    created = {}
+    by_level = {}
+    for op in creates:
+        by_level.setdefault(levels[op['temp_id']], []).append(op)
+
+    for level in sorted(by_level):
+        batch = []
+        for op in by_level[level]:
+            ref = parent_refs[op['temp_id']]
+            if ref is None:
+                parent = None
+            elif ref[0] == 'node':
+                parent = ref[1]
+            else:
+                parent = created[ref[1]]
+            batch.append(Node(
+                tree=tree,
+                parent=parent,
+                title=op['title'],
+                user_notes=op.get('user_notes', ''),
+                ai_notes=op.get('ai_notes', ''),
+                sibling_order=op.get('sibling_order', 0),
+                created_by=user,
+            ))
+        Node.objects.bulk_create(batch)
+        for op, node in zip(by_level[level], batch):
+            # Parents were handled in an earlier level, so their paths are set
+            node.path = node.build_path()
+            node.depth = node.path.count(Node.PATH_SEPARATOR) - 1
+            created[op['temp_id']] = node
+
+    Node.objects.bulk_update(created.values(), ['path', 'depth'], batch_size=1000)
+    return created
+
+
+def apply_node_batch(tree, user, operations):
+    """
+    Apply a validated list of node operations to ``tree``.
+
+    Permissions are expected to have been checked once by the caller.
+    Returns a summary including the temp_id -> id mapping for new nodes.
+    """
+    creates = [op for op in operations if op['op'] == 'create']
+    updates = [op for op in operations if op['op'] == 'update']
+    moves = [op for op in operations if op['op'] == 'move']
+    deletes = [op for op in operations if op['op'] == 'delete']
+
+    # Every existing node the batch touches, loaded in one query
+    referenced_ids = {op['id'] for op in operations if 'id' in op}
+    for op in creates + moves:
+        parent = op.get('parent')
+        if parent and parent.isdigit():
+            referenced_ids.add(int(parent))
+    existing = {node.id: node for node in tree.nodes.filter(id__in=referenced_ids)}
+
+    for op in updates + moves + deletes:
+        if op['id'] not in existing:
+            raise ValidationError({'id': f"Node {op['id']} does not belong to this tree."})
+
+    with transaction.atomic():
+        created = _create_nodes(tree, user, creates, existing)
+
+        # Plain field updates
+        changed = {}
+        for op in updates:
+            node = existing[op['id']]
+            for field in UPDATABLE_FIELDS:
+                if field in op:
+                    setattr(node, field, op[field])
+            changed[node.id] = node
+        if changed:
+            now = timezone.now()
+            for node in changed.values():
+                node.updated_at = now
+            Node.objects.bulk_update(
+                changed.values(), UPDATABLE_FIELDS + ['updated_at'], batch_size=1000
+            )
+
+        # Moves rewrite subtree paths, so they run one at a time on fresh paths
+        temp_ids = set(created)
+        for op in moves:
+            node = existing[op['id']]
+            node.refresh_from_db(fields=['path', 'depth'])
+            ref = _resolve_parent(op['parent'], temp_ids, existing)
+            if ref is None:
+                parent = None
+            elif ref[0] == 'temp':
+                parent = created[ref[1]]
+            else:
+                parent = ref[1]
+
+            if parent is not None:
+                parent.refresh_from_db(fields=['path', 'depth'])
+                if node.subtree_contains(parent):
+                    raise ValidationError({'parent': f'Node {node.id} cannot be moved into its own subtree.'})
+
+            node.parent = parent
+            if 'sibling_order' in op:
+                node.sibling_order = op['sibling_order']
+            node.save(update_fields=['parent', 'sibling_order', 'updated_at'])
+
+        delete_ids = [op['id'] for op in deletes]
+        if delete_ids:
+            # Same path-prefix delete as a single node's; paths are re-read
+            # since moves above may have changed them
+            Node.subtrees(tree.nodes.filter(id__in=delete_ids).only('id', 'tree_id', 'path')).delete()
+
+        # Bulk writes skip post_save, so refresh the context read-model here
+        # (moves and deletes went through signals)
+        renamed = [existing[op['id']] for op in updates if 'title' in op]
+        other_ids = [node.id for node in created.values()] + [
+            op['id'] for op in updates if 'title' not in op
+        ]
+        # Parents list their children's titles and order
+        other_ids += [node.parent_id for node in created.values()]
+        other_ids += [existing[op['id']].parent_id for op in updates]
+
+        def refresh_projections():
+            node_context.project_subtrees(renamed)
+            node_context.project_node_ids(other_ids)
+
+        transaction.on_commit(refresh_projections)
+
+    return {
+        'created': {temp_id: node.id for temp_id, node in created.items()},
+        'updated': [op['id'] for op in updates],
+        'moved': [op['id'] for op in moves],
+        'deleted': delete_ids,
+    }
@@ -0,0 +1,50 @@
+"""
+Streaming exports of whole trees.
+
+Nodes are read with a server-side cursor and written one JSON object per
+line, so memory stays flat no matter how large the tree is.
+"""
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models.functions import Collate
+
+from .models import Node
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_FIELDS = [
+    'id', 'parent_id', 'title', 'user_notes', 'ai_notes',
+    'sibling_order', 'depth', 'created_by_id', 'created_at', 'updated_at',
+]
+
+
+def iter_tree_ndjson(tree, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Yield a tree's nodes as NDJSON lines.
+
+    Nodes are written in path order, read straight from an index so the
+    first rows go out without sorting the tree. Parents always come before
+    their children, so clients can rebuild the tree in a single pass;
+    siblings are ordered by ``sibling_order`` on the client.
+    """
+    rows = (
+        Node.objects.filter(tree=tree)
+        # Byte order: '/' sorts before digits, so a subtree follows its root
+        .order_by(Collate('path', 'C'))
+        .values(*EXPORT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    for row in rows:
+        yield json.dumps({
+            'id': row['id'],
+            'parent': row['parent_id'],
+            'title': row['title'],
+            'user_notes': row['user_notes'],
+            'ai_notes': row['ai_notes'],
+            'sibling_order': row['sibling_order'],
+            'depth': row['depth'],
+            'created_by': row['created_by_id'],
+            'created_at': row['created_at'],
+            'updated_at': row['updated_at'],
+        }, cls=DjangoJSONEncoder) + '\n'
@@ -0,0 +1,151 @@
+"""
+Background AI generation support for Celery workers.
+
+- ``provider_slot`` caps concurrent generations per provider across all
+  workers (``AI_PROVIDER_CONCURRENCY``) with a Redis sorted set of
+  expiring slots, so a crashed worker's slot frees itself.
+- ``claim_generation`` makes sure only one worker generates a given
+  ``request_id`` at a time; the unique constraint on
+  ``AIMessage.request_id`` makes the final write idempotent.
+- ``Progress`` publishes the response text as it's generated to the same
+  Redis buffer FastAPI's SSE stage uses, so clients follow a background
+  generation through ``GET /ai/streams/{request_id}``.
+"""
+from contextlib import contextmanager
+import logging
+import time
+import uuid
+
+import redis
+from django.conf import settings
+
+STREAM_PREFIX = 'ai_stream:'
+SLOT_PREFIX = 'ai_provider_slots:'
+CLAIM_PREFIX = 'ai_generation:'
+
+logger = logging.getLogger(__name__)
+
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+_client = None
+
+# Drop expired slots, then take one if any are free. Uses Redis' clock so
+# workers' clocks don't have to agree.
+_ACQUIRE_SLOT = """
+local now = redis.call('TIME')
+local now_ms = now[1] * 1000 + math.floor(now[2] / 1000)
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_ms)
+if redis.call('ZCARD', KEYS[1]) >= tonumber(ARGV[2]) then
+    return 0
+end
+redis.call('ZADD', KEYS[1], now_ms + tonumber(ARGV[3]), ARGV[1])
+redis.call('PEXPIRE', KEYS[1], ARGV[3])
+return 1
+"""
+
+
+def get_redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.AI_STREAM_REDIS_URL, decode_responses=True)
+    return _client
+
+
+class ProviderBusy(Exception):
+    """Every generation slot for the provider is taken."""
+
+
+@contextmanager
+def provider_slot(provider):
+    """Hold one of ``provider``'s generation slots, or raise ``ProviderBusy``."""
+    limit = settings.AI_PROVIDER_CONCURRENCY.get(provider)
+    if not limit:
+        yield
+        return
+
+    key = f'{SLOT_PREFIX}{provider}'
+    token = uuid.uuid4().hex
+    ttl_ms = settings.AI_GENERATION_TIMEOUT * 1000
+    client = get_redis()
+    if not client.eval(_ACQUIRE_SLOT, 1, key, token, limit, ttl_ms):
+        raise ProviderBusy(provider)
+    try:
+        yield
+    finally:
+        try:
+            client.zrem(key, token)
+        except redis.RedisError as e:
+            # The slot expires on its own
+            logger.warning(f'Redis error releasing provider slot: {e}')
+
+
+def claim_generation(request_id, timeout=None):
+    """Whether this worker may generate ``request_id`` (no one else is)."""
+    return bool(get_redis().set(
+        f'{CLAIM_PREFIX}{request_id}', '1', nx=True, ex=timeout or settings.AI_GENERATION_TIMEOUT
+    ))
+
+
+def extend_generation_claim(request_id, timeout=None):
+    """Keep a long-running claim (e.g. a batch job's) from expiring."""
+    try:
+        get_redis().expire(f'{CLAIM_PREFIX}{request_id}', timeout or settings.AI_GENERATION_TIMEOUT)
+    except redis.RedisError as e:
+        logger.warning(f'Redis error extending generation claim: {e}')
+
+
+def release_generation(request_id):
+    try:
+        get_redis().delete(f'{CLAIM_PREFIX}{request_id}')
+    except redis.RedisError as e:
+        logger.warning(f'Redis error releasing generation claim: {e}')
+
+
+class Progress:
+    """Publishes a generation's status and text for clients to follow."""
+
+    def __init__(self, request_id, user_id):
+        self.request_id = request_id
+        self.user_id = str(user_id)
+        self.text_key = f'{STREAM_PREFIX}{request_id}:text'
+        self.meta_key = f'{STREAM_PREFIX}{request_id}:meta'
+        self.unsaved = []
+        self.last_flush = time.monotonic()
+        self.published = False
+
+    def _save(self, status, **fields):
+        ttl = settings.AI_STREAM_RESUME_TTL
+        try:
+            pipe = get_redis().pipeline(transaction=True)
+            if self.unsaved:
+                pipe.append(self.text_key, ''.join(self.unsaved))
+                pipe.expire(self.text_key, ttl)
+            pipe.hset(self.meta_key, mapping={'user_id': self.user_id, 'status': status, **fields})
+            pipe.expire(self.meta_key, ttl)
+            pipe.execute()
+        except redis.RedisError as e:
+            # Chunks stay buffered for the next flush; followers fall behind,
+            # but the message is still saved
+            logger.warning(f'Redis error publishing AI progress: {e}')
+        else:
+            if self.unsaved:
+                self.published = True
+            self.unsaved = []
+        self.last_flush = time.monotonic()
+
+    def start(self):
+        self._save(RUNNING)
+
+    def append(self, chunk):
+        self.unsaved.append(chunk)
+        if time.monotonic() - self.last_flush >= settings.AI_STREAM_FLUSH_INTERVAL:
+            self._save(RUNNING)
+
+    def finish(self, message_id):
+        self._save(DONE, message_id=message_id)
+
+    def fail(self, error):
+        self._save(FAILED, error=error)
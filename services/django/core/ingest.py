@@ -0,0 +1,154 @@
+"""
+Bulk ingestion of AI messages from internal services.
+
+Each message is validated on its own, node and user references for the
+whole batch are checked with one query each, and the valid messages are
+inserted with ``INSERT ... ON CONFLICT DO NOTHING RETURNING``.
+``request_id`` is unique, so messages that were already stored (client
+retries, even concurrent ones) are reported as duplicates instead of
+failing the batch, and only rows actually written count as created.
+Token usage of the new messages is added to the rollup in the same
+transaction.
+"""
+from django.contrib.auth.models import User
+from django.db import IntegrityError, connection, transaction
+
+from .models import Node, AIMessage
+from .serializers import AIMessageIngestSerializer
+from .usage import record_usage
+
+CREATED = 'created'
+DUPLICATE = 'duplicate'
+INVALID = 'invalid'
+
+INSERT_BATCH_SIZE = 500
+
+
+def _stored_ids(request_ids):
+    return dict(AIMessage.objects.filter(request_id__in=request_ids).values_list('request_id', 'id'))
+
+
+def _insert_new(messages):
+    """
+    Insert ``messages``, skipping request_ids that are already stored.
+
+    Returns ``{request_id: id}`` for the rows actually written. Unlike
+    ``bulk_create(ignore_conflicts=True)``, ``RETURNING`` tells a row stored
+    here apart from one a concurrent request stored first.
+    """
+    fields = [
+        field for field in AIMessage._meta.concrete_fields
+        if not field.primary_key and field.name != 'search_vector'
+    ]
+    table = connection.ops.quote_name(AIMessage._meta.db_table)
+    columns = ', '.join(connection.ops.quote_name(field.column) for field in fields)
+    row = '(' + ', '.join(['%s'] * len(fields)) + ')'
+
+    written = {}
+    with connection.cursor() as cursor:
+        for start in range(0, len(messages), INSERT_BATCH_SIZE):
+            batch = messages[start:start + INSERT_BATCH_SIZE]
+            params = [
+                field.get_db_prep_save(field.pre_save(message, True), connection)
+                for message in batch for field in fields
+            ]
+            cursor.execute(
+                f'INSERT INTO {table} ({columns}) VALUES {", ".join([row] * len(batch))} '
+                f'ON CONFLICT DO NOTHING RETURNING id, request_id',
+                params,
+            )
+            written.update((request_id, pk) for pk, request_id in cursor.fetchall())
+    for message in messages:
+        message.pk = written.get(message.request_id)
+    return written
+
+
+def ingest_ai_messages(items):
+    """
+    Store a list of raw message dicts.
+
+    Returns one ``{'request_id', 'status', ...}`` result per item, in order.
+    Stored messages include their ``id``; invalid ones include ``errors``.
+    """
+    try:
+        return _ingest(items)
+    except IntegrityError:
+        # On a partitioned table a concurrent duplicate raises instead of
+        # being skipped (see partitions.py); the second pass reports it
+        return _ingest(items)
+
+
+def _ingest(items):
+    results = [None] * len(items)
+    valid = {}
+    for index, item in enumerate(items):
+        serializer = AIMessageIngestSerializer(data=item)
+        if serializer.is_valid():
+            valid[index] = serializer.validated_data
+        else:
+            results[index] = {
+                'request_id': item.get('request_id'),
+                'status': INVALID,
+                'errors': serializer.errors,
+            }
+
+    node_trees = dict(Node.objects.filter(
+        id__in={data['node'] for data in valid.values()}
+    ).values_list('id', 'tree_id'))
+    user_ids = set(User.objects.filter(
+        id__in={data['created_by'] for data in valid.values() if data['created_by'] is not None}
+    ).values_list('id', flat=True))
+    stored = _stored_ids({data['request_id'] for data in valid.values()})
+
+    to_create = {}
+    for index, data in valid.items():
+        request_id = data['request_id']
+        if data['node'] not in node_trees:
+            errors = {'node': [f"Node {data['node']} does not exist."]}
+        elif data['created_by'] is not None and data['created_by'] not in user_ids:
+            errors = {'created_by': [f"User {data['created_by']} does not exist."]}
+        else:
+            errors = None
+
+        if errors:
+            results[index] = {'request_id': request_id, 'status': INVALID, 'errors': errors}
+        elif request_id in stored or request_id in to_create:
+            results[index] = {'request_id': request_id, 'status': DUPLICATE}
+        else:
+            to_create[request_id] = index
+
+    if to_create:
+        messages = [
+            AIMessage(
+                node_id=valid[index]['node'],
+                type=valid[index]['type'],
+                prompt=valid[index]['prompt'],
+                response=valid[index]['response'],
+                model_name=valid[index]['model_name'],
+                tokens_in=valid[index]['tokens_in'],
+                tokens_out=valid[index]['tokens_out'],
+                request_id=request_id,
+                created_by_id=valid[index]['created_by'],
+            )
+            for request_id, index in to_create.items()
+        ]
+        with transaction.atomic():
+            written = _insert_new(messages)
+            # Only rows this call stored count towards usage
+            record_usage(
+                (m.created_by_id, node_trees[m.node_id], m.created_at, m.tokens_in, m.tokens_out)
+                for m in messages if m.request_id in written
+            )
+        stored.update(written)
+        missing = [request_id for request_id in to_create if request_id not in written]
+        if missing:
+            # Stored by a concurrent retry between the lookup and the insert
+            stored.update(_stored_ids(missing))
+        for request_id, index in to_create.items():
+            status = CREATED if request_id in written else DUPLICATE
+            results[index] = {'request_id': request_id, 'status': status}
+
+    for result in results:
+        if result['status'] != INVALID:
+            result['id'] = stored.get(result['request_id'])
+    return results
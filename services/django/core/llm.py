@@ -0,0 +1,218 @@
+"""
+LLM provider clients for background generation in Celery workers.
+
+Synchronous counterparts of the FastAPI service's clients: the same
+providers, settings (``AI_PROVIDER``, ``AI_API_KEY``, ``AI_MODEL``,
+``AI_BASE_URL``) and SSE formats. Each client keeps one pooled
+``requests.Session`` per worker process.
+"""
+import json
+import re
+import time
+
+import requests
+from django.conf import settings
+
+
+class LLMProviderError(Exception):
+    """The provider rejected the request or the stream broke off."""
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.status_code = status_code
+
+    @property
+    def retryable(self):
+        # Auth and bad-request errors won't succeed on retry
+        return self.status_code is None or self.status_code == 429 or self.status_code >= 500
+
+
+def iter_sse_events(response):
+    """Parse a Server-Sent Events body into ``(event, data)`` pairs."""
+    event, data = 'message', []
+    for line in response.iter_lines(decode_unicode=True):
+        if not line:
+            if data:
+                yield event, '\n'.join(data)
+            event, data = 'message', []
+            continue
+        if line.startswith(':'):
+            continue
+        field, _, value = line.partition(':')
+        if value.startswith(' '):
+            value = value[1:]
+        if field == 'event':
+            event = value
+        elif field == 'data':
+            data.append(value)
+    if data:
+        yield event, '\n'.join(data)
+
+
+class StubLLMClient:
+    """Stub provider for development without API keys."""
+
+    provider = 'stub'
+
+    def __init__(self, model_name='stub'):
+        self.model_name = model_name
+
+    def stream(self, prompt, usage):
+        text = (
+            "This is a stub AI response generated in the background.\n\n"
+            f"**Prompt received:** {prompt[:100]}...\n\n"
+            "Configure AI_PROVIDER and AI_API_KEY to use a real provider."
+        )
+        for piece in re.findall(r'\s+|\S+', text):
+            time.sleep(settings.AI_STUB_CHUNK_DELAY)
+            yield piece
+
+
+class _HTTPLLMClient:
+    """Shared request/stream plumbing for HTTP providers."""
+
+    provider = ''
+    default_base_url = ''
+    default_model = ''
+    path = ''
+
+    def __init__(self, api_key, model_name='', base_url=''):
+        self.api_key = api_key
+        self.model_name = model_name or self.default_model
+        self.url = (base_url or self.default_base_url).rstrip('/') + self.path
+        self.session = requests.Session()
+
+    def headers(self):
+        raise NotImplementedError
+
+    def payload(self, prompt):
+        raise NotImplementedError
+
+    def parse_event(self, event, data, usage):
+        """Return the text delta in an SSE event (or None), recording usage."""
+        raise NotImplementedError
+
+    def is_final_event(self, event, data):
+        raise NotImplementedError
+
+    def stream(self, prompt, usage):
+        """
+        Yield text chunks of the response to ``prompt``. Provider-reported
+        token counts are stored in the ``usage`` dict as they arrive.
+        """
+        try:
+            with self.session.post(
+                self.url,
+                headers=self.headers(),
+                json=self.payload(prompt),
+                stream=True,
+                timeout=(settings.AI_CONNECT_TIMEOUT, settings.AI_TIMEOUT),
+            ) as response:
+                if response.status_code >= 400:
+                    raise LLMProviderError(
+                        f'Provider returned {response.status_code}: {response.text[:500]}',
+                        status_code=response.status_code,
+                    )
+                for event, data in iter_sse_events(response):
+                    if self.is_final_event(event, data):
+                        return
+                    delta = self.parse_event(event, data, usage)
+                    if delta:
+                        yield delta
+        except requests.RequestException as e:
+            raise LLMProviderError(f'Provider stream failed: {e!r}') from e
+        raise LLMProviderError('Provider stream ended without a final event')
+
+
+class OpenAIClient(_HTTPLLMClient):
+    """OpenAI-compatible chat completions API."""
+
+    provider = 'openai'
+    default_base_url = 'https://api.openai.com/v1'
+    default_model = 'gpt-4o-mini'
+    path = '/chat/completions'
+
+    def headers(self):
+        return {'Authorization': f'Bearer {self.api_key}'}
+
+    def payload(self, prompt):
+        return {
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': settings.AI_MAX_TOKENS,
+            'stream': True,
+            'stream_options': {'include_usage': True},
+        }
+
+    def is_final_event(self, event, data):
+        return data == '[DONE]'
+
+    def parse_event(self, event, data, usage):
+        chunk = json.loads(data)
+        if 'error' in chunk:
+            raise LLMProviderError(f"Provider error: {chunk['error']}")
+        if chunk.get('usage'):
+            usage['input_tokens'] = chunk['usage'].get('prompt_tokens')
+            usage['output_tokens'] = chunk['usage'].get('completion_tokens')
+        choices = chunk.get('choices') or [{}]
+        return (choices[0].get('delta') or {}).get('content')
+
+
+class AnthropicClient(_HTTPLLMClient):
+    """Anthropic-compatible messages API."""
+
+    provider = 'anthropic'
+    default_base_url = 'https://api.anthropic.com'
+    default_model = 'claude-3-5-haiku-latest'
+    path = '/v1/messages'
+
+    def headers(self):
+        return {
+            'x-api-key': self.api_key,
+            'anthropic-version': settings.AI_ANTHROPIC_VERSION,
+        }
+
+    def payload(self, prompt):
+        return {
+            'model': self.model_name,
+            'messages': [{'role': 'user', 'content': prompt}],
+            'max_tokens': settings.AI_MAX_TOKENS,
+            'stream': True,
+        }
+
+    def is_final_event(self, event, data):
+        return event == 'message_stop'
+
+    def parse_event(self, event, data, usage):
+        if event == 'error':
+            raise LLMProviderError(f'Provider error: {data}')
+        if event == 'message_start':
+            usage['input_tokens'] = json.loads(data).get('message', {}).get('usage', {}).get('input_tokens')
+        elif event == 'message_delta':
+            usage['output_tokens'] = json.loads(data).get('usage', {}).get('output_tokens')
+        elif event == 'content_block_delta':
+            delta = json.loads(data).get('delta', {})
+            if delta.get('type') == 'text_delta':
+                return delta.get('text')
+        return None
+
+
+_clients = {}
+
+
+def get_llm_client(provider=None):
+    """The worker process's client for ``provider`` (default ``AI_PROVIDER``)."""
+    provider = provider or settings.AI_PROVIDER
+    client = _clients.get(provider)
+    if client is None:
+        if provider == 'stub':
+            client = StubLLMClient(settings.AI_MODEL or 'stub')
+        elif provider in ('openai', 'anthropic'):
+            if not settings.AI_API_KEY:
+                raise ValueError(f'{provider} API key required')
+            client_class = OpenAIClient if provider == 'openai' else AnthropicClient
+            client = client_class(settings.AI_API_KEY, settings.AI_MODEL, settings.AI_BASE_URL)
+        else:
+            raise ValueError(f'Unknown AI provider: {provider}')
+        _clients[provider] = client
+    return client
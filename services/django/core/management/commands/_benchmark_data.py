@@ -0,0 +1,98 @@
+"""
+Synthetic dataset shared by the benchmarking/plan-checking commands.
+
+Everything hangs off users whose username starts with ``BENCH_PREFIX``,
+so deleting those users removes the whole dataset.
+"""
+import random
+
+from django.contrib.auth.models import User
+from django.db import connection, transaction
+
+from core.models import Tree, TreeMember, Node, AIMessage
+
+BENCH_PREFIX = 'bench_'
+
+
+def get_bench_user():
+    """The first seeded user that owns a tree."""
+    return User.objects.filter(
+        username__startswith=BENCH_PREFIX, owned_trees__isnull=False
+    ).order_by('id').first()
+
+
+def delete_bench_data():
+    return User.objects.filter(username__startswith=BENCH_PREFIX).delete()[0]
+
+
+def seed_bench_data(users=50, trees=500, nodes_per_tree=100, messages_per_node=2,
+                    members_per_tree=5, seed=42):
+    """
+    Bulk-insert a large dataset: trees with members, two-level node
+    hierarchies and AI messages. Returns a dict of row counts.
+    """
+    rng = random.Random(seed)
+    roots_per_tree = max(1, nodes_per_tree // 10)
+
+    with transaction.atomic():
+        user_rows = User.objects.bulk_create([
+            User(username=f'{BENCH_PREFIX}{i}_{rng.randrange(10**9)}')
+            for i in range(users)
+        ])
+        tree_rows = Tree.objects.bulk_create([
+            Tree(owner=rng.choice(user_rows), title=f'Benchmark tree {i}')
+            for i in range(trees)
+        ])
+
+        members = []
+        for tree in tree_rows:
+            member_users = {tree.owner} | set(rng.sample(user_rows, min(members_per_tree, len(user_rows))))
+            for member_user in member_users:
+                role = 'owner' if member_user == tree.owner else rng.choice(['editor', 'viewer'])
+                members.append(TreeMember(tree=tree, user=member_user, role=role))
+        TreeMember.objects.bulk_create(members, batch_size=5000)
+
+        roots = Node.objects.bulk_create([
+            Node(tree=tree, title=f'Root {i}', sibling_order=i, created_by=tree.owner)
+            for tree in tree_rows
+            for i in range(roots_per_tree)
+        ], batch_size=5000)
+        roots_by_tree = {}
+        for root in roots:
+            root.path = f'{root.pk}{Node.PATH_SEPARATOR}'
+            roots_by_tree.setdefault(root.tree_id, []).append(root)
+
+        children = Node.objects.bulk_create([
+            Node(tree=tree, parent=roots_by_tree[tree.id][i % roots_per_tree],
+                 title=f'Node {i}', sibling_order=i, depth=1, created_by=tree.owner)
+            for tree in tree_rows
+            for i in range(nodes_per_tree - roots_per_tree)
+        ], batch_size=5000)
+        for child in children:
+            child.path = f'{child.parent.path}{child.pk}{Node.PATH_SEPARATOR}'
+
+        nodes = roots + children
+        Node.objects.bulk_update(nodes, ['path'], batch_size=5000)
+
+        AIMessage.objects.bulk_create([
+            AIMessage(
+                node=node,
+                type=rng.choice(['explain', 'quiz', 'summarize']),
+                prompt=f'Explain {node.title}',
+                response='Benchmark response ' * 20,
+                model_name='benchmark',
+            )
+            for node in nodes
+            for _ in range(messages_per_node)
+        ], batch_size=5000)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    return {
+        'users': len(user_rows),
+        'trees': len(tree_rows),
+        'members': len(members),
+        'nodes': len(nodes),
+    }
@@ -0,0 +1,101 @@
+"""
+Django management command to benchmark membership-filtered querysets.
+
+Compares the old ``members__user=user`` join + ``DISTINCT`` querysets with
+the correlated ``EXISTS`` versions used by the viewsets, printing query
+plans and latency for each.
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from core.models import Tree, Node, AIMessage
+from core.roles import membership_exists
+from ._benchmark_data import get_bench_user, delete_bench_data, seed_bench_data
+
+
+class Command(BaseCommand):
+    help = 'Seed a large dataset and compare DISTINCT-join vs EXISTS membership queries'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50, help='Number of users to seed')
+        parser.add_argument('--trees', type=int, default=500, help='Number of trees to seed')
+        parser.add_argument('--nodes-per-tree', type=int, default=100, help='Nodes per tree')
+        parser.add_argument('--messages-per-node', type=int, default=2, help='AI messages per node')
+        parser.add_argument('--members-per-tree', type=int, default=5, help='Members per tree')
+        parser.add_argument('--runs', type=int, default=20, help='Timed runs per query')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse previously seeded data')
+        parser.add_argument('--cleanup', action='store_true', help='Delete seeded data and exit')
+
+    def handle(self, *args, **options):
+        if options['cleanup']:
+            deleted = delete_bench_data()
+            self.stdout.write(self.style.SUCCESS(f'Deleted {deleted} seeded rows'))
+            return
+
+        if not options['skip_seed']:
+            self.seed(options)
+
+        user = get_bench_user()
+        if user is None:
+            self.stdout.write(self.style.ERROR('No seeded data found. Run without --skip-seed first.'))
+            return
+
+        queries = [
+            (
+                'trees',
+                Tree.objects.filter(members__user=user).distinct(),
+                Tree.objects.filter(membership_exists(user)),
+            ),
+            (
+                'nodes',
+                Node.objects.filter(tree__members__user=user).distinct(),
+                Node.objects.filter(membership_exists(user, 'tree')),
+            ),
+            (
+                'ai-messages',
+                AIMessage.objects.filter(node__tree__members__user=user).distinct(),
+                AIMessage.objects.filter(membership_exists(user, 'node__tree')),
+            ),
+        ]
+
+        for name, distinct_qs, exists_qs in queries:
+            self.stdout.write(self.style.MIGRATE_HEADING(f'\n== {name} =='))
+            for label, qs in [('DISTINCT join', distinct_qs), ('EXISTS', exists_qs)]:
+                # Same shape as a paginated list request
+                page = qs[:100]
+                timings = self.time_query(page, options['runs'])
+                self.stdout.write(self.style.SUCCESS(
+                    f'{label}: median {statistics.median(timings):.2f} ms, '
+                    f'max {max(timings):.2f} ms over {len(timings)} runs'
+                ))
+                self.stdout.write(self.explain(page))
+
+    def time_query(self, qs, runs):
+        timings = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            list(qs.all())
+            timings.append((time.perf_counter() - start) * 1000)
+        return timings
+
+    def explain(self, qs):
+        if connection.vendor == 'postgresql':
+            return qs.explain(analyze=True, buffers=True)
+        return qs.explain()
+
+    def seed(self, options):
+        self.stdout.write(f'Seeding {options["trees"]} trees x {options["nodes_per_tree"]} nodes...')
+        counts = seed_bench_data(
+            users=options['users'],
+            trees=options['trees'],
+            nodes_per_tree=options['nodes_per_tree'],
+            messages_per_node=options['messages_per_node'],
+            members_per_tree=options['members_per_tree'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {counts['users']} users, {counts['trees']} trees, "
+            f"{counts['members']} members, {counts['nodes']} nodes"
+        ))
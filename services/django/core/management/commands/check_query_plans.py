@@ -0,0 +1,119 @@
+"""
+Django management command to check the plans of hot queries.
+
+Runs ``EXPLAIN (FORMAT JSON)`` for the queries the viewsets, permissions
+and tree builder issue on every request and fails if any of them falls
+back to a sequential scan on seeded data. Postgres only.
+
+``core.tests.test_query_plans`` runs the same queries on a small dataset
+with sequential scans disabled, so a query no index can serve still fails
+``manage.py test``.
+"""
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models.functions import Collate
+
+from core.models import Tree, TreeMember, Node, AIMessage
+from core.roles import membership_exists
+from ._benchmark_data import get_bench_user, delete_bench_data, seed_bench_data
+
+# Tables that must never be read with a sequential scan by a hot query
+HOT_TABLES = {
+    Tree._meta.db_table,
+    TreeMember._meta.db_table,
+    Node._meta.db_table,
+    AIMessage._meta.db_table,
+}
+
+
+INDEX_SCANS = {'Index Scan', 'Index Only Scan', 'Bitmap Index Scan'}
+
+
+def find_seq_scans(plan):
+    """
+    Yield the relation name of every Seq Scan node in a JSON plan. An index
+    scan without an index condition reads the whole index, so it counts too.
+    """
+    if plan.get('Node Type') == 'Seq Scan' or (
+        plan.get('Node Type') in INDEX_SCANS and 'Index Cond' not in plan
+    ):
+        yield plan.get('Relation Name')
+    for child in plan.get('Plans', []):
+        yield from find_seq_scans(child)
+
+
+def hot_queries(user):
+    """``(name, queryset)`` for each hot query, run as ``user`` on seeded data."""
+    tree = Tree.objects.filter(owner=user).first()
+    root = Node.objects.filter(tree=tree, parent__isnull=True).first()
+    child = Node.objects.filter(parent=root).first()
+
+    return [
+        ('tree list', Tree.objects.filter(membership_exists(user))[:100]),
+        ('node list', Node.objects.filter(membership_exists(user, 'tree'))[:100]),
+        ('role lookup', TreeMember.objects.filter(tree=tree, user=user).values_list('role', flat=True)),
+        ('whole tree load', Node.objects.filter(tree=tree).order_by('sibling_order', 'id')),
+        ('tree export', Node.objects.filter(tree=tree).order_by(Collate('path', 'C'))),
+        ('root nodes', Node.objects.filter(tree=tree, parent__isnull=True).order_by('sibling_order')),
+        ('children', Node.objects.filter(parent=root).order_by('sibling_order')),
+        ('ancestors', child.ancestors()),
+        ('subtree', root.descendants()),
+        ('message history', AIMessage.objects.filter(node=child).order_by('-created_at')[:20]),
+    ]
+
+
+def seq_scans(queryset):
+    """Hot tables the plan of ``queryset`` reads with a sequential scan."""
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0][0]['Plan']
+    return [table for table in find_seq_scans(plan) if table in HOT_TABLES]
+
+
+class Command(BaseCommand):
+    help = 'Fail if a hot query falls back to a sequential scan on seeded data'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--trees', type=int, default=2000, help='Number of trees to seed')
+        parser.add_argument('--nodes-per-tree', type=int, default=50, help='Nodes per tree')
+        parser.add_argument('--skip-seed', action='store_true', help='Reuse previously seeded data')
+        parser.add_argument('--keep', action='store_true', help='Keep seeded data afterwards')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('check_query_plans requires PostgreSQL.')
+
+        if not options['skip_seed']:
+            # Enough users that each is in a few trees, as in production;
+            # with 50 users everyone is in ~10% of all trees and a scan wins
+            seed_bench_data(
+                users=max(50, options['trees'] // 2),
+                trees=options['trees'],
+                nodes_per_tree=options['nodes_per_tree'],
+            )
+
+        try:
+            failures = self.check_plans()
+        finally:
+            if not options['keep'] and not options['skip_seed']:
+                delete_bench_data()
+
+        if failures:
+            raise CommandError(f'{len(failures)} hot queries use sequential scans: {", ".join(failures)}')
+        self.stdout.write(self.style.SUCCESS('All hot queries use indexes.'))
+
+    def check_plans(self):
+        user = get_bench_user()
+        if user is None:
+            raise CommandError('No seeded data found. Run without --skip-seed first.')
+
+        failures = []
+        for name, qs in hot_queries(user):
+            tables = seq_scans(qs)
+            if tables:
+                failures.append(name)
+                self.stdout.write(self.style.ERROR(f'{name}: Seq Scan on {", ".join(tables)}'))
+            else:
+                self.stdout.write(self.style.SUCCESS(f'{name}: ok'))
+        return failures
@@ -0,0 +1,27 @@
+"""
+Django management command to apply the AI message retention policies.
+
+Runs the same batched deletion as the ``cleanup_old_ai_messages`` task,
+or with ``--dry-run`` only counts what each policy would delete.
+"""
+from django.core.management.base import BaseCommand
+
+from core.retention import purge_expired_messages
+
+
+class Command(BaseCommand):
+    help = 'Delete AI messages past their retention policy (AI_MESSAGE_RETENTION)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only count expired messages')
+
+    def handle(self, *args, **options):
+        dry_run = options['dry_run']
+        for stats in purge_expired_messages(dry_run=dry_run):
+            verb = 'would delete' if dry_run else 'deleted'
+            line = f"{stats['policy']}: {verb} {stats['deleted']}"
+            if not dry_run:
+                line += f" in {stats['batches']} batches, {stats['seconds']}s"
+            if not stats['complete']:
+                line += ' (time limit reached)'
+            self.stdout.write(line)
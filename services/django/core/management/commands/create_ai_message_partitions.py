@@ -0,0 +1,39 @@
+"""
+Django management command to create upcoming AI message partitions.
+
+With ``--convert`` it first partitions the table if it isn't yet (see
+``core/partitions.py``). Postgres only.
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from core import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create monthly AI message partitions ahead of time'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--months', type=int, default=settings.AI_MESSAGE_PARTITION_PREMAKE,
+            help='Months ahead to create partitions for',
+        )
+        parser.add_argument(
+            '--convert', action='store_true',
+            help='Partition the AI message table first if it is a plain table',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('AI message partitioning requires PostgreSQL')
+        if not partitions.is_partitioned():
+            if not options['convert']:
+                raise CommandError('The AI message table is not partitioned; run with --convert to partition it')
+            self.stdout.write('Partitioning the AI message table...')
+            partitions.partition_table()
+
+        created = partitions.create_partitions(months=options['months'])
+        for name in created:
+            self.stdout.write(f'Created {name}')
+        self.stdout.write(self.style.SUCCESS(f'{len(created)} partitions created'))
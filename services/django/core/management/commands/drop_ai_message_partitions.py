@@ -0,0 +1,49 @@
+"""
+Django management command to drop (or detach) expired AI message partitions.
+
+By default removes the partitions that every ``AI_MESSAGE_RETENTION``
+policy has expired, which ``cleanup_old_ai_messages`` also does.
+``--detach`` keeps them as standalone tables instead, e.g. for archiving.
+"""
+from datetime import datetime, time, timezone
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from core import partitions
+from core.retention import get_policies, partition_cutoff
+
+
+class Command(BaseCommand):
+    help = 'Drop or detach AI message partitions past retention'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--detach', action='store_true', help='Detach instead of dropping')
+        parser.add_argument('--dry-run', action='store_true', help='Only list the partitions')
+        parser.add_argument(
+            '--before', help='Remove partitions ending on or before this date (YYYY-MM-DD) '
+                             'instead of using the retention policies',
+        )
+
+    def handle(self, *args, **options):
+        if not partitions.is_partitioned():
+            raise CommandError('The AI message table is not partitioned')
+
+        if options['before']:
+            day = parse_date(options['before'])
+            if day is None:
+                raise CommandError('--before must be a date (YYYY-MM-DD)')
+            cutoff = datetime.combine(day, time.min, tzinfo=timezone.utc)
+        else:
+            cutoff = partition_cutoff(get_policies())
+            if cutoff is None:
+                raise CommandError('Retention policies keep some messages forever; use --before')
+
+        removed = partitions.drop_partitions_before(
+            cutoff, detach=options['detach'], dry_run=options['dry_run']
+        )
+        verb = 'Would remove' if options['dry_run'] else ('Detached' if options['detach'] else 'Dropped')
+        for name in removed:
+            self.stdout.write(f'{verb} {name}')
+        if not removed:
+            self.stdout.write('No partitions to remove')
@@ -0,0 +1,58 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:02
+
+from django.db import migrations, models
+
+
+def populate_node_paths(apps, schema_editor):
+    """Backfill materialized paths for existing nodes."""
+    Node = apps.get_model('core', 'Node')
+    parents = dict(Node.objects.values_list('id', 'parent_id'))
+    paths = {}
+
+    def path_for(node_id):
+        # Walk up until we hit a node whose path is already known
+        chain = []
+        while node_id is not None and node_id not in paths:
+            chain.append(node_id)
+            node_id = parents[node_id]
+        prefix = paths[node_id] if node_id is not None else ''
+        for pk in reversed(chain):
+            prefix = f"{prefix}{pk}/"
+            paths[pk] = prefix
+        return prefix
+
+    nodes = []
+    for node in Node.objects.only('id').iterator(chunk_size=2000):
+        node.path = path_for(node.id)
+        node.depth = node.path.count('/') - 1
+        nodes.append(node)
+    Node.objects.bulk_update(nodes, ['path', 'depth'], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='node',
+            options={'ordering': ['sibling_order']},
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=1024),
+        ),
+        migrations.RunPython(populate_node_paths, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['path'], name='node_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+    ]
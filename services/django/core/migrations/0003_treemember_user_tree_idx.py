@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:06
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_node_path'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='treemember',
+            index=models.Index(fields=['user', 'tree'], name='treemember_user_tree_idx'),
+        ),
+    ]
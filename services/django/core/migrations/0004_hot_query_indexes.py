@@ -0,0 +1,51 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:07
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0003_treemember_user_tree_idx'),
+    ]
+
+    # The unique (tree, user) index covering role replaces the plain unique
+    # (tree, user) index; node_tree_parent_order_idx and
+    # node_parent_order_idx lead with the FK columns, so the FK indexes go
+    operations = [
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=models.Index(fields=['node', '-created_at'], name='aimessage_node_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['tree', 'parent', 'sibling_order'], name='node_tree_parent_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(fields=['parent', 'sibling_order'], name='node_parent_order_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(condition=models.Q(('parent__isnull', True)), fields=['tree', 'sibling_order'], name='node_root_order_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='treemember',
+            constraint=models.UniqueConstraint(fields=('tree', 'user'), include=('role',), name='treemember_tree_user_uniq'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='treemember',
+            unique_together={('tree', 'email')},
+        ),
+        migrations.AlterField(
+            model_name='node',
+            name='parent',
+            field=models.ForeignKey(blank=True, db_index=False, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='children', to='core.node'),
+        ),
+        migrations.AlterField(
+            model_name='node',
+            name='tree',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='nodes', to='core.tree'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:16
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def clear_duplicate_request_ids(apps, schema_editor):
+    """Keep request_id only on the oldest message of each duplicate group."""
+    AIMessage = apps.get_model('core', 'AIMessage')
+    duplicates = (
+        AIMessage.objects.exclude(request_id='')
+        .values('request_id')
+        .annotate(count=Count('id'), keep=Min('id'))
+        .filter(count__gt=1)
+    )
+    for group in duplicates:
+        AIMessage.objects.filter(request_id=group['request_id']).exclude(
+            id=group['keep']
+        ).update(request_id='')
+
+
+class Migration(migrations.Migration):
+    """
+    Make non-blank ``request_id`` unique, so ingestion is idempotent.
+
+    The unique index is created in the database only. A partitioned AI
+    message table (see ``core/partitions.py``) can't have it and uses a
+    trigger instead, so the model state tracks neither form and is the same
+    for both layouts.
+    """
+
+    dependencies = [
+        ('core', '0004_hot_query_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(clear_duplicate_request_ids, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.AddConstraint(
+                    model_name='aimessage',
+                    constraint=models.UniqueConstraint(condition=models.Q(('request_id', ''), _negated=True), fields=('request_id',), name='aimessage_unique_request_id'),
+                ),
+            ],
+        ),
+    ]
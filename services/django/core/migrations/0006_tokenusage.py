@@ -0,0 +1,69 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:27
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Sum
+from django.db.models.functions import TruncDate
+import django.db.models.deletion
+
+
+def backfill_token_usage(apps, schema_editor):
+    """Roll up the messages stored before usage was tracked incrementally."""
+    AIMessage = apps.get_model('core', 'AIMessage')
+    TokenUsage = apps.get_model('core', 'TokenUsage')
+    totals = (
+        AIMessage.objects.order_by()
+        .annotate(day=TruncDate('created_at'))
+        .values('created_by_id', 'node__tree_id', 'day')
+        .annotate(messages=Count('id'), tokens_in=Sum('tokens_in'), tokens_out=Sum('tokens_out'))
+    )
+    TokenUsage.objects.bulk_create(
+        (
+            TokenUsage(
+                user_id=row['created_by_id'],
+                tree_id=row['node__tree_id'],
+                day=row['day'],
+                messages=row['messages'],
+                tokens_in=row['tokens_in'] or 0,
+                tokens_out=row['tokens_out'] or 0,
+            )
+            for row in totals.iterator()
+        ),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0005_aimessage_unique_request_id'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TokenUsage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('tokens_in', models.BigIntegerField(default=0)),
+                ('tokens_out', models.BigIntegerField(default=0)),
+                ('tree', models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to='core.tree')),
+                ('user', models.ForeignKey(db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, related_name='+', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['user', 'day'], name='tokenusage_user_day_idx')],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='tokenusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', False)), fields=('user', 'tree', 'day'), name='tokenusage_unique_user_tree_day'),
+        ),
+        migrations.AddConstraint(
+            model_name='tokenusage',
+            constraint=models.UniqueConstraint(condition=models.Q(('user__isnull', True)), fields=('tree', 'day'), name='tokenusage_unique_anonymous_tree_day'),
+        ),
+        migrations.RunPython(backfill_token_usage, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_aibatchjob'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=models.Index(fields=['created_at'], name='aimessage_created_at_idx'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:44
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# Keep search_vector current on every write, bulk ones included. Documents
+# are capped so an oversized note can't exceed tsvector's size limit.
+# Existing rows are filled in by 0010, in batches.
+NODE_TRIGGER = """
+CREATE FUNCTION core_node_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector :=
+        setweight(to_tsvector('english', left(coalesce(NEW.title, ''), 100000)), 'A') ||
+        setweight(to_tsvector('english', left(coalesce(NEW.user_notes, ''), 100000)), 'B') ||
+        setweight(to_tsvector('english', left(coalesce(NEW.ai_notes, ''), 100000)), 'C');
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_node_search_vector
+BEFORE INSERT OR UPDATE OF title, user_notes, ai_notes ON core_node
+FOR EACH ROW EXECUTE FUNCTION core_node_search_vector();
+"""
+
+MESSAGE_TRIGGER = """
+CREATE FUNCTION core_aimessage_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := to_tsvector('english', left(coalesce(NEW.response, ''), 100000));
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER core_aimessage_search_vector
+BEFORE INSERT OR UPDATE OF response ON core_aimessage
+FOR EACH ROW EXECUTE FUNCTION core_aimessage_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_aimessage_created_at_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='aimessage',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='node',
+            name='search_vector',
+            field=django.contrib.postgres.search.SearchVectorField(editable=False, null=True),
+        ),
+        migrations.RunSQL(
+            NODE_TRIGGER,
+            'DROP TRIGGER core_node_search_vector ON core_node; DROP FUNCTION core_node_search_vector();',
+        ),
+        migrations.RunSQL(
+            MESSAGE_TRIGGER,
+            'DROP TRIGGER core_aimessage_search_vector ON core_aimessage; '
+            'DROP FUNCTION core_aimessage_search_vector();',
+        ),
+        migrations.AddIndex(
+            model_name='aimessage',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='aimessage_search_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='node',
+            index=django.contrib.postgres.indexes.GinIndex(fields=['search_vector'], name='node_search_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+from django.db import migrations, transaction
+
+BATCH_SIZE = 5000
+
+# Rewriting a searched column fires the search_vector trigger from 0009
+TABLES = [
+    ('core_node', 'title'),
+    ('core_aimessage', 'response'),
+]
+
+
+def backfill(apps, schema_editor):
+    """
+    Fill search_vector for existing rows, one id range per transaction, so
+    the tables aren't locked (or rewritten in one go) for the whole backfill.
+    Rows a previous interrupted run already filled are skipped.
+    """
+    connection = schema_editor.connection
+    for table, column in TABLES:
+        table, column = connection.ops.quote_name(table), connection.ops.quote_name(column)
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT min(id), max(id) FROM {table} WHERE search_vector IS NULL')
+            low, high = cursor.fetchone()
+        if low is None:
+            continue
+        for start in range(low, high + 1, BATCH_SIZE):
+            with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET {column} = {column} '
+                    f'WHERE id >= %s AND id < %s AND search_vector IS NULL',
+                    [start, start + BATCH_SIZE],
+                )
+
+
+class Migration(migrations.Migration):
+    # Each batch commits on its own
+    atomic = False
+
+    dependencies = [
+        ('core', '0009_search_vectors'),
+    ]
+
+    operations = [
+        migrations.RunPython(backfill, migrations.RunPython.noop, elidable=True),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:30
+
+from django.db import migrations, models
+import django.db.models.functions.comparison
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0010_backfill_search_vectors'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='node',
+            index=models.Index(models.F('tree'), django.db.models.functions.comparison.Collate('path', 'C'), name='node_tree_path_idx'),
+        ),
+    ]
@@ -1,5 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Collate, Concat, Substr
 from django.contrib.auth.models import User
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 
 
 class Tree(models.Model):
@@ -30,6 +34,7 @@ class TreeMember(models.Model):
         ('editor', 'Editor'),
         ('viewer', 'Viewer'),
     ]
+    EDIT_ROLES = ['owner', 'editor']
     
     tree = models.ForeignKey(Tree, on_delete=models.CASCADE, related_name='members')
     user = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='tree_memberships')
@@ -38,7 +43,16 @@ class TreeMember(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
-        unique_together = [['tree', 'user'], ['tree', 'email']]
+        unique_together = [['tree', 'email']]
+        indexes = [
+            # "Which trees is this user a member of?" (membership EXISTS checks)
+            models.Index(fields=['user', 'tree'], name='treemember_user_tree_idx'),
+        ]
+        constraints = [
+            # Its index also serves the role resolver: role for (tree, user)
+            # straight from the index
+            models.UniqueConstraint(fields=['tree', 'user'], include=['role'], name='treemember_tree_user_uniq'),
+        ]
     
     def __str__(self):
         user_identifier = self.user.username if self.user else self.email
@@ -46,22 +60,136 @@ class TreeMember(models.Model):
 
 
 class Node(models.Model):
-    """A node in the study tree."""
-    tree = models.ForeignKey(Tree, on_delete=models.CASCADE, related_name='nodes')
-    parent = models.ForeignKey('self', on_delete=models.CASCADE, null=True, blank=True, related_name='children')
+    """
+    A node in the study tree.
+
+    ``path`` is a materialized path of primary keys from the root down to
+    this node (e.g. ``"3/17/42/"``), so subtree and ancestor lookups are a
+    single indexed query instead of a recursive walk. ``path`` and ``depth``
+    are maintained by ``save()``.
+    """
+    PATH_SEPARATOR = '/'
+
+    # Both FKs are covered by the composite indexes below
+    tree = models.ForeignKey(Tree, on_delete=models.CASCADE, related_name='nodes', db_index=False)
+    parent = models.ForeignKey(
+        'self', on_delete=models.CASCADE, null=True, blank=True, related_name='children', db_index=False
+    )
     title = models.CharField(max_length=500)
     user_notes = models.TextField(blank=True, default='')
     ai_notes = models.TextField(blank=True, default='')
     sibling_order = models.IntegerField(default=0)
+    path = models.CharField(max_length=1024, blank=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='created_nodes')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # title, user_notes and ai_notes for full-text search; kept by a trigger (see search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         ordering = ['sibling_order']
+        indexes = [
+            # Prefix (LIKE 'x/%') lookups for subtrees
+            models.Index(fields=['path'], name='node_path_idx', opclasses=['varchar_pattern_ops']),
+            # A tree's nodes in path order (parents first, subtrees together)
+            # without a sort, for streaming exports
+            models.Index(F('tree'), Collate('path', 'C'), name='node_tree_path_idx'),
+            # Whole-tree loads and ordered children within a tree
+            models.Index(fields=['tree', 'parent', 'sibling_order'], name='node_tree_parent_order_idx'),
+            # Ordered children of a node
+            models.Index(fields=['parent', 'sibling_order'], name='node_parent_order_idx'),
+            # Root nodes of a tree
+            models.Index(
+                fields=['tree', 'sibling_order'],
+                name='node_root_order_idx',
+                condition=models.Q(parent__isnull=True),
+            ),
+            GinIndex(fields=['search_vector'], name='node_search_idx'),
+        ]
     
     def __str__(self):
         return f"{self.tree.title} - {self.title}"
+    
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember stored values so saves can tell which neighbours' context changed
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+    
+    def save(self, *args, **kwargs):
+        # The row and its path become visible together
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self.sync_path()
+    
+    def build_path(self):
+        """Return the path this node should have given its current parent."""
+        parent_path = self.parent.path if self.parent_id else ''
+        return f"{parent_path}{self.pk}{self.PATH_SEPARATOR}"
+    
+    def sync_path(self):
+        """
+        Bring ``path``/``depth`` in line with ``parent``.
+
+        New nodes get their path set; reparented nodes rewrite their whole
+        subtree with one UPDATE.
+        """
+        ancestor_ids = self.ancestor_ids
+        if self.path and (ancestor_ids[-1] if ancestor_ids else None) == self.parent_id:
+            return
+        
+        new_path = self.build_path()
+        if new_path == self.path:
+            return
+        
+        new_depth = new_path.count(self.PATH_SEPARATOR) - 1
+        if self.path:
+            old_path = self.path
+            Node.objects.filter(tree_id=self.tree_id, path__startswith=old_path).update(
+                path=Concat(Value(new_path), Substr('path', len(old_path) + 1)),
+                depth=F('depth') + (new_depth - self.depth),
+            )
+        else:
+            Node.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        
+        self.path = new_path
+        self.depth = new_depth
+    
+    @property
+    def ancestor_ids(self):
+        """Primary keys of this node's ancestors, root first."""
+        if not self.path:
+            return []
+        return [int(pk) for pk in self.path.split(self.PATH_SEPARATOR)[:-2]]
+    
+    def ancestors(self):
+        """Ancestors of this node, root first."""
+        return Node.objects.filter(pk__in=self.ancestor_ids).order_by('depth')
+    
+    def subtree(self):
+        """This node and all nodes below it."""
+        return Node.subtrees([self])
+    
+    @classmethod
+    def subtrees(cls, nodes):
+        """``nodes`` and all nodes below them, in one query."""
+        # An empty prefix would match every node of every tree, so a node
+        # without a path only stands for itself
+        query = Q(pk__in=[node.pk for node in nodes if not node.path])
+        for node in nodes:
+            if node.path:
+                query |= Q(tree_id=node.tree_id, path__startswith=node.path)
+        return cls.objects.filter(query)
+    
+    def descendants(self):
+        """All nodes below this one, at any depth."""
+        return self.subtree().exclude(pk=self.pk)
+    
+    def subtree_contains(self, other):
+        """Whether ``other`` is this node or lies below it."""
+        return bool(self.path) and other.path.startswith(self.path)
 
 
 class AIMessage(models.Model):
@@ -79,12 +207,119 @@ class AIMessage(models.Model):
     model_name = models.CharField(max_length=100, blank=True, default='')
     tokens_in = models.IntegerField(default=0)
     tokens_out = models.IntegerField(default=0)
+    # Unique unless blank, which makes ingestion idempotent. Enforced outside
+    # the model state (migration 0005): by a unique index on a plain table and
+    # by a trigger on a partitioned one (see partitions.py)
     request_id = models.CharField(max_length=100, blank=True, default='', db_index=True)
     created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ai_messages')
     created_at = models.DateTimeField(auto_now_add=True)
+    # response for full-text search; kept by a trigger (see search.py)
+    search_vector = SearchVectorField(null=True, editable=False)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Message history for a node, newest first
+            models.Index(fields=['node', '-created_at'], name='aimessage_node_recent_idx'),
+            # Retention cleanup finds expired messages by age
+            models.Index(fields=['created_at'], name='aimessage_created_at_idx'),
+            GinIndex(fields=['search_vector'], name='aimessage_search_idx'),
+        ]
     
     def __str__(self):
         return f"{self.node.title} - {self.type}"
+
+
+class AIBatchJob(models.Model):
+    """
+    Generate one type of AI message for every node in a tree or subtree.
+    
+    Run by ``core.tasks.run_ai_batch_job`` on the bulk queue. Each node's
+    message gets the request_id ``ai-job:<job id>:<node id>``, so a job
+    that is resumed (after a crash or a cancel) skips nodes already done.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    CANCELLED = 'cancelled'
+    STATUS_CHOICES = [
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+        (CANCELLED, 'Cancelled'),
+    ]
+    ACTIVE_STATUSES = [PENDING, RUNNING]
+    
+    tree = models.ForeignKey(Tree, on_delete=models.CASCADE, related_name='ai_jobs')
+    # The subtree to process; None means the whole tree
+    root = models.ForeignKey(Node, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    type = models.CharField(max_length=20, choices=AIMessage.TYPE_CHOICES)
+    additional_context = models.TextField(blank=True, default='')
+    save_to_notes = models.BooleanField(default=False)
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=PENDING)
+    total = models.PositiveIntegerField(default=0)
+    completed = models.PositiveIntegerField(default=0)
+    failed = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+    created_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='ai_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped as results are written; a running job that stops updating has died
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['tree', '-created_at'], name='aibatchjob_tree_recent_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tree.title} - {self.type} ({self.status})"
+    
+    def message_request_id(self, node_id):
+        return f"ai-job:{self.pk}:{node_id}"
+
+
+class TokenUsage(models.Model):
+    """
+    Daily token totals per user and tree.
+    
+    Maintained incrementally as AI messages are stored (see ``core.usage``),
+    so usage reports never scan ``AIMessage``. Rows are a ledger: they stay
+    when messages, nodes or trees are deleted, hence no FK constraints.
+    """
+    user = models.ForeignKey(
+        User, on_delete=models.DO_NOTHING, db_constraint=False, null=True, related_name='+'
+    )
+    tree = models.ForeignKey(
+        Tree, on_delete=models.DO_NOTHING, db_constraint=False, related_name='+'
+    )
+    day = models.DateField()
+    messages = models.PositiveIntegerField(default=0)
+    tokens_in = models.BigIntegerField(default=0)
+    tokens_out = models.BigIntegerField(default=0)
+    
+    class Meta:
+        ordering = ['-day']
+        indexes = [
+            # A user's usage over a date range
+            models.Index(fields=['user', 'day'], name='tokenusage_user_day_idx'),
+        ]
+        constraints = [
+            # Upsert targets; messages without a user get their own row per tree/day
+            models.UniqueConstraint(
+                fields=['user', 'tree', 'day'],
+                condition=models.Q(user__isnull=False),
+                name='tokenusage_unique_user_tree_day',
+            ),
+            models.UniqueConstraint(
+                fields=['tree', 'day'],
+                condition=models.Q(user__isnull=True),
+                name='tokenusage_unique_anonymous_tree_day',
+            ),
+        ]
+    
+    def __str__(self):
+        return f"{self.user_id} / {self.tree_id} / {self.day}"
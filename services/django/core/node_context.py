@@ -0,0 +1,159 @@
+"""
+Redis read-model of node context for the FastAPI service.
+
+Each node is projected to ``node_context:{id}`` as JSON (title, notes,
+tree id, ancestor titles and child titles) and each tree's member ids to
+``tree_members:{id}``, so FastAPI can build prompts and check access
+without calling Django. Signals rewrite projections when nodes or members
+change; bulk operations refresh them explicitly. Projections expire after
+``NODE_CONTEXT_TTL`` so anything missed heals itself, and FastAPI falls
+back to the internal context endpoint (which re-projects) on a miss.
+
+Values are plain JSON written with a raw Redis client, not Django's cache,
+because Django pickles cache values.
+"""
+import json
+import logging
+
+import redis
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.fields import DateTimeField
+
+from .models import Node, TreeMember
+
+logger = logging.getLogger(__name__)
+
+_client = None
+
+
+def node_context_key(node_id):
+    return f"node_context:{node_id}"
+
+
+def tree_members_key(tree_id):
+    return f"tree_members:{tree_id}"
+
+
+def _redis():
+    global _client
+    if _client is None:
+        _client = redis.Redis.from_url(settings.NODE_CONTEXT_REDIS_URL)
+    return _client
+
+
+def _children_of(node_ids):
+    """Child ``{id, title}`` lists for ``node_ids`` in sibling order, one query."""
+    children = {pk: [] for pk in node_ids}
+    rows = Node.objects.filter(parent_id__in=node_ids).order_by(
+        'parent_id', 'sibling_order', 'id'
+    ).values_list('parent_id', 'id', 'title')
+    for parent_id, pk, title in rows:
+        if len(children[parent_id]) < settings.NODE_CONTEXT_MAX_CHILDREN:
+            children[parent_id].append({'id': pk, 'title': title})
+    return children
+
+
+def build_node_context(node, ancestors=None, children=None):
+    """Serialize the fields FastAPI needs to build a prompt for ``node``."""
+    if ancestors is None:
+        ancestors = node.ancestors().only('id', 'title')
+    if children is None:
+        children = _children_of([node.id])[node.id]
+    return {
+        'id': node.id,
+        'tree': node.tree_id,
+        'parent': node.parent_id,
+        'title': node.title,
+        'user_notes': node.user_notes,
+        'ai_notes': node.ai_notes,
+        'depth': node.depth,
+        # Root first, nearest parent last
+        'ancestors': [{'id': a.id, 'title': a.title} for a in ancestors],
+        # Also gives FastAPI the node's siblings via its parent's projection
+        'children': children,
+        'sibling_order': node.sibling_order,
+        # Same format as the REST API so FastAPI cache keys match either source
+        'updated_at': DateTimeField().to_representation(node.updated_at),
+    }
+
+
+def tree_member_ids(tree_id):
+    return list(
+        TreeMember.objects.filter(tree_id=tree_id, user__isnull=False)
+        .values_list('user_id', flat=True)
+    )
+
+
+def _write(mapping):
+    """SET every key in ``mapping`` with the projection TTL in one round trip."""
+    if not settings.NODE_CONTEXT_PROJECTION_ENABLED or not mapping:
+        return
+    try:
+        pipe = _redis().pipeline(transaction=False)
+        for key, value in mapping.items():
+            pipe.set(key, json.dumps(value), ex=settings.NODE_CONTEXT_TTL)
+        pipe.execute()
+    except redis.RedisError as e:
+        # Projections are an optimization; FastAPI falls back to the endpoint
+        logger.warning('Could not write node context projection: %s', e)
+
+
+def _delete(keys):
+    if not settings.NODE_CONTEXT_PROJECTION_ENABLED or not keys:
+        return
+    try:
+        _redis().delete(*keys)
+    except redis.RedisError as e:
+        logger.warning('Could not delete node context projection: %s', e)
+
+
+def project_nodes(nodes):
+    """
+    Write projections for ``nodes``, loading all their ancestors and
+    children in one query each. Returns ``{node_id: context}``.
+    """
+    nodes = list(nodes)
+    if not nodes:
+        return {}
+    ancestor_ids = {pk for node in nodes for pk in node.ancestor_ids}
+    titles = dict(Node.objects.filter(id__in=ancestor_ids).values_list('id', 'title'))
+    children = _children_of([node.id for node in nodes])
+
+    contexts = {}
+    for node in nodes:
+        ancestors = [
+            Node(id=pk, title=titles[pk]) for pk in node.ancestor_ids if pk in titles
+        ]
+        contexts[node.id] = build_node_context(node, ancestors, children[node.id])
+    _write({node_context_key(pk): context for pk, context in contexts.items()})
+    return contexts
+
+
+def project_node_ids(node_ids):
+    node_ids = {pk for pk in node_ids if pk is not None}
+    if node_ids:
+        project_nodes(Node.objects.filter(id__in=node_ids))
+
+
+def forget_nodes(node_ids):
+    _delete([node_context_key(pk) for pk in node_ids])
+
+
+def write_tree_members(tree_id, member_ids):
+    _write({tree_members_key(tree_id): member_ids})
+
+
+def project_tree_members(tree_id):
+    write_tree_members(tree_id, tree_member_ids(tree_id))
+
+
+def project_subtrees(nodes):
+    """Write projections for ``nodes`` and everything below them."""
+    paths = {node.path for node in nodes if node.path}
+    if not paths:
+        return
+    query = Q()
+    for path in paths:
+        query |= Q(path__startswith=path)
+    project_nodes(Node.objects.filter(query))
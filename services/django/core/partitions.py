@@ -0,0 +1,258 @@
+"""
+Optional monthly range partitioning of the AIMessage table (Postgres).
+
+``create_ai_message_partitions --convert`` turns the table into one
+partitioned by ``created_at``. Converting is an explicit step rather than
+a migration, so migrations give every install the same schema and state:
+
+- The existing table becomes the first partition, covering everything up
+  to the next month, so converting doesn't copy any messages.
+- One partition per month (``core_aimessage_pYYYYMM``) is created
+  ``AI_MESSAGE_PARTITION_PREMAKE`` months ahead, plus a default partition
+  that catches rows outside them. A month can't be created once the
+  default partition holds rows for it, so keep the premake ahead.
+- A partitioned table can only have unique indexes that include
+  ``created_at``, so ``request_id`` uniqueness moves to the
+  ``core_aimessage_request_ids`` table, kept by a trigger. Storing a
+  duplicate still raises IntegrityError. The model state doesn't track
+  either form (migration 0005).
+- The primary key becomes ``(id, created_at)``, which Django can't
+  express; ids still come from one sequence, so ``id`` stays unique and
+  remains the model's pk.
+
+Retention drops a whole partition once every policy has expired it (see
+``retention.py``) instead of deleting its rows, and queries that filter on
+``created_at`` only scan the partitions in their range.
+"""
+from datetime import datetime, timezone as dt_timezone
+import logging
+import re
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from .models import AIMessage
+
+logger = logging.getLogger(__name__)
+
+TABLE = AIMessage._meta.db_table
+LEGACY_PARTITION = f'{TABLE}_legacy'
+DEFAULT_PARTITION = f'{TABLE}_default'
+REQUEST_IDS_TABLE = f'{TABLE}_request_ids'
+
+# Keeps the request_ids table in step with the messages. TRUNCATE and
+# dropped partitions don't fire row triggers; see drop_partitions_before.
+_TRIGGERS = """
+CREATE FUNCTION {table}_track_request_id() RETURNS trigger AS $$
+BEGIN
+    IF TG_OP <> 'INSERT' AND OLD.request_id <> '' THEN
+        DELETE FROM {request_ids} WHERE request_id = OLD.request_id;
+    END IF;
+    IF TG_OP <> 'DELETE' AND NEW.request_id <> '' THEN
+        -- Raises unique_violation if the request_id is already stored
+        INSERT INTO {request_ids} (request_id, created_at) VALUES (NEW.request_id, NEW.created_at);
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_request_id
+AFTER INSERT OR DELETE OR UPDATE OF request_id, created_at ON {table}
+FOR EACH ROW EXECUTE FUNCTION {table}_track_request_id();
+
+CREATE FUNCTION {table}_truncate_request_ids() RETURNS trigger AS $$
+BEGIN
+    TRUNCATE {request_ids};
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_truncate
+AFTER TRUNCATE ON {table}
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_truncate_request_ids();
+"""
+
+
+def _qn(name):
+    return connection.ops.quote_name(name)
+
+
+def _month_start(moment):
+    moment = moment.astimezone(dt_timezone.utc)
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def _add_months(month, count):
+    index = month.month - 1 + count
+    return month.replace(year=month.year + index // 12, month=index % 12 + 1)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def partition_table(now=None):
+    """Convert the AIMessage table to a partitioned one. No-op if it already is."""
+    if is_partitioned():
+        return False
+    table, legacy, request_ids = _qn(TABLE), _qn(LEGACY_PARTITION), _qn(REQUEST_IDS_TABLE)
+    now = now or timezone.now()
+
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'LOCK TABLE {table} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'ALTER TABLE {table} RENAME TO {legacy}')
+
+        # The identity sequence belongs to the old table; carry its position over
+        cursor.execute("SELECT pg_get_serial_sequence(%s, 'id')", [LEGACY_PARTITION])
+        (sequence,) = cursor.fetchone()
+        cursor.execute(f'SELECT GREATEST((SELECT last_value FROM {sequence}), (SELECT max(id) FROM {legacy}))')
+        (last_id,) = cursor.fetchone()
+        cursor.execute(f'ALTER TABLE {legacy} ALTER COLUMN id DROP IDENTITY')
+        # Replaced by the partitioned table's (id, created_at) key when attached
+        cursor.execute(f'ALTER TABLE {legacy} DROP CONSTRAINT {_qn(TABLE + "_pkey")}')
+
+        # Free the index names for the new table, which recreates the
+        # non-unique ones; attaching reuses the old table's matching indexes
+        cursor.execute("""
+            SELECT i.relname, pg_get_indexdef(i.oid), x.indisunique
+            FROM pg_index x JOIN pg_class i ON i.oid = x.indexrelid
+            WHERE x.indrelid = %s::regclass
+        """, [LEGACY_PARTITION])
+        indexes = cursor.fetchall()
+        for name, _, _ in indexes:
+            cursor.execute(f'ALTER INDEX {_qn(name)} RENAME TO {_qn(name[:56] + "_legacy")}')
+        cursor.execute("""
+            SELECT conname, pg_get_constraintdef(oid) FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'f'
+        """, [LEGACY_PARTITION])
+        foreign_keys = cursor.fetchall()
+        # Triggers (e.g. the search vector's) move to the new table, which
+        # runs them for every partition
+        cursor.execute("""
+            SELECT tgname, pg_get_triggerdef(oid) FROM pg_trigger
+            WHERE tgrelid = %s::regclass AND NOT tgisinternal
+        """, [LEGACY_PARTITION])
+        triggers = cursor.fetchall()
+        for name, _ in triggers:
+            cursor.execute(f'DROP TRIGGER {_qn(name)} ON {legacy}')
+
+        cursor.execute(
+            f'CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING CONSTRAINTS) '
+            f'PARTITION BY RANGE (created_at)'
+        )
+        sequence = _qn(f'{TABLE}_id_seq')
+        cursor.execute(f'CREATE SEQUENCE {sequence} OWNED BY {table}.id')
+        cursor.execute('SELECT setval(%s, %s)', [f'{TABLE}_id_seq', last_id])
+        cursor.execute(f"ALTER TABLE {table} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_id_seq')")
+        cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {_qn(TABLE + "_pkey")} PRIMARY KEY (id, created_at)')
+        for name, definition, unique in indexes:
+            if not unique:
+                cursor.execute(f'CREATE INDEX {_qn(name)} ON {table}{definition[definition.index(" USING "):]}')
+        for name, definition in foreign_keys:
+            cursor.execute(f'ALTER TABLE {table} ADD CONSTRAINT {_qn(name)} {definition}')
+        for name, definition in triggers:
+            cursor.execute(re.sub(rf' ON \S*{LEGACY_PARTITION} ', f' ON {table} ', definition, count=1))
+
+        max_length = AIMessage._meta.get_field('request_id').max_length
+        cursor.execute(
+            f'CREATE TABLE {request_ids} ('
+            f'request_id varchar({max_length}) PRIMARY KEY, created_at timestamp with time zone NOT NULL)'
+        )
+        cursor.execute(f'CREATE INDEX {_qn(REQUEST_IDS_TABLE + "_created_at")} ON {request_ids} (created_at)')
+        cursor.execute(
+            f"INSERT INTO {request_ids} (request_id, created_at) "
+            f"SELECT request_id, created_at FROM {legacy} WHERE request_id <> ''"
+        )
+        cursor.execute(_TRIGGERS.format(table=TABLE, request_ids=REQUEST_IDS_TABLE))
+
+        cursor.execute(f'SELECT max(created_at) FROM {legacy}')
+        (latest,) = cursor.fetchone()
+        first_month = _add_months(_month_start(max(now, latest or now)), 1)
+        cursor.execute(
+            f'ALTER TABLE {table} ATTACH PARTITION {legacy} FOR VALUES FROM (MINVALUE) TO (%s)',
+            [first_month],
+        )
+        cursor.execute(f'CREATE TABLE {_qn(DEFAULT_PARTITION)} PARTITION OF {table} DEFAULT')
+
+    logger.info(f"Partitioned {TABLE}; existing messages are in {LEGACY_PARTITION}")
+    create_partitions(now=now)
+    return True
+
+
+def list_partitions():
+    """``(name, lower, upper)`` for each range partition, oldest first (lower None = unbounded)."""
+    with connection.cursor() as cursor:
+        cursor.execute("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass
+        """, [TABLE])
+        rows = cursor.fetchall()
+
+    partitions = []
+    for name, bound in rows:
+        if bound == 'DEFAULT':
+            continue
+        # e.g. FOR VALUES FROM ('2026-10-01 00:00:00+00') TO ('2026-11-01 00:00:00+00')
+        lower, upper = (part.strip(" ()'") for part in bound[len('FOR VALUES FROM '):].split(' TO '))
+        partitions.append((name, None if lower == 'MINVALUE' else parse_datetime(lower), parse_datetime(upper)))
+    return sorted(partitions, key=lambda partition: partition[2])
+
+
+def create_partitions(months=None, now=None):
+    """Create monthly partitions through ``months`` months from now. Returns their names."""
+    months = settings.AI_MESSAGE_PARTITION_PREMAKE if months is None else months
+    last = _add_months(_month_start(now or timezone.now()), months)
+    existing = list_partitions()
+    lower = existing[-1][2] if existing else _month_start(now or timezone.now())
+
+    created = []
+    with connection.cursor() as cursor:
+        while lower <= last:
+            upper = _add_months(lower, 1)
+            name = f'{TABLE}_p{lower:%Y%m}'
+            cursor.execute(
+                f'CREATE TABLE {_qn(name)} PARTITION OF {_qn(TABLE)} FOR VALUES FROM (%s) TO (%s)',
+                [lower, upper],
+            )
+            created.append(name)
+            lower = upper
+    if created:
+        logger.info(f"Created AI message partitions: {', '.join(created)}")
+    return created
+
+
+def drop_partitions_before(cutoff, detach=False, dry_run=False):
+    """
+    Remove partitions that only hold messages created before ``cutoff``.
+    With ``detach`` they're kept as standalone tables (e.g. for archiving).
+    Returns their names.
+    """
+    removed = []
+    for name, lower, upper in list_partitions():
+        if upper > cutoff:
+            break
+        removed.append(name)
+        if dry_run:
+            continue
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(f'ALTER TABLE {_qn(TABLE)} DETACH PARTITION {_qn(name)}')
+            # Dropping rows doesn't fire the trigger, so forget their request_ids here
+            if lower is None:
+                cursor.execute(f'DELETE FROM {_qn(REQUEST_IDS_TABLE)} WHERE created_at < %s', [upper])
+            else:
+                cursor.execute(
+                    f'DELETE FROM {_qn(REQUEST_IDS_TABLE)} WHERE created_at >= %s AND created_at < %s',
+                    [lower, upper],
+                )
+            if not detach:
+                cursor.execute(f'DROP TABLE {_qn(name)}')
+        logger.info(f"{'Detached' if detach else 'Dropped'} AI message partition {name}")
+    return removed
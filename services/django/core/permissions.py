@@ -1,41 +1,37 @@
 from rest_framework import permissions
-from .models import TreeMember
+from .models import Tree
+from .roles import get_tree_role, can_edit_tree
+
+
+def _tree_of(obj):
+    if isinstance(obj, Tree):
+        return obj.pk
+    # Use the foreign key id so checking a Node doesn't fetch its Tree
+    tree_id = getattr(obj, 'tree_id', None)
+    if tree_id is None:
+        raise TypeError(f"Can't tell which tree a {type(obj).__name__} belongs to")
+    return tree_id
 
 
 class IsTreeMember(permissions.BasePermission):
     """Check if user is a member of the tree."""
     
     def has_object_permission(self, request, view, obj):
-        # Get the tree from the object
-        tree = getattr(obj, 'tree', obj)
-        
-        # Check if user is a member
-        return TreeMember.objects.filter(
-            tree=tree,
-            user=request.user
-        ).exists()
+        return get_tree_role(request, _tree_of(obj)) is not None
 
 
 class CanEditTree(permissions.BasePermission):
     """Check if user can edit the tree (owner or editor)."""
     
     def has_object_permission(self, request, view, obj):
-        # Get the tree from the object
-        tree = getattr(obj, 'tree', obj)
+        tree = _tree_of(obj)
         
         # Read permissions for all members
         if request.method in permissions.SAFE_METHODS:
-            return TreeMember.objects.filter(
-                tree=tree,
-                user=request.user
-            ).exists()
+            return get_tree_role(request, tree) is not None
         
         # Write permissions only for owner/editor
-        return TreeMember.objects.filter(
-            tree=tree,
-            user=request.user,
-            role__in=['owner', 'editor']
-        ).exists()
+        return can_edit_tree(request, tree)
 
 
 class IsTreeOwner(permissions.BasePermission):
@@ -45,4 +41,12 @@ class IsTreeOwner(permissions.BasePermission):
         # Get the tree from the object
         tree = getattr(obj, 'tree', obj)
         
-        return tree.owner == request.user
+        return tree.owner_id == request.user.id
+
+
+class IsInternalService(permissions.BasePermission):
+    """Allow only requests carrying a valid service token (e.g. from FastAPI)."""
+    
+    def has_permission(self, request, view):
+        # Set by ServiceTokenMiddleware
+        return getattr(request, '_service_token_valid', False)
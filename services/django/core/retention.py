@@ -0,0 +1,155 @@
+"""
+Retention of AI messages.
+
+``AI_MESSAGE_RETENTION`` is a list of policies such as
+``[{"days": 90}, {"type": "quiz", "days": 30}, {"tree": 12, "days": 365}]``.
+A message follows the most specific policy that matches it: tree and type,
+then tree, then type, then the default (no tree or type). A policy with
+``"days": null`` keeps its messages forever.
+
+Expired messages are deleted in bounded chunks: each batch selects up to
+``AI_MESSAGE_CLEANUP_BATCH_SIZE`` ids in id order (the ``created_at``
+index finds them) and removes them with one raw ``DELETE ... WHERE id IN``
+in its own short transaction, sleeping between batches. Nothing is loaded
+into Python beyond the ids, and no long transaction or lock is held.
+AIMessage has no dependent rows or delete signals, so the raw delete
+skips nothing the ORM would have done.
+
+When the table is partitioned (see ``partitions.py``), monthly partitions
+that every policy has expired are dropped whole first.
+"""
+from datetime import timedelta
+import logging
+import time
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AIMessage
+from . import partitions
+
+logger = logging.getLogger(__name__)
+
+
+def _specificity(policy):
+    return (policy.get('tree') is not None) * 2 + (policy.get('type') is not None)
+
+
+def _scope(policy):
+    scope = Q()
+    if policy.get('tree') is not None:
+        scope &= Q(node__tree_id=policy['tree'])
+    if policy.get('type') is not None:
+        scope &= Q(type=policy['type'])
+    return scope
+
+
+def _overlaps(a, b):
+    return all(
+        a.get(key) is None or b.get(key) is None or a[key] == b[key]
+        for key in ('tree', 'type')
+    )
+
+
+def get_policies():
+    """Validated policies from settings, most specific first."""
+    types = {value for value, _ in AIMessage.TYPE_CHOICES}
+    policies = []
+    for policy in settings.AI_MESSAGE_RETENTION:
+        unknown = set(policy) - {'tree', 'type', 'days'}
+        days = policy.get('days')
+        if unknown or 'days' not in policy or (days is not None and (not isinstance(days, int) or days < 0)):
+            raise ImproperlyConfigured(f'Invalid AI_MESSAGE_RETENTION policy: {policy!r}')
+        if policy.get('type') is not None and policy['type'] not in types:
+            raise ImproperlyConfigured(f'Unknown message type in AI_MESSAGE_RETENTION: {policy!r}')
+        policies.append(policy)
+    return sorted(policies, key=_specificity, reverse=True)
+
+
+def expired_messages(policy, policies, now=None):
+    """Messages that ``policy`` governs and that are past its retention."""
+    cutoff = (now or timezone.now()) - timedelta(days=policy['days'])
+    messages = AIMessage.objects.filter(_scope(policy), created_at__lt=cutoff)
+    # Messages matched by a more specific policy follow that one instead
+    for other in policies:
+        if _specificity(other) > _specificity(policy) and _overlaps(other, policy):
+            messages = messages.exclude(_scope(other))
+    return messages
+
+
+def partition_cutoff(policies, now=None):
+    """
+    Time before which every message has expired under every policy, or
+    None if some messages are kept forever.
+    """
+    has_default = any(_specificity(policy) == 0 for policy in policies)
+    if not has_default or any(policy['days'] is None for policy in policies):
+        return None
+    return (now or timezone.now()) - timedelta(days=max(policy['days'] for policy in policies))
+
+
+def _delete_ids(ids):
+    table = connection.ops.quote_name(AIMessage._meta.db_table)
+    placeholders = ', '.join(['%s'] * len(ids))
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {table} WHERE id IN ({placeholders})', ids)
+        return cursor.rowcount
+
+
+def purge_expired_messages(dry_run=False):
+    """
+    Delete expired AI messages under every policy.
+
+    Stops early after ``AI_MESSAGE_CLEANUP_MAX_SECONDS`` (the next run
+    carries on). Returns per-policy metrics.
+    """
+    batch_size = settings.AI_MESSAGE_CLEANUP_BATCH_SIZE
+    pause = settings.AI_MESSAGE_CLEANUP_SLEEP
+    deadline = time.monotonic() + settings.AI_MESSAGE_CLEANUP_MAX_SECONDS
+    policies = get_policies()
+    now = timezone.now()
+    report = []
+
+    cutoff = partition_cutoff(policies, now)
+    if cutoff is not None and partitions.is_partitioned():
+        partitions.drop_partitions_before(cutoff, dry_run=dry_run)
+
+    for policy in policies:
+        if policy['days'] is None:
+            continue
+        messages = expired_messages(policy, policies, now)
+        stats = {'policy': policy, 'deleted': 0, 'batches': 0, 'seconds': 0.0, 'complete': True}
+        started = time.monotonic()
+
+        if dry_run:
+            stats['deleted'] = messages.count()
+        else:
+            last_id = 0
+            while True:
+                if time.monotonic() > deadline:
+                    stats['complete'] = False
+                    break
+                ids = list(
+                    messages.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+                )
+                if not ids:
+                    break
+                stats['deleted'] += _delete_ids(ids)
+                stats['batches'] += 1
+                last_id = ids[-1]
+                if len(ids) < batch_size:
+                    break
+                # Give replication and other queries room between batches
+                time.sleep(pause)
+
+        stats['seconds'] = round(time.monotonic() - started, 3)
+        logger.info(
+            f"AI message retention {policy}: {'would delete' if dry_run else 'deleted'} "
+            f"{stats['deleted']} in {stats['batches']} batches, {stats['seconds']}s"
+            f"{'' if stats['complete'] else ' (time limit reached)'}"
+        )
+        report.append(stats)
+    return report
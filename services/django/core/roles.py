@@ -0,0 +1,102 @@
+"""
+Resolve a user's role on a tree.
+
+Roles are looked up at most once per request and, when enabled, cached in
+Redis as ``(user, tree) -> role`` until the TreeMember row changes.
+"""
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+
+from .models import TreeMember
+
+logger = logging.getLogger(__name__)
+
+# Cached marker for "user is not a member of this tree"
+NO_ROLE = ''
+
+
+def role_cache_key(user_id, tree_id):
+    return f"tree_role:{tree_id}:{user_id}"
+
+
+def membership_exists(user, tree_ref='pk'):
+    """
+    Correlated ``EXISTS`` on TreeMember for filtering by membership.
+
+    ``tree_ref`` is the outer query's path to the tree id (e.g. ``'tree'``
+    for nodes). Unlike joining through ``members__user`` this never
+    duplicates rows, so no ``DISTINCT`` is needed.
+    """
+    return Exists(
+        TreeMember.objects.filter(tree_id=OuterRef(tree_ref), user=user)
+    )
+
+
+def _request_roles(request):
+    """Per-request role memo, shared by the view and its permission classes."""
+    # Store on the underlying HttpRequest so DRF's Request wrapper shares it
+    http_request = getattr(request, '_request', request)
+    roles = getattr(http_request, '_tree_roles', None)
+    if roles is None:
+        roles = {}
+        http_request._tree_roles = roles
+    return roles
+
+
+def _load_role(user_id, tree_id):
+    """Fetch the role from Redis if enabled, falling back to the database."""
+    use_cache = settings.TREE_ROLE_CACHE_ENABLED
+    key = role_cache_key(user_id, tree_id)
+    
+    if use_cache:
+        try:
+            role = cache.get(key)
+            if role is not None:
+                return role or None
+        except Exception as e:
+            # Cache outages must never block permission checks
+            logger.warning(f"Role cache unavailable: {e}")
+            use_cache = False
+    
+    role = TreeMember.objects.filter(
+        tree_id=tree_id,
+        user_id=user_id
+    ).values_list('role', flat=True).first()
+    
+    if use_cache:
+        try:
+            cache.set(key, role or NO_ROLE, settings.TREE_ROLE_CACHE_TIMEOUT)
+        except Exception as e:
+            logger.warning(f"Role cache unavailable: {e}")
+    
+    return role
+
+
+def get_tree_role(request, tree):
+    """Return the request user's role on ``tree`` (a Tree or its id), or None."""
+    user = request.user
+    if not user or not user.is_authenticated:
+        return None
+    
+    tree_id = getattr(tree, 'pk', tree)
+    roles = _request_roles(request)
+    if tree_id not in roles:
+        roles[tree_id] = _load_role(user.pk, tree_id)
+    return roles[tree_id]
+
+
+def can_edit_tree(request, tree):
+    return get_tree_role(request, tree) in TreeMember.EDIT_ROLES
+
+
+def invalidate_tree_role(user_id, tree_id):
+    """Drop a cached role after its TreeMember row changed."""
+    if not settings.TREE_ROLE_CACHE_ENABLED or user_id is None:
+        return
+    try:
+        cache.delete(role_cache_key(user_id, tree_id))
+    except Exception as e:
+        logger.warning(f"Role cache unavailable: {e}")
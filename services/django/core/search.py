@@ -0,0 +1,141 @@
+"""
+Full-text search over nodes and AI messages (Postgres).
+
+``Node.search_vector`` (title, user_notes and ai_notes, weighted in that
+order) and ``AIMessage.search_vector`` (response) are tsvector columns
+kept current by triggers (migration 0009), so bulk writes are covered
+too, and matched through GIN indexes.
+
+Results are ranked with ``ts_rank`` and paginated by keyset on
+``(rank, id)``: the cursor holds the last row's rank and id, so a later
+page costs the same as the first. Highlights are only computed for the
+rows on the page, since ``ts_headline`` re-parses the whole document.
+"""
+import base64
+import json
+
+from django.contrib.postgres.search import SearchHeadline, SearchQuery, SearchRank
+from django.db.models import F, FloatField, Q, Value
+from django.db.models.functions import Cast, Concat
+from django.utils.html import escape
+
+from .models import AIMessage, Node
+from .roles import membership_exists
+
+# Must match the configuration the triggers in migration 0009 use
+SEARCH_CONFIG = 'english'
+
+NODES = 'nodes'
+MESSAGES = 'messages'
+
+# ts_headline marks matches with these; they're swapped for <mark> tags
+# after the text is HTML-escaped
+_START, _STOP = '\x02', '\x03'
+_HEADLINE = {'start_sel': _START, 'stop_sel': _STOP}
+_SNIPPET = {**_HEADLINE, 'max_words': 35, 'min_words': 15}
+
+
+def encode_cursor(rank, pk):
+    return base64.urlsafe_b64encode(json.dumps([rank, pk]).encode()).decode()
+
+
+def decode_cursor(cursor):
+    """``(rank, id)`` from a cursor; raises ValueError if it's malformed."""
+    try:
+        rank, pk = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+    except Exception:
+        raise ValueError('Invalid cursor.')
+    if not isinstance(rank, (int, float)) or not isinstance(pk, int):
+        raise ValueError('Invalid cursor.')
+    return rank, pk
+
+
+def _highlight(text):
+    return escape(text or '').replace(_START, '<mark>').replace(_STOP, '</mark>')
+
+
+def _ranked_page(queryset, query, fields, cursor, limit):
+    """One page of ``queryset`` matching ``query``, best first, and the next cursor."""
+    # ts_rank is a real; as a double the cursor round-trips exactly
+    queryset = queryset.filter(search_vector=query).annotate(
+        rank=Cast(SearchRank(F('search_vector'), query), FloatField())
+    )
+    if cursor:
+        rank, pk = cursor
+        queryset = queryset.filter(Q(rank__lt=rank) | Q(rank=rank, id__lt=pk))
+    rows = list(queryset.order_by('-rank', '-id').values('id', 'rank', *fields)[:limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]['rank'], rows[limit - 1]['id']) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+def search_nodes(user, query, tree=None, cursor=None, limit=20):
+    nodes = Node.objects.filter(membership_exists(user, 'tree'))
+    if tree is not None:
+        nodes = nodes.filter(tree_id=tree)
+    rows, next_cursor = _ranked_page(nodes, query, ['tree_id', 'title'], cursor, limit)
+
+    highlights = {
+        pk: (title, notes) for pk, title, notes in Node.objects.filter(
+            id__in=[row['id'] for row in rows]
+        ).annotate(
+            title_highlight=SearchHeadline('title', query, config=SEARCH_CONFIG, highlight_all=True, **_HEADLINE),
+            notes_highlight=SearchHeadline(
+                Concat('user_notes', Value('\n'), 'ai_notes'), query, config=SEARCH_CONFIG, **_SNIPPET
+            ),
+        ).values_list('id', 'title_highlight', 'notes_highlight')
+    }
+    results = []
+    for row in rows:
+        title, notes = highlights.get(row['id'], (row['title'], ''))
+        results.append({
+            'id': row['id'],
+            'tree': row['tree_id'],
+            'title': row['title'],
+            'rank': row['rank'],
+            'highlights': {'title': _highlight(title), 'notes': _highlight(notes)},
+        })
+    return results, next_cursor
+
+
+def search_messages(user, query, tree=None, type=None, cursor=None, limit=20):
+    messages = AIMessage.objects.filter(membership_exists(user, 'node__tree'))
+    if tree is not None:
+        messages = messages.filter(node__tree_id=tree)
+    if type is not None:
+        messages = messages.filter(type=type)
+    rows, next_cursor = _ranked_page(
+        messages, query, ['node_id', 'node__title', 'node__tree_id', 'type', 'created_at'], cursor, limit
+    )
+
+    highlights = dict(AIMessage.objects.filter(
+        id__in=[row['id'] for row in rows]
+    ).annotate(
+        highlight=SearchHeadline('response', query, config=SEARCH_CONFIG, **_SNIPPET)
+    ).values_list('id', 'highlight'))
+    results = [
+        {
+            'id': row['id'],
+            'node': row['node_id'],
+            'node_title': row['node__title'],
+            'tree': row['node__tree_id'],
+            'type': row['type'],
+            'created_at': row['created_at'],
+            'rank': row['rank'],
+            'highlight': _highlight(highlights.get(row['id'])),
+        }
+        for row in rows
+    ]
+    return results, next_cursor
+
+
+def search(user, q, kind=NODES, tree=None, type=None, cursor=None, limit=20):
+    """
+    Search the trees ``user`` is a member of. ``q`` uses web search syntax
+    (quoted phrases, ``or``, ``-word``). Returns ``{'results', 'next'}``.
+    """
+    query = SearchQuery(q, config=SEARCH_CONFIG, search_type='websearch')
+    if kind == MESSAGES:
+        results, next_cursor = search_messages(user, query, tree, type, cursor, limit)
+    else:
+        results, next_cursor = search_nodes(user, query, tree, cursor, limit)
+    return {'results': results, 'next': next_cursor}
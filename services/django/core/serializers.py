@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Tree, TreeMember, Node, AIMessage
+from .models import Tree, TreeMember, Node, AIMessage, AIBatchJob, TokenUsage
+from . import search
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -29,6 +30,10 @@ class TreeSerializer(serializers.ModelSerializer):
         read_only_fields = ['id', 'owner', 'created_at', 'updated_at']
     
     def get_node_count(self, obj):
+        # TreeViewSet annotates the count; fall back to a query otherwise
+        node_count = getattr(obj, 'node_count', None)
+        if node_count is not None:
+            return node_count
         return obj.nodes.count()
     
     def create(self, validated_data):
@@ -54,26 +59,58 @@ class NodeSerializer(serializers.ModelSerializer):
         model = Node
         fields = [
             'id', 'tree', 'parent', 'title', 'user_notes', 'ai_notes',
-            'sibling_order', 'created_by', 'created_by_username',
+            'sibling_order', 'depth', 'created_by', 'created_by_username',
             'children', 'created_at', 'updated_at'
         ]
-        read_only_fields = ['id', 'created_by', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'depth', 'created_by', 'created_at', 'updated_at']
     
     def get_children(self, obj):
         # Only include children IDs to avoid deep nesting
         return [child.id for child in obj.children.all()]
     
+    def validate(self, attrs):
+        # The tree is fixed once a node exists; its subtree is found by tree
+        # and path, so moving only the node would strand its descendants
+        if self.instance is not None and 'tree' in attrs and attrs['tree'].id != self.instance.tree_id:
+            raise serializers.ValidationError({'tree': 'A node cannot be moved to another tree.'})
+        if 'tree' not in attrs and 'parent' not in attrs:
+            return attrs
+        
+        tree_id = attrs['tree'].id if 'tree' in attrs else self.instance.tree_id
+        if 'parent' in attrs or self.instance is None:
+            parent = attrs.get('parent')
+        else:
+            parent = self.instance.parent
+        
+        if parent is not None:
+            if parent.tree_id != tree_id:
+                raise serializers.ValidationError({'parent': 'Parent must belong to the same tree.'})
+            # A node cannot be moved underneath itself
+            if self.instance is not None and self.instance.subtree_contains(parent):
+                raise serializers.ValidationError({'parent': 'A node cannot be moved into its own subtree.'})
+        
+        return attrs
+    
     def create(self, validated_data):
         validated_data['created_by'] = self.context['request'].user
         return super().create(validated_data)
 
 
 class NodeDetailSerializer(NodeSerializer):
-    """Detailed serializer with nested children for tree view."""
+    """
+    Detailed serializer with nested children for tree view.
+
+    Pass a ``children_index`` (see ``core.tree_builder``) in the context to
+    build the nested structure from memory instead of querying per node.
+    """
     children = serializers.SerializerMethodField()
-    
+
     def get_children(self, obj):
-        children = obj.children.all().order_by('sibling_order')
+        children_index = self.context.get('children_index')
+        if children_index is not None:
+            children = children_index.get(obj.id, [])
+        else:
+            children = obj.children.all().order_by('sibling_order')
         return NodeDetailSerializer(children, many=True, context=self.context).data
 
 
@@ -99,3 +136,130 @@ class AIMessageSerializer(serializers.ModelSerializer):
 class TreeInviteSerializer(serializers.Serializer):
     email = serializers.EmailField()
     role = serializers.ChoiceField(choices=['editor', 'viewer'])
+
+
+class NodeBatchOperationSerializer(serializers.Serializer):
+    """A single create/update/move/delete operation in a node batch."""
+    OP_CHOICES = ['create', 'update', 'move', 'delete']
+    
+    op = serializers.ChoiceField(choices=OP_CHOICES)
+    id = serializers.IntegerField(required=False)
+    temp_id = serializers.CharField(required=False, max_length=100)
+    # Either an existing node id or the temp_id of a node created in the same batch
+    parent = serializers.CharField(required=False, allow_null=True, max_length=100)
+    title = serializers.CharField(required=False, max_length=500)
+    user_notes = serializers.CharField(required=False, allow_blank=True)
+    ai_notes = serializers.CharField(required=False, allow_blank=True)
+    sibling_order = serializers.IntegerField(required=False)
+    
+    def validate(self, attrs):
+        op = attrs['op']
+        if op == 'create':
+            missing = [field for field in ('temp_id', 'title') if field not in attrs]
+        elif op == 'move':
+            missing = [field for field in ('id', 'parent') if field not in attrs]
+        else:
+            missing = [] if 'id' in attrs else ['id']
+        
+        if missing:
+            raise serializers.ValidationError(
+                {field: f'This field is required for {op}.' for field in missing}
+            )
+        if op == 'update' and 'parent' in attrs:
+            raise serializers.ValidationError({'parent': "Use a move operation to change a node's parent."})
+        return attrs
+
+
+class NodeBatchSerializer(serializers.Serializer):
+    MAX_OPERATIONS = 5000
+    
+    operations = NodeBatchOperationSerializer(many=True, allow_empty=False)
+    
+    def validate_operations(self, operations):
+        if len(operations) > self.MAX_OPERATIONS:
+            raise serializers.ValidationError(
+                f'A batch can contain at most {self.MAX_OPERATIONS} operations.'
+            )
+        
+        temp_ids = [op['temp_id'] for op in operations if op['op'] == 'create']
+        if len(temp_ids) != len(set(temp_ids)):
+            raise serializers.ValidationError('temp_id values must be unique within a batch.')
+        return operations
+
+
+class AIMessageIngestSerializer(serializers.Serializer):
+    """A single AI message in a bulk ingest request from an internal service."""
+    node = serializers.IntegerField()
+    type = serializers.ChoiceField(choices=AIMessage.TYPE_CHOICES)
+    prompt = serializers.CharField()
+    response = serializers.CharField(required=False, allow_blank=True, default='')
+    model_name = serializers.CharField(required=False, allow_blank=True, default='', max_length=100)
+    tokens_in = serializers.IntegerField(required=False, default=0)
+    tokens_out = serializers.IntegerField(required=False, default=0)
+    request_id = serializers.CharField(max_length=100)
+    created_by = serializers.IntegerField(required=False, allow_null=True, default=None)
+
+
+class AIMessageIngestBatchSerializer(serializers.Serializer):
+    MAX_MESSAGES = 1000
+    
+    # Items are validated one by one so a bad message doesn't reject the batch
+    messages = serializers.ListField(
+        child=serializers.DictField(),
+        allow_empty=False,
+        max_length=MAX_MESSAGES,
+    )
+
+
+class AIBatchJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = AIBatchJob
+        fields = [
+            'id', 'tree', 'root', 'type', 'additional_context', 'save_to_notes',
+            'status', 'total', 'completed', 'failed', 'error',
+            'created_by', 'created_at', 'updated_at', 'finished_at',
+        ]
+        read_only_fields = [
+            'id', 'status', 'total', 'completed', 'failed', 'error',
+            'created_by', 'created_at', 'updated_at', 'finished_at',
+        ]
+    
+    def validate(self, attrs):
+        root = attrs.get('root')
+        if root is not None and root.tree_id != attrs['tree'].id:
+            raise serializers.ValidationError({'root': 'Node does not belong to this tree.'})
+        return attrs
+
+
+class TokenUsageSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = TokenUsage
+        fields = ['tree', 'day', 'messages', 'tokens_in', 'tokens_out']
+
+
+class TokenUsageQuerySerializer(serializers.Serializer):
+    """Query parameters for the usage report."""
+    start = serializers.DateField(required=False)
+    end = serializers.DateField(required=False)
+    tree = serializers.IntegerField(required=False)
+    
+    def validate(self, attrs):
+        if 'start' in attrs and 'end' in attrs and attrs['start'] > attrs['end']:
+            raise serializers.ValidationError('start must not be after end.')
+        return attrs
+
+
+class SearchQuerySerializer(serializers.Serializer):
+    """Query parameters for full-text search."""
+    q = serializers.CharField(max_length=200)
+    kind = serializers.ChoiceField(choices=[search.NODES, search.MESSAGES], default=search.NODES)
+    tree = serializers.IntegerField(required=False)
+    type = serializers.ChoiceField(choices=AIMessage.TYPE_CHOICES, required=False)
+    cursor = serializers.CharField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=20)
+    
+    def validate_cursor(self, value):
+        try:
+            return search.decode_cursor(value)
+        except ValueError as e:
+            raise serializers.ValidationError(str(e))
@@ -0,0 +1,75 @@
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import TreeMember, Node, AIMessage
+from .roles import invalidate_tree_role
+from .usage import record_usage
+from . import node_context
+
+
+@receiver(post_save, sender=TreeMember)
+@receiver(post_delete, sender=TreeMember)
+def invalidate_member_role(sender, instance, **kwargs):
+    """Keep the cached (user, tree) -> role mapping in sync with TreeMember."""
+    invalidate_tree_role(instance.user_id, instance.tree_id)
+
+
+@receiver(post_save, sender=TreeMember)
+@receiver(post_delete, sender=TreeMember)
+def refresh_tree_members_projection(sender, instance, **kwargs):
+    """Keep the tree's member ids in the node context read-model current."""
+    tree_id = instance.tree_id
+    transaction.on_commit(lambda: node_context.project_tree_members(tree_id))
+
+
+@receiver(post_save, sender=Node)
+def refresh_node_projection(sender, instance, created, **kwargs):
+    """
+    Re-project a saved node, its subtree if descendants' context changed,
+    and its parent(s) if their child lists changed.
+    """
+    # post_save fires before Node.save() syncs the path, so compare on commit
+    previous_path = instance.path
+    previous_parent = instance.ancestor_ids[-1] if instance.ancestor_ids else None
+    loaded = getattr(instance, '_loaded_values', {})
+    renamed = instance.title != loaded.get('title', instance.title)
+    reordered = instance.sibling_order != loaded.get('sibling_order', instance.sibling_order)
+
+    def refresh():
+        moved = not created and instance.path != previous_path
+        if moved or renamed:
+            node_context.project_subtrees([instance])
+        else:
+            node_context.project_nodes([instance])
+
+        if created or moved or renamed or reordered:
+            node_context.project_node_ids({instance.parent_id, previous_parent})
+        instance._loaded_values = {
+            **loaded, 'title': instance.title, 'sibling_order': instance.sibling_order,
+        }
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_delete, sender=Node)
+def forget_node_projection(sender, instance, **kwargs):
+    # Deletion clears instance.pk before the commit callback runs
+    node_id = instance.pk
+    parent_id = instance.parent_id
+
+    def refresh():
+        node_context.forget_nodes([node_id])
+        node_context.project_node_ids([parent_id])
+
+    transaction.on_commit(refresh)
+
+
+@receiver(post_save, sender=AIMessage)
+def add_message_usage(sender, instance, created, raw=False, **kwargs):
+    """Add a new message's tokens to the usage rollup (bulk ingest does this itself)."""
+    if created and not raw:
+        record_usage([(
+            instance.created_by_id, instance.node.tree_id, instance.created_at,
+            instance.tokens_in, instance.tokens_out,
+        )])
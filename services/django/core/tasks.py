@@ -1,65 +1,155 @@
 from celery import shared_task
-from .models import AIMessage, Node
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from .models import AIMessage, AIBatchJob
+from .generation import Progress, ProviderBusy, claim_generation, provider_slot, release_generation
+from .llm import LLMProviderError, get_llm_client
+from .retention import purge_expired_messages
+from .usage import count_tokens
+from . import ai_jobs, partitions
 import logging
 
 logger = logging.getLogger(__name__)
 
 
-@shared_task(bind=True, max_retries=3)
+def _save_message(request_id, **fields):
+    """Store the message once; a concurrent delivery may have stored it already."""
+    try:
+        with transaction.atomic():
+            return AIMessage.objects.create(request_id=request_id, **fields).id
+    except IntegrityError:
+        message_id = AIMessage.objects.filter(request_id=request_id).values_list('id', flat=True).first()
+        if message_id is None:
+            raise
+        return message_id
+
+
+@shared_task(bind=True, max_retries=3, acks_late=True)
 def generate_ai_response_task(self, node_id, message_type, prompt, user_id, request_id):
     """
-    Celery task to generate AI response in the background.
+    Generate an AI response in the background and save it as an AIMessage.
     
-    This is a placeholder for background AI generation.
-    Currently, FastAPI handles AI generation inline.
+    Progress is published to Redis for ``GET /ai/streams/{request_id}``.
+    Runs on the ``ai_interactive`` queue unless sent to ``ai_bulk``. Safe
+    to deliver more than once: only one worker generates a request_id at a
+    time and the unique request_id makes the write idempotent.
     """
+    existing = AIMessage.objects.filter(request_id=request_id).values_list('id', flat=True).first()
+    if existing:
+        logger.info(f"Request {request_id} already processed")
+        return existing
+    
+    if not claim_generation(request_id):
+        # Retried until the other worker has stored the message (returned
+        # above) or its claim expired because it died
+        logger.info(f"Request {request_id} is already being generated, retrying later")
+        delay = settings.AI_PROVIDER_BUSY_RETRY_DELAY
+        raise self.retry(countdown=delay, max_retries=settings.AI_GENERATION_TIMEOUT // delay + 1)
+    
+    client = get_llm_client()
+    progress = Progress(request_id, user_id)
+    usage = {}
     try:
-        logger.info(f"Starting AI generation for node {node_id}, type {message_type}")
-        
-        # Check if this request was already processed (idempotency)
-        existing = AIMessage.objects.filter(request_id=request_id).first()
-        if existing:
-            logger.info(f"Request {request_id} already processed")
-            return existing.id
-        
-        # In a real implementation, this would:
-        # 1. Call LLM provider
-        # 2. Stream/generate response
-        # 3. Save to database
-        
-        # For now, create a placeholder
-        node = Node.objects.get(id=node_id)
-        ai_message = AIMessage.objects.create(
-            node=node,
+        with provider_slot(client.provider):
+            logger.info(f"Starting AI generation for node {node_id}, type {message_type}")
+            progress.start()
+            parts = []
+            for chunk in client.stream(prompt, usage):
+                parts.append(chunk)
+                progress.append(chunk)
+    except ProviderBusy as exc:
+        release_generation(request_id)
+        raise self.retry(
+            exc=exc,
+            countdown=settings.AI_PROVIDER_BUSY_RETRY_DELAY,
+            max_retries=settings.AI_PROVIDER_BUSY_MAX_RETRIES,
+        )
+    except LLMProviderError as exc:
+        release_generation(request_id)
+        logger.error(f"Error in AI generation task: {exc}")
+        # Followers have seen partial output, so it can't be regenerated
+        if exc.retryable and not progress.published and self.request.retries < self.max_retries:
+            raise self.retry(exc=exc, countdown=60)
+        progress.fail('AI provider error')
+        raise
+    except Exception:
+        release_generation(request_id)
+        progress.fail('AI generation failed')
+        raise
+    
+    response = ''.join(parts)
+    try:
+        message_id = _save_message(
+            request_id,
+            node_id=node_id,
             type=message_type,
             prompt=prompt,
-            response="Background task response (placeholder)",
-            model_name="celery-worker",
-            tokens_in=len(prompt.split()),
-            tokens_out=10,
-            request_id=request_id,
-            created_by_id=user_id
+            response=response,
+            model_name=client.model_name,
+            tokens_in=usage.get('input_tokens') or count_tokens(prompt, client.model_name),
+            tokens_out=usage.get('output_tokens') or count_tokens(response, client.model_name),
+            created_by_id=user_id,
         )
-        
-        logger.info(f"AI message {ai_message.id} created successfully")
-        return ai_message.id
-        
-    except Exception as exc:
-        logger.error(f"Error in AI generation task: {exc}")
-        raise self.retry(exc=exc, countdown=60)
+    except Exception:
+        release_generation(request_id)
+        progress.fail('Could not save the AI response')
+        raise
+    
+    progress.finish(message_id)
+    release_generation(request_id)
+    logger.info(f"AI message {message_id} created successfully")
+    return message_id
+
+
+@shared_task(bind=True, acks_late=True, max_retries=3)
+def run_ai_batch_job(self, job_id):
+    """
+    Run a tree/subtree AI batch job (see ``core.ai_jobs``) on the bulk queue.
+    
+    Acknowledged only when done, so a job whose worker crashed is delivered
+    again and resumes where it stopped. If an earlier run still holds the
+    job's claim, retried once the claim can have expired.
+    """
+    try:
+        return ai_jobs.run_job(job_id)
+    except ai_jobs.JobClaimed as exc:
+        raise self.retry(exc=exc, countdown=settings.AI_BATCH_CLAIM_TIMEOUT)
 
 
 @shared_task
-def cleanup_old_ai_messages():
+def resume_stale_ai_jobs():
     """
-    Periodic task to clean up old AI messages.
-    Can be configured with Celery Beat.
+    Re-queue AI batch jobs that stopped reporting progress (e.g. their
+    worker was killed) or were never picked up. Scheduled by Celery Beat
+    (``CELERY_BEAT_SCHEDULE``).
     """
     from django.utils import timezone
     from datetime import timedelta
     
-    cutoff_date = timezone.now() - timedelta(days=90)
-    deleted_count = AIMessage.objects.filter(created_at__lt=cutoff_date).delete()[0]
+    cutoff = timezone.now() - timedelta(seconds=settings.AI_BATCH_STALE_AFTER)
+    stale = list(AIBatchJob.objects.filter(
+        status__in=AIBatchJob.ACTIVE_STATUSES, updated_at__lt=cutoff
+    ).values_list('id', flat=True))
+    for job_id in stale:
+        run_ai_batch_job.delay(job_id)
+    
+    logger.info(f"Re-queued {len(stale)} stale AI batch jobs")
+    return len(stale)
+
+
+@shared_task
+def cleanup_old_ai_messages():
+    """
+    Periodic task to delete AI messages past their retention policy
+    (``AI_MESSAGE_RETENTION``) in small batches. Can be configured with
+    Celery Beat.
+    
+    On a partitioned table it also creates upcoming monthly partitions.
+    """
+    if partitions.is_partitioned():
+        partitions.create_partitions()
+    report = purge_expired_messages()
+    deleted_count = sum(stats['deleted'] for stats in report)
     
     logger.info(f"Cleaned up {deleted_count} old AI messages")
     return deleted_count
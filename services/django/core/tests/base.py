@@ -0,0 +1,24 @@
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from core.models import Node, Tree, TreeMember
+
+
+@override_settings(NODE_CONTEXT_PROJECTION_ENABLED=False)
+class TreeTestCase(TestCase):
+    """``self.user`` owns ``self.tree``; ``self.client`` is authenticated as them."""
+    username = 'owner'
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user(cls.username, password='pw')
+        cls.tree = Tree.objects.create(owner=cls.user, title='Tree')
+        TreeMember.objects.create(tree=cls.tree, user=cls.user, role='owner')
+    
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+    
+    def node(self, title, parent=None, tree=None, **fields):
+        return Node.objects.create(tree=tree or self.tree, parent=parent, title=title, **fields)
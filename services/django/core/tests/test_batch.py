@@ -0,0 +1,73 @@
+from core.models import AIMessage, Node, Tree
+
+from .base import TreeTestCase
+
+
+class NodeBatchTests(TreeTestCase):
+    def batch(self, *operations):
+        return self.client.post(
+            f'/api/trees/{self.tree.pk}/nodes/batch/', {'operations': list(operations)}, format='json'
+        )
+    
+    def test_create_nested_nodes(self):
+        root = self.node('Root')
+        response = self.batch(
+            {'op': 'create', 'temp_id': 'b', 'parent': 'a', 'title': 'B'},
+            {'op': 'create', 'temp_id': 'a', 'parent': str(root.pk), 'title': 'A'},
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        a = Node.objects.get(pk=response.data['created']['a'])
+        b = Node.objects.get(pk=response.data['created']['b'])
+        self.assertEqual(b.parent, a)
+        self.assertEqual(b.path, f'{root.pk}/{a.pk}/{b.pk}/')
+        self.assertEqual(b.depth, 2)
+    
+    def test_update_fields(self):
+        node = self.node('Old')
+        response = self.batch({'op': 'update', 'id': node.pk, 'title': 'New', 'sibling_order': 3})
+        
+        self.assertEqual(response.status_code, 200)
+        node.refresh_from_db()
+        self.assertEqual((node.title, node.sibling_order), ('New', 3))
+    
+    def test_update_rejects_parent(self):
+        a, b = self.node('A'), self.node('B')
+        response = self.batch({'op': 'update', 'id': b.pk, 'parent': str(a.pk)})
+        
+        self.assertEqual(response.status_code, 400)
+        b.refresh_from_db()
+        self.assertIsNone(b.parent_id)
+    
+    def test_move_into_own_subtree_is_rejected(self):
+        a = self.node('A')
+        child = self.node('Child', a)
+        response = self.batch({'op': 'move', 'id': a.pk, 'parent': str(child.pk)})
+        
+        self.assertEqual(response.status_code, 400)
+    
+    def test_delete_removes_subtrees_after_moves(self):
+        a, b = self.node('A'), self.node('B')
+        child = self.node('Child', a)
+        grandchild = self.node('Grandchild', child)
+        AIMessage.objects.create(node=grandchild, type='explain', prompt='Explain')
+        keep = self.node('Keep', b)
+        other_tree = Tree.objects.create(owner=self.user, title='Other')
+        elsewhere = self.node('Elsewhere', tree=other_tree)
+        
+        response = self.batch(
+            {'op': 'move', 'id': child.pk, 'parent': str(b.pk)},
+            {'op': 'delete', 'id': child.pk},
+        )
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(set(Node.objects.all()), {a, b, keep, elsewhere})
+        self.assertFalse(AIMessage.objects.exists())
+    
+    def test_nodes_of_other_trees_are_rejected(self):
+        other_tree = Tree.objects.create(owner=self.user, title='Other')
+        elsewhere = self.node('Elsewhere', tree=other_tree)
+        response = self.batch({'op': 'delete', 'id': elsewhere.pk})
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Node.objects.filter(pk=elsewhere.pk).exists())
@@ -0,0 +1,71 @@
+import json
+from unittest import skipUnless
+
+from django.db import connection
+from django.db.models.functions import Collate
+
+from core.models import Node
+
+from .base import TreeTestCase
+
+
+class TreeExportTests(TreeTestCase):
+    def export(self, **headers):
+        response = self.client.get(f'/api/trees/{self.tree.pk}/export/', **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        return [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+    
+    def test_json_accept_header_is_not_refused(self):
+        self.node('Root')
+        
+        self.assertEqual(len(self.export(HTTP_ACCEPT='application/json')), 1)
+    
+    def test_ndjson_format(self):
+        root = self.node('Root', user_notes='Notes', created_by=self.user)
+        child = self.node('Child', root, sibling_order=2)
+        response = self.client.get(f'/api/trees/{self.tree.pk}/export/?format=ndjson')
+        
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual(len(lines), 2)
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row['id'] for row in rows], [root.pk, child.pk])
+        self.assertEqual(set(rows[0]), {
+            'id', 'parent', 'title', 'user_notes', 'ai_notes', 'sibling_order',
+            'depth', 'created_by', 'created_at', 'updated_at',
+        })
+        self.assertEqual(
+            (rows[0]['parent'], rows[0]['title'], rows[0]['user_notes'], rows[0]['depth'], rows[0]['created_by']),
+            (None, 'Root', 'Notes', 0, self.user.pk),
+        )
+        self.assertEqual(
+            (rows[1]['parent'], rows[1]['title'], rows[1]['sibling_order'], rows[1]['depth']),
+            (root.pk, 'Child', 2, 1),
+        )
+    
+    def test_parents_come_before_children(self):
+        roots = [self.node(f'Root {i}') for i in range(3)]
+        # Created last, so its id sorts after nodes elsewhere in the tree
+        for root in reversed(roots):
+            child = self.node('Child', root)
+            self.node('Grandchild', child)
+        
+        seen = set()
+        for row in self.export():
+            self.assertTrue(row['parent'] is None or row['parent'] in seen)
+            seen.add(row['id'])
+        self.assertEqual(len(seen), 9)
+    
+    @skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+    def test_export_order_needs_no_sort(self):
+        queryset = Node.objects.filter(tree=self.tree).order_by(Collate('path', 'C'))
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+            cursor.execute(f'EXPLAIN {sql}', params)
+            plan = '\n'.join(row[0] for row in cursor.fetchall())
+            cursor.execute('RESET enable_seqscan')
+        
+        self.assertIn('node_tree_path_idx', plan)
+        self.assertNotIn('Sort', plan)
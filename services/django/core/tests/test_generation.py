@@ -0,0 +1,42 @@
+from unittest import mock
+
+import redis
+from celery.exceptions import Retry
+from django.test import SimpleTestCase, override_settings
+
+from core import generation, tasks
+
+
+@override_settings(AI_STREAM_FLUSH_INTERVAL=0)
+class ProgressTests(SimpleTestCase):
+    def setUp(self):
+        self.redis = mock.MagicMock()
+        patcher = mock.patch.object(generation, 'get_redis', return_value=self.redis)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.pipe = self.redis.pipeline.return_value
+    
+    def test_chunks_stay_buffered_until_published(self):
+        progress = generation.Progress('r1', 1)
+        self.pipe.execute.side_effect = redis.ConnectionError('down')
+        progress.append('Hello ')
+        
+        self.assertEqual(progress.unsaved, ['Hello '])
+        self.assertFalse(progress.published)
+        
+        self.pipe.execute.side_effect = None
+        progress.append('world')
+        
+        self.pipe.append.assert_called_with(progress.text_key, 'Hello world')
+        self.assertEqual(progress.unsaved, [])
+        self.assertTrue(progress.published)
+
+
+class GenerateAIResponseTaskTests(SimpleTestCase):
+    @mock.patch.object(tasks, 'claim_generation', return_value=False)
+    @mock.patch.object(tasks.AIMessage.objects, 'filter')
+    def test_retries_while_another_worker_holds_the_claim(self, filter_messages, claim):
+        filter_messages.return_value.values_list.return_value.first.return_value = None
+        
+        with self.assertRaises(Retry):
+            tasks.generate_ai_response_task(1, 'explain', 'Explain', 1, 'r1')
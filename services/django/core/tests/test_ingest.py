@@ -0,0 +1,89 @@
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.test import TestCase
+
+from core import ingest
+from core.models import AIMessage, Node, TokenUsage, Tree
+
+
+class IngestAIMessagesTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('ingest', password='pw')
+        cls.tree = Tree.objects.create(owner=cls.user, title='Tree')
+        cls.node = Node.objects.create(tree=cls.tree, title='Root')
+    
+    def message(self, request_id, **fields):
+        return {
+            'node': self.node.pk,
+            'type': 'explain',
+            'prompt': 'Explain',
+            'response': 'Because',
+            'tokens_in': 10,
+            'tokens_out': 20,
+            'request_id': request_id,
+            'created_by': self.user.pk,
+            **fields,
+        }
+    
+    def usage(self):
+        return TokenUsage.objects.get(user=self.user, tree=self.tree)
+    
+    def test_creates_and_records_usage(self):
+        results = ingest.ingest_ai_messages([self.message('a'), self.message('b')])
+        
+        self.assertEqual([r['status'] for r in results], [ingest.CREATED, ingest.CREATED])
+        self.assertEqual(
+            {r['id'] for r in results},
+            set(AIMessage.objects.values_list('id', flat=True)),
+        )
+        usage = self.usage()
+        self.assertEqual((usage.messages, usage.tokens_in, usage.tokens_out), (2, 20, 40))
+    
+    def test_retry_is_reported_as_duplicate(self):
+        first = ingest.ingest_ai_messages([self.message('a')])
+        second = ingest.ingest_ai_messages([self.message('a'), self.message('a')])
+        
+        self.assertEqual([r['status'] for r in second], [ingest.DUPLICATE, ingest.DUPLICATE])
+        self.assertEqual({r['id'] for r in second}, {first[0]['id']})
+        self.assertEqual(AIMessage.objects.count(), 1)
+        self.assertEqual(self.usage().messages, 1)
+    
+    def test_concurrent_duplicate_is_not_counted(self):
+        stored_ids = ingest._stored_ids
+        
+        # Another request stores 'a' after this one looked it up
+        def racing_lookup(request_ids):
+            if AIMessage.objects.exists():
+                return stored_ids(request_ids)
+            AIMessage.objects.create(
+                node=self.node, type='explain', prompt='Explain', tokens_in=10, tokens_out=20,
+                request_id='a', created_by=self.user,
+            )
+            return {}
+        
+        with mock.patch.object(ingest, '_stored_ids', side_effect=racing_lookup):
+            results = ingest.ingest_ai_messages([self.message('a'), self.message('b')])
+        
+        self.assertEqual([r['status'] for r in results], [ingest.DUPLICATE, ingest.CREATED])
+        self.assertEqual(results[0]['id'], AIMessage.objects.get(request_id='a').pk)
+        self.assertEqual(AIMessage.objects.count(), 2)
+        # One message from the racing request, one from this one
+        self.assertEqual(self.usage().messages, AIMessage.objects.count())
+    
+    def test_invalid_messages_do_not_reject_the_batch(self):
+        results = ingest.ingest_ai_messages([
+            self.message('a', node=0),
+            self.message('b', created_by=0),
+            self.message('c', type='nope'),
+            self.message('d'),
+        ])
+        
+        self.assertEqual(
+            [r['status'] for r in results],
+            [ingest.INVALID, ingest.INVALID, ingest.INVALID, ingest.CREATED],
+        )
+        self.assertIn('node', results[0]['errors'])
+        self.assertIn('created_by', results[1]['errors'])
+        self.assertEqual(self.usage().messages, 1)
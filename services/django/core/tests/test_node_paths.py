@@ -0,0 +1,72 @@
+from core.models import Node, Tree, TreeMember
+
+from .base import TreeTestCase
+
+
+class NodePathTests(TreeTestCase):
+    def test_new_nodes_get_paths(self):
+        root = self.node('Root')
+        child = self.node('Child', root)
+        grandchild = self.node('Grandchild', child)
+        
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.path, f'{root.pk}/{child.pk}/{grandchild.pk}/')
+        self.assertEqual(grandchild.depth, 2)
+        self.assertEqual(grandchild.ancestor_ids, [root.pk, child.pk])
+        self.assertEqual(list(root.descendants().order_by('depth')), [child, grandchild])
+    
+    def test_moving_a_node_rewrites_its_subtree(self):
+        a, b = self.node('A'), self.node('B')
+        child = self.node('Child', a)
+        grandchild = self.node('Grandchild', child)
+        
+        child.parent = b
+        child.save()
+        
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.path, f'{b.pk}/{child.pk}/{grandchild.pk}/')
+        self.assertEqual(grandchild.depth, 2)
+        self.assertFalse(a.descendants().exists())
+        
+        child.parent = None
+        child.save()
+        grandchild.refresh_from_db()
+        self.assertEqual(grandchild.path, f'{child.pk}/{grandchild.pk}/')
+        self.assertEqual(grandchild.depth, 1)
+    
+    def test_a_node_without_a_path_has_no_descendants(self):
+        self.node('Other')
+        node = Node(pk=0, tree=self.tree, title='Unsaved')
+        
+        self.assertFalse(node.descendants().exists())
+        self.assertFalse(node.subtree().exists())
+    
+    def test_delete_removes_only_the_subtree(self):
+        root = self.node('Root')
+        child = self.node('Child', root)
+        self.node('Grandchild', child)
+        sibling = self.node('Sibling', root)
+        other_tree = Tree.objects.create(owner=self.user, title='Other')
+        elsewhere = self.node('Elsewhere', tree=other_tree)
+        
+        response = self.client.delete(f'/api/nodes/{child.pk}/')
+        
+        self.assertEqual(response.status_code, 204)
+        self.assertEqual(set(Node.objects.all()), {root, sibling, elsewhere})
+    
+    def test_update_cannot_change_tree(self):
+        root = self.node('Root')
+        child = self.node('Child', root)
+        other_tree = Tree.objects.create(owner=self.user, title='Other')
+        TreeMember.objects.create(tree=other_tree, user=self.user, role='owner')
+        
+        response = self.client.patch(f'/api/nodes/{root.pk}/', {'tree': other_tree.pk}, format='json')
+        
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('tree', response.data)
+        root.refresh_from_db()
+        self.assertEqual(root.tree, self.tree)
+        self.assertEqual(list(root.descendants()), [child])
+        # Sending the node's own tree is still fine
+        response = self.client.patch(f'/api/nodes/{root.pk}/', {'tree': self.tree.pk, 'title': 'New'}, format='json')
+        self.assertEqual(response.status_code, 200)
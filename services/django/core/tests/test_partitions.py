@@ -0,0 +1,107 @@
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase
+
+from core import ingest, partitions
+from core.models import AIMessage, Node, Tree
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Partitioning requires PostgreSQL')
+class PartitionTableTests(TestCase):
+    """Converting runs inside the test's transaction, so it's rolled back after each test."""
+    
+    NOW = datetime(2026, 10, 17, tzinfo=dt_timezone.utc)
+    
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('partitions', password='pw')
+        cls.tree = Tree.objects.create(owner=cls.user, title='Tree')
+        cls.node = Node.objects.create(tree=cls.tree, title='Root')
+    
+    def message(self, request_id='', created_at=None):
+        message = AIMessage.objects.create(
+            node=self.node, type='explain', prompt='Explain', response='Because', request_id=request_id,
+        )
+        if created_at:
+            AIMessage.objects.filter(pk=message.pk).update(created_at=created_at)
+        return message
+    
+    def convert(self):
+        # Django's FK checks are deferred; ALTER TABLE refuses to run with
+        # checks pending, which only happens because the test never commits
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        return partitions.partition_table(now=self.NOW)
+    
+    def test_existing_messages_become_the_first_partition(self):
+        old = self.message('old', created_at=datetime(2026, 9, 3, tzinfo=dt_timezone.utc))
+        
+        self.assertTrue(self.convert())
+        self.assertTrue(partitions.is_partitioned())
+        self.assertFalse(self.convert())
+        
+        names = [name for name, _, _ in partitions.list_partitions()]
+        self.assertEqual(names[0], partitions.LEGACY_PARTITION)
+        self.assertIn(f'{partitions.TABLE}_p202612', names)
+        self.assertEqual(AIMessage.objects.get(request_id='old').pk, old.pk)
+        # The id sequence carries on from the converted table
+        self.assertGreater(self.message('new').pk, old.pk)
+    
+    def test_request_id_stays_unique(self):
+        self.message('a')
+        self.convert()
+        
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            self.message('a')
+        # Blank request_ids are exempt
+        self.message()
+        self.message()
+        
+        results = ingest.ingest_ai_messages([
+            {'node': self.node.pk, 'type': 'quiz', 'prompt': 'Quiz', 'request_id': request_id}
+            for request_id in ['a', 'b']
+        ])
+        self.assertEqual([r['status'] for r in results], [ingest.DUPLICATE, ingest.CREATED])
+        
+        # Deleting a message frees its request_id
+        AIMessage.objects.filter(request_id='a').delete()
+        self.message('a')
+    
+    def test_rows_outside_the_monthly_ranges_go_to_the_default_partition(self):
+        self.convert()
+        self.message('future', created_at=datetime(2030, 1, 1, tzinfo=dt_timezone.utc))
+        
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {partitions.DEFAULT_PARTITION}')
+            self.assertEqual(cursor.fetchone()[0], 1)
+    
+    def test_dropping_partitions_frees_their_request_ids(self):
+        self.message('old', created_at=datetime(2026, 9, 3, tzinfo=dt_timezone.utc))
+        self.convert()
+        self.message('kept', created_at=datetime(2026, 12, 5, tzinfo=dt_timezone.utc))
+        
+        dropped = partitions.drop_partitions_before(datetime(2026, 12, 1, tzinfo=dt_timezone.utc))
+        
+        self.assertIn(partitions.LEGACY_PARTITION, dropped)
+        self.assertEqual(list(AIMessage.objects.values_list('request_id', flat=True)), ['kept'])
+        self.message('old')
+    
+    def test_create_partitions_command_requires_convert(self):
+        out = StringIO()
+        with self.assertRaises(CommandError):
+            call_command('create_ai_message_partitions', stdout=out)
+        self.assertFalse(partitions.is_partitioned())
+        
+        with connection.cursor() as cursor:
+            cursor.execute('SET CONSTRAINTS ALL IMMEDIATE')
+        call_command('create_ai_message_partitions', '--convert', stdout=out)
+        self.assertTrue(partitions.is_partitioned())
+    
+    def test_model_state_matches_migrations(self):
+        # Holds for both layouts since neither uniqueness form is in the state
+        call_command('makemigrations', 'core', '--check', '--dry-run', stdout=StringIO())
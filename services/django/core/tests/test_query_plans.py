@@ -0,0 +1,32 @@
+from unittest import skipUnless
+
+from django.db import connection
+from django.test import TestCase
+
+from core.management.commands._benchmark_data import get_bench_user, seed_bench_data
+from core.management.commands.check_query_plans import hot_queries, seq_scans
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Query plans are checked on PostgreSQL')
+class HotQueryPlanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        # Each user in a few trees, so membership stays selective
+        seed_bench_data(users=50, trees=40, nodes_per_tree=10, messages_per_node=1, members_per_tree=3)
+    
+    def setUp(self):
+        # On a table this small a sequential scan is the cheapest plan; with
+        # it disabled the planner still falls back to one only when no index
+        # can serve the query
+        with connection.cursor() as cursor:
+            cursor.execute('SET enable_seqscan = off')
+        self.addCleanup(self.reset_seqscan)
+    
+    def reset_seqscan(self):
+        with connection.cursor() as cursor:
+            cursor.execute('RESET enable_seqscan')
+    
+    def test_hot_queries_use_indexes(self):
+        for name, queryset in hot_queries(get_bench_user()):
+            with self.subTest(name):
+                self.assertEqual(seq_scans(queryset), [])
@@ -0,0 +1,79 @@
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.db import connection
+
+from core.models import AIMessage, Node, Tree, TreeMember
+
+from .base import TreeTestCase
+
+
+@skipUnless(connection.vendor == 'postgresql', 'Full-text search needs PostgreSQL')
+class SearchPaginationTests(TreeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # Several nodes per rank, so pages split rows with equal ranks
+        cls.nodes = [
+            Node.objects.create(tree=cls.tree, title='Photosynthesis', user_notes='light ' * (i % 4))
+            for i in range(23)
+        ]
+        for node in cls.nodes[:9]:
+            AIMessage.objects.create(
+                node=node, type='explain', prompt='p', response=f'Photosynthesis needs light {node.pk}'
+            )
+        
+        other = User.objects.create_user('other', password='pw')
+        other_tree = Tree.objects.create(owner=other, title='Other')
+        TreeMember.objects.create(tree=other_tree, user=other, role='owner')
+        Node.objects.create(tree=other_tree, title='Photosynthesis')
+    
+    def pages(self, **params):
+        pages, cursor = [], None
+        while True:
+            query = {'q': 'photosynthesis light', 'limit': 5, **params}
+            if cursor:
+                query['cursor'] = cursor
+            response = self.client.get('/api/search/', query)
+            self.assertEqual(response.status_code, 200)
+            pages.append(response.data['results'])
+            cursor = response.data['next']
+            if cursor is None:
+                return pages
+    
+    def assert_paginated(self, pages, expected_ids):
+        rows = [row for page in pages for row in page]
+        self.assertTrue(all(len(page) == 5 for page in pages[:-1]))
+        self.assertEqual(sorted(row['id'] for row in rows), sorted(expected_ids))
+        # Best first, ties by id descending, across page boundaries
+        keys = [(row['rank'], row['id']) for row in rows]
+        self.assertEqual(keys, sorted(keys, reverse=True))
+    
+    def test_node_pages_cover_every_match_once(self):
+        pages = self.pages(q='photosynthesis')
+        
+        self.assertEqual(len(pages), 5)
+        self.assert_paginated(pages, [node.pk for node in self.nodes])
+    
+    def test_ranked_node_pages(self):
+        pages = self.pages()
+        
+        expected = [node.pk for i, node in enumerate(self.nodes) if i % 4]
+        self.assert_paginated(pages, expected)
+        self.assertIn('<mark>', pages[0][0]['highlights']['notes'])
+    
+    def test_message_pages(self):
+        pages = self.pages(kind='messages', tree=self.tree.pk)
+        
+        self.assert_paginated(pages, AIMessage.objects.values_list('id', flat=True))
+    
+    def test_last_page_has_no_cursor(self):
+        response = self.client.get('/api/search/', {'q': 'photosynthesis', 'limit': 23})
+        
+        self.assertEqual(len(response.data['results']), 23)
+        self.assertIsNone(response.data['next'])
+    
+    def test_invalid_cursor(self):
+        response = self.client.get('/api/search/', {'q': 'photosynthesis', 'cursor': 'not-a-cursor'})
+        
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,45 @@
+from django.contrib.auth.models import User
+
+from core.models import Node, Tree, TreeMember
+
+from .base import TreeTestCase
+
+
+class TreeListQueryTests(TreeTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        cls.others = [User.objects.create_user(f'member{i}', password='pw') for i in range(3)]
+    
+    def add_trees(self, count):
+        for i in range(count):
+            tree = Tree.objects.create(owner=self.user, title=f'Tree {i}')
+            TreeMember.objects.create(tree=tree, user=self.user, role='owner')
+            for other in self.others:
+                TreeMember.objects.create(tree=tree, user=other, role='viewer')
+            root = Node.objects.create(tree=tree, title='Root')
+            Node.objects.create(tree=tree, parent=root, title='Child')
+    
+    def test_list_query_count_does_not_grow_with_trees(self):
+        # Page count, trees (with owner and node counts), members with users;
+        # first with only the base class's tree
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/trees/')
+        self.assertEqual(response.status_code, 200)
+        
+        self.add_trees(9)
+        with self.assertNumQueries(3):
+            response = self.client.get('/api/trees/')
+        self.assertEqual(response.data['count'], 10)
+        tree = response.data['results'][0]
+        self.assertEqual(tree['node_count'], 2)
+        self.assertEqual(len(tree['members']), 4)
+        self.assertEqual(tree['owner']['username'], 'owner')
+    
+    def test_other_users_trees_are_not_listed(self):
+        self.add_trees(2)
+        stranger = User.objects.create_user('stranger', password='pw')
+        self.client.force_authenticate(stranger)
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/trees/')
+        self.assertEqual(response.data['count'], 0)
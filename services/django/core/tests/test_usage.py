@@ -0,0 +1,40 @@
+import sys
+from types import SimpleNamespace
+from unittest import mock
+
+from django.test import SimpleTestCase
+
+from core import usage
+
+
+class FakeEncoding:
+    def __init__(self, name):
+        self.name = name
+    
+    def encode(self, text, disallowed_special=()):
+        return text.split()
+
+
+def fake_tiktoken():
+    def encoding_for_model(model_name):
+        if model_name != 'gpt-4o':
+            raise KeyError(model_name)
+        return FakeEncoding('o200k_base')
+    
+    return SimpleNamespace(encoding_for_model=encoding_for_model, get_encoding=FakeEncoding)
+
+
+class CountTokensTests(SimpleTestCase):
+    def setUp(self):
+        usage._encoding_for.cache_clear()
+        self.addCleanup(usage._encoding_for.cache_clear)
+    
+    def test_encoding_is_chosen_per_model(self):
+        with mock.patch.dict(sys.modules, {'tiktoken': fake_tiktoken()}):
+            self.assertEqual(usage._encoding_for('gpt-4o').name, 'o200k_base')
+            self.assertEqual(usage._encoding_for('claude-3-5-sonnet').name, usage.FALLBACK_ENCODING)
+            self.assertEqual(usage.count_tokens('three short words', 'gpt-4o'), 3)
+    
+    def test_estimate_without_tiktoken(self):
+        with mock.patch.dict(sys.modules, {'tiktoken': None}):
+            self.assertEqual(usage.count_tokens('x' * 10, 'gpt-4o'), 3)
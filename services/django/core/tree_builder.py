@@ -0,0 +1,32 @@
+"""
+Helpers for assembling a whole tree of nodes in memory.
+
+All nodes of a tree are loaded with a single query and grouped by parent,
+so nested serialization never has to go back to the database.
+"""
+from collections import defaultdict
+
+from .models import Node
+
+
+def load_tree_nodes(tree):
+    """Fetch every node of a tree (with its creator) in one query."""
+    return list(
+        Node.objects.filter(tree=tree)
+        .select_related('created_by')
+        .defer('search_vector')
+        .order_by('sibling_order', 'id')
+    )
+
+
+def build_children_index(nodes):
+    """Group nodes by parent id, keeping sibling order. Roots live under None."""
+    children_index = defaultdict(list)
+    for node in nodes:
+        children_index[node.parent_id].append(node)
+    return children_index
+
+
+def get_tree_index(tree):
+    """Load a tree and return its parent-to-children index."""
+    return build_children_index(load_tree_nodes(tree))
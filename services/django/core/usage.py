@@ -0,0 +1,100 @@
+"""
+Token counting and the per-user/per-tree/per-day usage rollup.
+
+Every stored AI message adds its tokens to a ``TokenUsage`` row with an
+``INSERT ... ON CONFLICT DO UPDATE``, so concurrent writers increment the
+same row without read-modify-write races and reports read a handful of
+rollup rows instead of aggregating ``AIMessage``.
+"""
+from collections import defaultdict
+from functools import lru_cache
+import logging
+
+from django.db import connection
+from django.utils import timezone
+
+from .models import TokenUsage
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+# Encoding for models tiktoken doesn't know (e.g. Anthropic); the FastAPI
+# service (tokens.py) picks encodings the same way
+FALLBACK_ENCODING = 'cl100k_base'
+
+
+@lru_cache(maxsize=32)
+def _encoding_for(model_name):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        # Encodings are downloaded on first use; offline hosts fall back
+        logger.warning(f"Could not load tokenizer, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text, model_name=''):
+    """
+    Tokens in ``text`` for ``model_name``; estimated from its length if
+    tiktoken or its encoding is unavailable.
+    """
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+_UPSERT = """
+    INSERT INTO {table} (user_id, tree_id, day, messages, tokens_in, tokens_out)
+    VALUES {values}
+    ON CONFLICT ({target}) WHERE {condition} DO UPDATE SET
+        messages = {table}.messages + EXCLUDED.messages,
+        tokens_in = {table}.tokens_in + EXCLUDED.tokens_in,
+        tokens_out = {table}.tokens_out + EXCLUDED.tokens_out
+"""
+
+
+def record_usage(messages):
+    """
+    Add ``messages`` to the rollup.
+    
+    ``messages`` are ``(user_id, tree_id, created_at, tokens_in, tokens_out)``
+    tuples. Call this in the same transaction that stores the messages.
+    """
+    totals = defaultdict(lambda: [0, 0, 0])
+    for user_id, tree_id, created_at, tokens_in, tokens_out in messages:
+        row = totals[(user_id, tree_id, timezone.localdate(created_at))]
+        row[0] += 1
+        row[1] += tokens_in or 0
+        row[2] += tokens_out or 0
+    if not totals:
+        return
+    
+    # The partial unique indexes differ on user_id, so upsert each kind separately
+    for has_user in (True, False):
+        rows = [
+            (user_id, tree_id, day, *counts)
+            for (user_id, tree_id, day), counts in totals.items()
+            if (user_id is not None) == has_user
+        ]
+        if not rows:
+            continue
+        sql = _UPSERT.format(
+            table=TokenUsage._meta.db_table,
+            values=', '.join(['(%s, %s, %s, %s, %s, %s)'] * len(rows)),
+            target='user_id, tree_id, day' if has_user else 'tree_id, day',
+            condition='user_id IS NOT NULL' if has_user else 'user_id IS NULL',
+        )
+        params = [value for row in rows for value in row]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
@@ -1,21 +1,45 @@
-from rest_framework import viewsets, status, generics
+from rest_framework import viewsets, status, generics, mixins
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
+from rest_framework.exceptions import PermissionDenied, ValidationError
+from rest_framework.settings import api_settings
+from django.conf import settings
 from django.contrib.auth.models import User
-from django.db.models import Q
+from django.db.models import Q, Count, OuterRef, Prefetch, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.db import transaction
+from django.http import StreamingHttpResponse
+from django.utils import timezone
+from datetime import timedelta
 
-from .models import Tree, TreeMember, Node, AIMessage
+from .models import Tree, TreeMember, Node, AIMessage, AIBatchJob, TokenUsage
 from .serializers import (
     TreeSerializer,
     TreeMemberSerializer,
     NodeSerializer,
     NodeDetailSerializer,
+    NodeBatchSerializer,
     AIMessageSerializer,
+    AIMessageIngestBatchSerializer,
+    AIBatchJobSerializer,
+    TokenUsageSerializer,
+    TokenUsageQuerySerializer,
+    SearchQuerySerializer,
     UserSerializer,
     TreeInviteSerializer,
 )
-from .permissions import IsTreeMember, CanEditTree, IsTreeOwner
+from .permissions import IsTreeMember, CanEditTree, IsTreeOwner, IsInternalService
+from .roles import can_edit_tree, membership_exists
+from .tree_builder import get_tree_index
+from .batch import apply_node_batch
+from .exports import iter_tree_ndjson
+from .search import search
+from .ingest import ingest_ai_messages
+from .ai_jobs import target_nodes
+from .tasks import run_ai_batch_job
+from . import node_context
+from .renderers import NDJSONRenderer
 
 
 class MeView(generics.RetrieveAPIView):
@@ -35,13 +59,21 @@ class TreeViewSet(viewsets.ModelViewSet):
     def get_queryset(self):
         """Return trees where user is a member."""
         user = self.request.user
+        node_count = Node.objects.filter(
+            tree=OuterRef('pk')
+        ).order_by().values('tree').annotate(count=Count('*')).values('count')
+        
         return Tree.objects.filter(
-            members__user=user
-        ).distinct()
+            membership_exists(user)
+        ).select_related('owner').prefetch_related(
+            Prefetch('members', queryset=TreeMember.objects.select_related('user'))
+        ).annotate(
+            node_count=Coalesce(Subquery(node_count), 0)
+        )
     
     def get_permissions(self):
         """Use different permissions for different actions."""
-        if self.action in ['update', 'partial_update', 'destroy']:
+        if self.action in ['update', 'partial_update', 'destroy', 'batch']:
             permission_classes = [IsAuthenticated, CanEditTree]
         else:
             permission_classes = [IsAuthenticated]
@@ -51,12 +83,45 @@ class TreeViewSet(viewsets.ModelViewSet):
     def nodes(self, request, pk=None):
         """Get all nodes for a tree as nested structure."""
         tree = self.get_object()
-        
-        # Get root nodes (no parent)
-        root_nodes = tree.nodes.filter(parent__isnull=True)
-        serializer = NodeDetailSerializer(root_nodes, many=True, context={'request': request})
+
+        # Load the whole tree in one query and nest it in memory
+        children_index = get_tree_index(tree)
+        root_nodes = children_index.get(None, [])
+        serializer = NodeDetailSerializer(
+            root_nodes,
+            many=True,
+            context={'request': request, 'children_index': children_index}
+        )
         
         return Response(serializer.data)
+    
+    # JSON stays the default so clients asking for it aren't refused (406);
+    # the body is NDJSON either way
+    @action(detail=True, methods=['get'], renderer_classes=api_settings.DEFAULT_RENDERER_CLASSES + [NDJSONRenderer])
+    def export(self, request, pk=None):
+        """Stream every node of a tree as NDJSON (one node per line)."""
+        tree = self.get_object()
+        
+        response = StreamingHttpResponse(
+            iter_tree_ndjson(tree),
+            content_type=NDJSONRenderer.media_type
+        )
+        response['Content-Disposition'] = f'attachment; filename="tree-{tree.id}.ndjson"'
+        # Let proxies pass lines through as they are produced
+        response['X-Accel-Buffering'] = 'no'
+        return response
+    
+    @action(detail=True, methods=['post'], url_path='nodes/batch')
+    def batch(self, request, pk=None):
+        """Apply many node create/update/move/delete operations at once."""
+        # Permission to edit the tree is checked once here, not per node
+        tree = self.get_object()
+        
+        serializer = NodeBatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        result = apply_node_batch(tree, request.user, serializer.validated_data['operations'])
+        return Response(result, status=status.HTTP_200_OK)
 
 
 class TreeInviteView(generics.GenericAPIView):
@@ -110,25 +175,23 @@ class NodeViewSet(viewsets.ModelViewSet):
         """Return nodes from trees where user is a member."""
         user = self.request.user
         return Node.objects.filter(
-            tree__members__user=user
-        ).distinct()
+            membership_exists(user, 'tree')
+        ).defer('search_vector')
     
     def perform_create(self, serializer):
         """Ensure user can edit the tree before creating node."""
         tree = serializer.validated_data['tree']
         
         # Check if user can edit
-        member = TreeMember.objects.filter(
-            tree=tree,
-            user=self.request.user,
-            role__in=['owner', 'editor']
-        ).first()
-        
-        if not member:
+        if not can_edit_tree(self.request, tree):
             from rest_framework.exceptions import PermissionDenied
             raise PermissionDenied("You don't have permission to add nodes to this tree.")
         
         serializer.save()
+    
+    def perform_destroy(self, instance):
+        """Delete the node and its whole subtree in one pass."""
+        instance.subtree().delete()
 
 
 class AIMessageViewSet(viewsets.ModelViewSet):
@@ -140,9 +203,9 @@ class AIMessageViewSet(viewsets.ModelViewSet):
         """Return AI messages from nodes in trees where user is a member."""
         user = self.request.user
         return AIMessage.objects.filter(
-            node__tree__members__user=user
-        ).distinct()
-    
+            membership_exists(user, 'node__tree')
+        ).defer('search_vector')
+
     def perform_create(self, serializer):
         """Save AI message with current user."""
         # Check if request has service token (from FastAPI)
@@ -154,3 +217,178 @@ class AIMessageViewSet(viewsets.ModelViewSet):
         else:
             # Regular user creation
             serializer.save(created_by=self.request.user)
+
+
+class AIBatchJobViewSet(
+    mixins.CreateModelMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    viewsets.GenericViewSet,
+):
+    """
+    Batch AI generation over a tree or subtree, run in the background.
+    
+    Poll a job for progress; ``cancel`` stops it after the calls in flight
+    and ``resume`` continues a cancelled, failed or stalled job.
+    """
+    serializer_class = AIBatchJobSerializer
+    permission_classes = [IsAuthenticated, CanEditTree]
+    
+    def get_queryset(self):
+        """Return jobs on trees where user is a member."""
+        user = self.request.user
+        return AIBatchJob.objects.filter(membership_exists(user, 'tree'))
+    
+    def perform_create(self, serializer):
+        tree = serializer.validated_data['tree']
+        if not can_edit_tree(self.request, tree):
+            raise PermissionDenied("You don't have permission to run AI jobs on this tree.")
+        
+        root = serializer.validated_data.get('root')
+        if AIBatchJob.objects.filter(
+            tree=tree, root=root, status__in=AIBatchJob.ACTIVE_STATUSES
+        ).exists():
+            raise ValidationError({'detail': 'A job for these nodes is already running.'})
+        
+        job = AIBatchJob(tree=tree, root=root)
+        total = target_nodes(job).count()
+        if total > settings.AI_BATCH_MAX_NODES:
+            raise ValidationError(
+                {'detail': f'A job can cover at most {settings.AI_BATCH_MAX_NODES} nodes.'}
+            )
+        
+        job = serializer.save(created_by=self.request.user, total=total)
+        transaction.on_commit(lambda: run_ai_batch_job.delay(job.id))
+    
+    @action(detail=True, methods=['post'])
+    def cancel(self, request, pk=None):
+        job = self.get_object()
+        AIBatchJob.objects.filter(
+            pk=job.pk, status__in=AIBatchJob.ACTIVE_STATUSES
+        ).update(status=AIBatchJob.CANCELLED, finished_at=timezone.now())
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+    
+    @action(detail=True, methods=['post'])
+    def resume(self, request, pk=None):
+        job = self.get_object()
+        stale = timezone.now() - timedelta(seconds=settings.AI_BATCH_STALE_AFTER)
+        resumable = Q(status__in=[AIBatchJob.CANCELLED, AIBatchJob.FAILED]) | Q(
+            status=AIBatchJob.RUNNING, updated_at__lt=stale
+        )
+        # updated_at restarts the stale clock for resume_stale_ai_jobs
+        if not AIBatchJob.objects.filter(resumable, pk=job.pk).update(
+            status=AIBatchJob.PENDING, finished_at=None, updated_at=timezone.now()
+        ):
+            return Response(
+                {'detail': 'Only cancelled, failed or stalled jobs can be resumed.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        run_ai_batch_job.delay(job.id)
+        job.refresh_from_db()
+        return Response(self.get_serializer(job).data)
+
+
+class TokenUsageView(generics.GenericAPIView):
+    """
+    The current user's daily token usage per tree, plus totals.
+    
+    Reads the ``TokenUsage`` rollup; filter with ``?start=``, ``?end=``
+    (inclusive dates) and ``?tree=``.
+    """
+    serializer_class = TokenUsageSerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        query = TokenUsageQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        filters = query.validated_data
+        
+        usage = TokenUsage.objects.filter(user=request.user)
+        if 'start' in filters:
+            usage = usage.filter(day__gte=filters['start'])
+        if 'end' in filters:
+            usage = usage.filter(day__lte=filters['end'])
+        if 'tree' in filters:
+            usage = usage.filter(tree_id=filters['tree'])
+        usage = usage.order_by('-day', 'tree_id')
+        
+        totals = usage.aggregate(
+            messages=Coalesce(Sum('messages'), 0),
+            tokens_in=Coalesce(Sum('tokens_in'), 0),
+            tokens_out=Coalesce(Sum('tokens_out'), 0),
+        )
+        return Response({
+            'totals': totals,
+            'days': self.get_serializer(usage, many=True).data,
+        })
+
+
+class SearchView(generics.GenericAPIView):
+    """
+    Full-text search over the current user's trees.
+    
+    ``?q=`` supports quoted phrases, ``or`` and ``-word``. ``?kind=nodes``
+    (titles and notes, the default) or ``?kind=messages`` (AI responses);
+    narrow with ``?tree=`` and, for messages, ``?type=``. Results are best
+    first with highlighted matches; pass ``next`` back as ``?cursor=``.
+    """
+    serializer_class = SearchQuerySerializer
+    permission_classes = [IsAuthenticated]
+    
+    def get(self, request):
+        query = SearchQuerySerializer(data=request.query_params)
+        query.is_valid(raise_exception=True)
+        return Response(search(request.user, **query.validated_data))
+
+
+class AIMessageIngestView(generics.GenericAPIView):
+    """Bulk-insert AI messages from internal services (service token only)."""
+    serializer_class = AIMessageIngestBatchSerializer
+    authentication_classes = []
+    permission_classes = [IsInternalService]
+    
+    def post(self, request):
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        
+        results = ingest_ai_messages(serializer.validated_data['messages'])
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class NodeContextView(generics.GenericAPIView):
+    """
+    Lean node context for internal services (service token only).
+    
+    Used by FastAPI when the Redis projection is missing; re-projects the
+    node, its parent and children, and its tree's members so the next
+    lookups are served from Redis.
+    Pass ``?user_id=`` to check that the user is a member of the tree.
+    """
+    authentication_classes = []
+    permission_classes = [IsInternalService]
+    queryset = Node.objects.all()
+    
+    def get(self, request, pk):
+        user_id = request.query_params.get('user_id')
+        if user_id is not None and not user_id.isdigit():
+            return Response(
+                {'detail': 'user_id must be an integer.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        
+        node = self.get_object()
+        # Project the parent and children too, which FastAPI reads next
+        neighbours = Node.objects.filter(
+            Q(pk=node.parent_id) | Q(parent=node)
+        ).order_by('sibling_order', 'id')[:settings.NODE_CONTEXT_MAX_CHILDREN + 1]
+        context = node_context.project_nodes([node, *neighbours])[node.id]
+        member_ids = node_context.tree_member_ids(node.tree_id)
+        node_context.write_tree_members(node.tree_id, member_ids)
+        
+        if user_id is not None and int(user_id) not in member_ids:
+            return Response(
+                {'detail': 'User is not a member of this tree.'},
+                status=status.HTTP_403_FORBIDDEN
+            )
+        return Response(context)
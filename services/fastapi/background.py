@@ -0,0 +1,61 @@
+"""
+Hand-off of AI generations to Django's Celery workers.
+
+Long generations (or bulk ones) don't need to hold a request open: the
+endpoint queues ``core.tasks.generate_ai_response_task`` and returns the
+request id at once. The worker publishes its progress to the same Redis
+buffer as live streams, so the client follows it with
+``GET /ai/streams/{request_id}``.
+"""
+from typing import Optional
+import asyncio
+import logging
+import redis
+from celery import Celery
+
+from config import settings
+from redis_client import get_redis
+import sse
+
+logger = logging.getLogger(__name__)
+
+
+GENERATE_TASK = "core.tasks.generate_ai_response_task"
+
+_celery: Optional[Celery] = None
+
+
+def _get_celery() -> Celery:
+    global _celery
+    if _celery is None:
+        _celery = Celery(broker=settings.celery_broker_url or settings.redis_url)
+    return _celery
+
+
+async def submit_generation(
+    request_id: str,
+    user_id,
+    node_id: int,
+    message_type: str,
+    prompt: str,
+    bulk: bool = False,
+):
+    """Queue a generation on the interactive (or bulk) queue."""
+    # Mark it queued first so the stream endpoint can follow it immediately
+    try:
+        meta_key = f"{sse.BUFFER_PREFIX}{request_id}:meta"
+        async with get_redis().pipeline(transaction=True) as pipe:
+            pipe.hset(meta_key, mapping={"user_id": str(user_id), "status": sse.QUEUED})
+            pipe.expire(meta_key, settings.ai_stream_resume_ttl_seconds)
+            await pipe.execute()
+    except redis.RedisError as e:
+        logger.warning(f"Redis error queueing background generation: {e}")
+
+    queue = settings.ai_bulk_queue if bulk else settings.ai_interactive_queue
+    # Publishing to the broker is blocking I/O
+    await asyncio.to_thread(
+        _get_celery().send_task,
+        GENERATE_TASK,
+        args=[node_id, message_type, prompt, user_id, request_id],
+        queue=queue,
+    )
@@ -8,19 +8,98 @@ class Settings(BaseSettings):
     django_base_url: str = "http://django:8000"
     django_service_token: str = "service-token-change-in-prod"
     
+    # Django HTTP connection pool
+    django_http2: bool = True
+    django_max_connections: int = 100
+    django_max_keepalive_connections: int = 20
+    django_keepalive_expiry: float = 30.0
+    django_timeout: float = 10.0
+    django_connect_timeout: float = 5.0
+    
     # JWT Settings
     jwt_secret_key: str = "jwt-secret-key-change-in-prod"
     jwt_algorithm: str = "HS256"
     
     # Redis
     redis_url: str = "redis://redis:6379/0"
+    redis_max_connections: int = 100
+    redis_socket_timeout: float = 2.0
+    
+    # Read node context from Django's Redis projection before calling Django
+    node_context_projection_enabled: bool = True
     
     # AI Provider
-    ai_provider: str = "stub"  # stub, openai, anthropic
+    ai_provider: str = "stub"  # stub, openai, anthropic, router
     ai_api_key: str = ""
+    ai_model: str = ""  # blank uses the provider's default model
+    ai_base_url: str = ""  # blank uses the provider's API; set to use a proxy or mock server
+    ai_anthropic_version: str = "2023-06-01"
+    ai_max_tokens: int = 1024
+    
+    # Provider router (AI_PROVIDER=router): JSON list of backends, e.g.
+    # [{"name": "primary", "provider": "openai", "api_key": "...", "model": "gpt-4o-mini"},
+    #  {"name": "fallback", "provider": "anthropic", "api_key": "..."}]
+    ai_router_backends: list[dict] = []
+    ai_router_hedge_enabled: bool = True
+    ai_router_hedge_percentile: float = 0.95
+    ai_router_hedge_min_delay_ms: int = 250
+    ai_router_hedge_max_delay_ms: int = 3000
+    ai_router_timeout_seconds: float = 30.0
+    ai_router_ewma_alpha: float = 0.2
+    ai_router_latency_window: int = 200
+    
+    # AI provider connection pool and concurrency
+    ai_max_concurrency: int = 32
+    ai_max_connections: int = 100
+    ai_keepalive_expiry: float = 60.0
+    ai_timeout: float = 60.0
+    ai_connect_timeout: float = 5.0
+    
+    # Prompt context assembled from the node's place in its tree
+    ai_context_token_budget: int = 1500
+    ai_context_max_children: int = 20
+    ai_context_max_siblings: int = 20
+    ai_context_summary_tokens: int = 60
+    ai_context_cache_size: int = 1024
+    ai_context_cache_ttl_seconds: float = 60.0
+    
+    # SSE output: chunks are coalesced into one event per window or size
+    ai_stream_coalesce_ms: int = 50
+    ai_stream_max_frame_bytes: int = 2048
+    ai_stream_heartbeat_seconds: float = 15.0
+    ai_stream_resume_ttl_seconds: int = 300  # how long a stream can be resumed
+    # Chunks held for a slow client before the upstream read waits for it,
+    # and how long it may stall before the stream carries on without it
+    ai_stream_relay_queue_size: int = 256
+    ai_stream_client_timeout_seconds: float = 30.0
+    
+    # Background generation on Django's Celery workers (blank broker uses redis_url)
+    celery_broker_url: str = ""
+    ai_interactive_queue: str = "ai_interactive"
+    ai_bulk_queue: str = "ai_bulk"
+    
+    # AI Response Cache
+    ai_cache_enabled: bool = True
+    ai_cache_ttl_seconds: int = 86400
+    ai_cache_message_types: list[str] = ["explain", "summarize"]
+    
+    # Single-flight coalescing of identical concurrent generations
+    ai_singleflight_enabled: bool = True
+    ai_singleflight_lock_ttl_seconds: int = 120
+    ai_singleflight_wait_timeout_seconds: float = 15.0
+    
+    # Write-behind persistence of AI messages
+    ai_message_write_behind: bool = True
+    ai_message_batch_size: int = 100
+    ai_message_flush_interval_ms: int = 500
+    ai_message_retry_idle_ms: int = 30000
+    ai_message_max_retries: int = 5
+    ai_message_queue_maxlen: int = 100000
     
-    # Rate Limiting
+    # Rate Limiting (requests per minute, sliding window; 0 disables a limit)
     rate_limit_per_minute: int = 10
+    rate_limit_endpoint_per_minute: dict[str, int] = {}  # e.g. {"quiz": 5}
+    rate_limit_tree_per_minute: int = 120
     
     class Config:
         env_file = ".env"
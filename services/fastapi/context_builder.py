@@ -0,0 +1,156 @@
+"""
+Hierarchical prompt context for a node.
+
+Besides the node's own title and notes, prompts include where the node
+sits in its tree: the ancestor path, children with a short summary each,
+and sibling titles. Neighbours come from Django's Redis projections in one
+MGET, and everything is ranked and truncated against a token budget so
+large trees can't blow up prompt size.
+
+Assembled contexts are cached in-process per node version. Changes to a
+neighbour alone show up once the entry expires
+(``ai_context_cache_ttl_seconds``).
+"""
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+import json
+import logging
+import time
+import redis
+
+from config import settings
+from redis_client import get_redis
+from tokens import estimate_tokens, truncate_to_tokens
+
+logger = logging.getLogger(__name__)
+
+
+_cache: "OrderedDict[tuple, Tuple[float, str]]" = OrderedDict()
+
+
+async def _load_neighbours(node_data: dict) -> Tuple[Optional[dict], List[dict]]:
+    """Fetch the parent's and children's projections in one round trip."""
+    parent_id = node_data.get("parent")
+    child_ids = [child["id"] for child in node_data.get("children", [])]
+    child_ids = child_ids[:settings.ai_context_max_children]
+
+    keys = [f"node_context:{pk}" for pk in child_ids]
+    if parent_id is not None:
+        keys.append(f"node_context:{parent_id}")
+    if not keys:
+        return None, []
+
+    try:
+        values = await get_redis().mget(keys)
+    except redis.RedisError as e:
+        logger.warning(f"Redis error loading node neighbours: {e}")
+        return None, []
+
+    parent = None
+    if parent_id is not None and values[-1] is not None:
+        parent = json.loads(values.pop())
+    elif parent_id is not None:
+        values.pop()
+
+    # Children without a projection still contribute their title
+    children = []
+    for child, raw in zip(node_data.get("children", []), values):
+        children.append(json.loads(raw) if raw is not None else child)
+    return parent, children
+
+
+def _siblings(node_data: dict, parent: Optional[dict]) -> List[str]:
+    """Sibling titles, nearest in sibling order first."""
+    if parent is None:
+        return []
+    others = parent.get("children", [])
+    position = next(
+        (i for i, child in enumerate(others) if child["id"] == node_data["id"]),
+        len(others),
+    )
+    ranked = sorted(
+        (i for i in range(len(others)) if i != position),
+        key=lambda i: abs(i - position),
+    )
+    return [others[i]["title"] for i in ranked[:settings.ai_context_max_siblings]]
+
+
+def assemble_context(node_data: dict, parent: Optional[dict], children: List[dict]) -> str:
+    """
+    Render node context within ``ai_context_token_budget`` tokens.
+
+    Sections are filled in priority order: title, notes (at most half the
+    budget), ancestor path (nearest ancestors kept), children with
+    summaries, then siblings. Whatever doesn't fit is dropped.
+    """
+    budget = settings.ai_context_token_budget
+    lines = [f"Title: {node_data.get('title', '')}"]
+    remaining = budget - estimate_tokens(lines[0])
+
+    def add(line: str) -> bool:
+        nonlocal remaining
+        cost = estimate_tokens(line) + 1
+        if cost > remaining:
+            return False
+        lines.append(line)
+        remaining -= cost
+        return True
+
+    user_notes = node_data.get("user_notes", "")
+    if user_notes:
+        notes_budget = max(0, min(budget // 2, remaining) - estimate_tokens("Notes: ") - 1)
+        if notes_budget:
+            add(f"Notes: {truncate_to_tokens(user_notes, notes_budget)}")
+
+    ancestors = [a["title"] for a in node_data.get("ancestors", [])]
+    if ancestors:
+        # Drop the farthest ancestors first
+        for start in range(len(ancestors)):
+            kept = ancestors[start:]
+            prefix = "Path: ... > " if start else "Path: "
+            if add(prefix + " > ".join(kept)):
+                break
+
+    if children:
+        child_lines = []
+        for child in children:
+            summary = child.get("user_notes") or child.get("ai_notes") or ""
+            summary = truncate_to_tokens(" ".join(summary.split()), settings.ai_context_summary_tokens)
+            child_lines.append(f"- {child['title']}: {summary}" if summary else f"- {child['title']}")
+        # Only add the heading if at least one child fits under it
+        if estimate_tokens("Subtopics:") + estimate_tokens(child_lines[0]) + 2 <= remaining:
+            add("Subtopics:")
+            for line in child_lines:
+                if not add(line):
+                    break
+
+    siblings = _siblings(node_data, parent)
+    if siblings:
+        kept = []
+        for title in siblings:
+            if estimate_tokens("Related topics: " + ", ".join(kept + [title])) + 1 > remaining:
+                break
+            kept.append(title)
+        if kept:
+            add("Related topics: " + ", ".join(kept))
+
+    return "\n".join(lines) + "\n"
+
+
+async def build_context(node_data: dict) -> str:
+    """Hierarchical context for ``node_data``, cached per node version."""
+    key = (node_data.get("id"), node_data.get("updated_at"), settings.ai_context_token_budget)
+    now = time.monotonic()
+    cached = _cache.get(key)
+    if cached is not None and cached[0] > now:
+        _cache.move_to_end(key)
+        return cached[1]
+
+    parent, children = await _load_neighbours(node_data)
+    context = assemble_context(node_data, parent, children)
+
+    _cache[key] = (now + settings.ai_context_cache_ttl_seconds, context)
+    _cache.move_to_end(key)
+    while len(_cache) > settings.ai_context_cache_size:
+        _cache.popitem(last=False)
+    return context
@@ -1,10 +1,17 @@
-from fastapi import Request, HTTPException, status
+from fastapi import Header, Request, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from jose import jwt, JWTError
-from typing import Optional
+from typing import List, Optional
 from config import settings
+from http_client import get_django_client
+from redis_client import get_redis
 import httpx
+import json
+import logging
 import redis
+import secrets
+
+logger = logging.getLogger(__name__)
 
 
 security = HTTPBearer()
@@ -32,34 +39,75 @@ async def get_current_user(credentials: HTTPAuthorizationCredentials = security)
     return await verify_jwt(credentials)
 
 
+async def require_service_token(x_service_token: Optional[str] = Header(default=None)):
+    """Dependency for internal endpoints: the shared service token is required."""
+    if x_service_token is None or not secrets.compare_digest(
+        x_service_token, settings.django_service_token
+    ):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Internal endpoint")
+
+
+async def _projected_node_context(node_id: int, user_id: int) -> Optional[dict]:
+    """
+    Read the node context projection Django keeps in Redis.
+    
+    Returns None when the node or its tree's members aren't projected.
+    """
+    client = get_redis()
+    try:
+        raw_context = await client.get(f"node_context:{node_id}")
+        if raw_context is None:
+            return None
+        node_data = json.loads(raw_context)
+        raw_members = await client.get(f"tree_members:{node_data['tree']}")
+        if raw_members is None:
+            return None
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading node context: {e}")
+        return None
+    
+    if int(user_id) not in json.loads(raw_members):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="You don't have access to this node"
+        )
+    return node_data
+
+
 async def fetch_node_context(node_id: int, user_id: int) -> dict:
-    """Fetch node context from Django API."""
+    """
+    Fetch node context (title, notes, ancestor titles, tree id).
     
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "X-Service-Token": settings.django_service_token
-        }
-        
-        try:
-            # Fetch node details
-            response = await client.get(
-                f"{settings.django_base_url}/api/nodes/{node_id}/",
-                headers=headers,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            node_data = response.json()
-            
-            # Verify user has access to this node's tree
-            # (Django permissions should handle this, but double-check)
-            
+    Served from Django's Redis projection when present; otherwise from the
+    lean internal endpoint, which also re-projects the node.
+    """
+    if settings.node_context_projection_enabled:
+        node_data = await _projected_node_context(node_id, user_id)
+        if node_data is not None:
             return node_data
-            
-        except httpx.HTTPError as e:
+    
+    client = get_django_client()
+    
+    try:
+        response = await client.get(
+            f"/api/internal/nodes/{node_id}/context/",
+            params={"user_id": user_id}
+        )
+        if response.status_code == status.HTTP_404_NOT_FOUND:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Node not found")
+        if response.status_code == status.HTTP_403_FORBIDDEN:
             raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to fetch node context: {str(e)}"
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="You don't have access to this node"
             )
+        response.raise_for_status()
+        return response.json()
+        
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to fetch node context: {str(e)}"
+        )
 
 
 async def save_ai_message(
@@ -75,66 +123,65 @@ async def save_ai_message(
 ) -> dict:
     """Save AI message to Django API."""
     
-    async with httpx.AsyncClient() as client:
-        headers = {
-            "X-Service-Token": settings.django_service_token,
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "node": node_id,
-            "type": message_type,
-            "prompt": prompt,
-            "response": response,
-            "model_name": model_name,
-            "tokens_in": tokens_in,
-            "tokens_out": tokens_out,
-            "request_id": request_id,
-        }
+    client = get_django_client()
+    
+    data = {
+        "node": node_id,
+        "type": message_type,
+        "prompt": prompt,
+        "response": response,
+        "model_name": model_name,
+        "tokens_in": tokens_in,
+        "tokens_out": tokens_out,
+        "request_id": request_id,
+    }
+    
+    try:
+        response = await client.post("/api/ai-messages/", json=data)
+        response.raise_for_status()
+        return response.json()
         
-        try:
-            response = await client.post(
-                f"{settings.django_base_url}/api/ai-messages/",
-                headers=headers,
-                json=data,
-                timeout=10.0
-            )
-            response.raise_for_status()
-            return response.json()
-            
-        except httpx.HTTPError as e:
-            raise HTTPException(
-                status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-                detail=f"Failed to save AI message: {str(e)}"
-            )
-
-
-# Rate limiting
-redis_client = redis.from_url(settings.redis_url, decode_responses=True)
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save AI message: {str(e)}"
+        )
 
 
-async def check_rate_limit(user_id: int):
-    """Check if user has exceeded rate limit."""
+async def save_ai_messages_bulk(messages: List[dict]) -> List[dict]:
+    """
+    Save many AI messages through Django's bulk ingest endpoint.
+    
+    Each message takes the same arguments as ``save_ai_message``. Returns
+    Django's per-message results (``created``, ``duplicate`` or ``invalid``).
+    """
     
-    key = f"rate_limit:user:{user_id}"
+    client = get_django_client()
+    
+    data = {
+        "messages": [
+            {
+                "node": message["node_id"],
+                "type": message["message_type"],
+                "prompt": message["prompt"],
+                "response": message["response"],
+                "model_name": message["model_name"],
+                "tokens_in": message["tokens_in"],
+                "tokens_out": message["tokens_out"],
+                "request_id": message.get("request_id", ""),
+                "created_by": message.get("user_id"),
+            }
+            for message in messages
+        ]
+    }
     
     try:
-        current = redis_client.get(key)
-        
-        if current is None:
-            redis_client.setex(key, 60, 1)
-            return
-        
-        current = int(current)
-        
-        if current >= settings.rate_limit_per_minute:
-            raise HTTPException(
-                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
-                detail="Rate limit exceeded. Please try again later."
-            )
-        
-        redis_client.incr(key)
+        response = await client.post("/api/internal/ai-messages/bulk/", json=data)
+        response.raise_for_status()
+        return response.json()["results"]
         
-    except redis.RedisError as e:
-        # Log error but don't fail the request
-        print(f"Redis error in rate limiting: {e}")
+    except httpx.HTTPError as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Failed to save AI messages: {str(e)}"
+        )
@@ -0,0 +1,106 @@
+"""
+Shared, pooled HTTP client for calls from the AI service to Django.
+
+One ``httpx.AsyncClient`` is created at app startup and reused by every
+request, so connections (and TLS sessions) to Django are kept alive
+instead of being re-established per call.
+"""
+from typing import Optional
+import httpx
+
+from config import settings
+
+
+_client: Optional[httpx.AsyncClient] = None
+
+_stats = {
+    "requests": 0,
+    "responses": 0,
+    "errors": 0,
+}
+
+
+def http2_available() -> bool:
+    """HTTP/2 needs the optional ``h2`` package."""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+async def _on_request(request: httpx.Request):
+    _stats["requests"] += 1
+
+
+async def _on_response(response: httpx.Response):
+    _stats["responses"] += 1
+    if response.status_code >= 500:
+        _stats["errors"] += 1
+
+
+def create_django_client() -> httpx.AsyncClient:
+    """Build the pooled client used for all Django calls."""
+    return httpx.AsyncClient(
+        base_url=settings.django_base_url,
+        headers={"X-Service-Token": settings.django_service_token},
+        http2=settings.django_http2 and http2_available(),
+        limits=httpx.Limits(
+            max_connections=settings.django_max_connections,
+            max_keepalive_connections=settings.django_max_keepalive_connections,
+            keepalive_expiry=settings.django_keepalive_expiry,
+        ),
+        timeout=httpx.Timeout(
+            settings.django_timeout,
+            connect=settings.django_connect_timeout,
+        ),
+        event_hooks={"request": [_on_request], "response": [_on_response]},
+    )
+
+
+async def start_django_client():
+    """Create the shared client (called from the app lifespan)."""
+    global _client
+    if _client is None:
+        _client = create_django_client()
+
+
+async def close_django_client():
+    """Close pooled connections (called from the app lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_django_client() -> httpx.AsyncClient:
+    """Return the shared client, creating it lazily outside the app lifespan."""
+    global _client
+    if _client is None:
+        _client = create_django_client()
+    return _client
+
+
+def pool_stats() -> dict:
+    """Connection pool and request counters for the metrics endpoint."""
+    stats = {
+        "http2_enabled": settings.django_http2 and http2_available(),
+        "max_connections": settings.django_max_connections,
+        "max_keepalive_connections": settings.django_max_keepalive_connections,
+        **_stats,
+    }
+    
+    if _client is None:
+        return {**stats, "connections": 0, "idle": 0, "active": 0}
+    
+    # httpx doesn't expose pool state publicly; read it from the transport
+    pool = getattr(_client._transport, "_pool", None)
+    connections = list(getattr(pool, "connections", []))
+    idle = sum(1 for connection in connections if connection.is_idle())
+    
+    return {
+        **stats,
+        "connections": len(connections),
+        "idle": idle,
+        "active": len(connections) - idle,
+    }
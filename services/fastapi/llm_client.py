@@ -1,10 +1,31 @@
-from typing import Protocol, AsyncIterator
+"""
+LLM provider clients.
+
+Real providers share one pooled ``httpx.AsyncClient`` per base URL for the
+whole process, so time to first token isn't spent on TCP/TLS setup, and a
+process-wide semaphore caps concurrent upstream generations. Streams are
+read from the socket only as fast as the caller consumes them, so a slow
+SSE client slows the upstream read instead of buffering in memory.
+
+Set ``AI_BASE_URL`` to point a provider at a local mock server.
+"""
+from contextvars import ContextVar
+from typing import Protocol, AsyncIterator, Dict, List, Optional, Tuple
+import asyncio
 import json
+import random
+import re
+import httpx
+
+from config import settings
+from http_client import http2_available
 
 
 class LLMClient(Protocol):
     """Protocol for LLM providers."""
-    
+
+    model_name: str
+
     async def generate(
         self,
         prompt: str,
@@ -14,16 +35,145 @@ class LLMClient(Protocol):
         ...
 
 
+class LLMProviderError(Exception):
+    """The provider rejected the request or the stream broke off."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+class UsageRecord:
+    """Token usage reported by the provider for the current request."""
+
+    def __init__(self):
+        self.input_tokens: Optional[int] = None
+        self.output_tokens: Optional[int] = None
+
+
+_usage: ContextVar[Optional[UsageRecord]] = ContextVar("llm_usage", default=None)
+
+
+def start_usage_record() -> UsageRecord:
+    """Collect provider-reported usage for the current request."""
+    record = UsageRecord()
+    _usage.set(record)
+    return record
+
+
+def _report_usage(input_tokens: Optional[int] = None, output_tokens: Optional[int] = None):
+    record = _usage.get()
+    if record is None:
+        return
+    if input_tokens is not None:
+        record.input_tokens = input_tokens
+    if output_tokens is not None:
+        record.output_tokens = output_tokens
+
+
+_http_clients: Dict[str, httpx.AsyncClient] = {}
+_llm_clients: Dict[Tuple[str, str], "LLMClient"] = {}
+_semaphore: Optional[asyncio.Semaphore] = None
+
+
+def _get_http_client(base_url: str) -> httpx.AsyncClient:
+    """Pooled client for ``base_url``, shared by every request in the process."""
+    client = _http_clients.get(base_url)
+    if client is None:
+        client = httpx.AsyncClient(
+            base_url=base_url,
+            http2=http2_available(),
+            limits=httpx.Limits(
+                max_connections=settings.ai_max_connections,
+                max_keepalive_connections=settings.ai_max_connections,
+                keepalive_expiry=settings.ai_keepalive_expiry,
+            ),
+            # Streams can pause between tokens, so the read timeout is per chunk
+            timeout=httpx.Timeout(settings.ai_timeout, connect=settings.ai_connect_timeout),
+        )
+        _http_clients[base_url] = client
+    return client
+
+
+def _get_semaphore() -> asyncio.Semaphore:
+    global _semaphore
+    if _semaphore is None:
+        _semaphore = asyncio.Semaphore(settings.ai_max_concurrency)
+    return _semaphore
+
+
+async def close_llm_clients():
+    """Close pooled provider connections (called from the app lifespan)."""
+    clients = list(_http_clients.values())
+    _http_clients.clear()
+    _llm_clients.clear()
+    for client in clients:
+        await client.aclose()
+
+
+async def iter_sse_events(response: httpx.Response) -> AsyncIterator[Tuple[str, str]]:
+    """
+    Parse a Server-Sent Events body into ``(event, data)`` pairs.
+
+    Multi-line ``data:`` fields are joined with newlines and comment lines
+    are skipped, per the SSE spec.
+    """
+    event = "message"
+    data = []
+    async for line in response.aiter_lines():
+        if not line:
+            if data:
+                yield event, "\n".join(data)
+            event, data = "message", []
+            continue
+        if line.startswith(":"):
+            continue
+        field, _, value = line.partition(":")
+        if value.startswith(" "):
+            value = value[1:]
+        if field == "event":
+            event = value
+        elif field == "data":
+            data.append(value)
+    if data:
+        yield event, "\n".join(data)
+
+
+async def _raise_for_status(response: httpx.Response):
+    if response.status_code >= 400:
+        body = (await response.aread()).decode(errors="replace")
+        raise LLMProviderError(
+            f"Provider returned {response.status_code}: {body[:500]}",
+            status_code=response.status_code,
+        )
+
+
 class StubLLMClient:
-    """Stub implementation for testing without real API keys."""
-    
+    """
+    Stub implementation for testing without real API keys.
+
+    ``latency_ms`` and ``error_rate`` simulate a slow or flaky provider,
+    e.g. as routed backends.
+    """
+
+    def __init__(self, model_name: str = "stub", latency_ms: int = 0, error_rate: float = 0.0):
+        self.model_name = model_name
+        self.latency_ms = latency_ms
+        self.error_rate = error_rate
+
+    async def _simulate_provider(self):
+        if self.latency_ms:
+            await asyncio.sleep(self.latency_ms / 1000)
+        if self.error_rate and random.random() < self.error_rate:
+            raise LLMProviderError("Simulated stub provider failure", status_code=503)
+
     async def generate(
         self,
         prompt: str,
         stream: bool = False
     ) -> AsyncIterator[str] | str:
         """Generate a stub response."""
-        
+
         response_text = f"""This is a stub AI response for your prompt.
 
 **Prompt received:** {prompt[:100]}...
@@ -40,45 +190,213 @@ In a production environment, this would call a real AI provider like OpenAI or A
 - Step-by-step breakdowns
 - Relevant examples
 """
-        
+
         if stream:
             async def stream_response():
-                words = response_text.split()
-                for i, word in enumerate(words):
-                    if i > 0:
-                        yield " "
-                    yield word
-                    
+                await self._simulate_provider()
+                # Word-sized chunks, keeping newlines like real providers do
+                for piece in re.findall(r"\s+|\S+", response_text):
+                    yield piece
+
             return stream_response()
         else:
+            await self._simulate_provider()
             return response_text
 
 
-class OpenAIClient:
-    """OpenAI implementation (placeholder)."""
-    
-    def __init__(self, api_key: str):
+class _HTTPLLMClient:
+    """Shared request/stream plumbing for HTTP providers."""
+
+    default_base_url = ""
+    default_model = ""
+    path = ""
+
+    def __init__(self, api_key: str, model_name: str = "", base_url: str = ""):
         self.api_key = api_key
-    
+        self.model_name = model_name or self.default_model
+        self.http = _get_http_client(base_url or self.default_base_url)
+
+    def headers(self) -> dict:
+        raise NotImplementedError
+
+    def payload(self, prompt: str, stream: bool) -> dict:
+        raise NotImplementedError
+
+    def parse_response(self, body: dict) -> str:
+        raise NotImplementedError
+
+    def parse_event(self, event: str, data: str) -> Optional[str]:
+        """Return the text delta in an SSE event, or None if it carries none."""
+        raise NotImplementedError
+
+    def is_final_event(self, event: str, data: str) -> bool:
+        raise NotImplementedError
+
     async def generate(
         self,
         prompt: str,
         stream: bool = False
     ) -> AsyncIterator[str] | str:
-        """Generate using OpenAI."""
-        # TODO: Implement OpenAI integration
-        # from openai import AsyncOpenAI
-        raise NotImplementedError("OpenAI integration not yet implemented")
+        if stream:
+            return self._stream(prompt)
 
+        async with _get_semaphore():
+            try:
+                response = await self.http.post(
+                    self.path, headers=self.headers(), json=self.payload(prompt, stream=False)
+                )
+            except httpx.HTTPError as e:
+                raise LLMProviderError(f"Provider request failed: {e!r}") from e
+            await _raise_for_status(response)
+            return self.parse_response(response.json())
+
+    async def _stream(self, prompt: str) -> AsyncIterator[str]:
+        # Held until the stream is exhausted or the consumer goes away
+        async with _get_semaphore():
+            try:
+                async with self.http.stream(
+                    "POST", self.path, headers=self.headers(), json=self.payload(prompt, stream=True)
+                ) as response:
+                    await _raise_for_status(response)
+                    async for event, data in iter_sse_events(response):
+                        if self.is_final_event(event, data):
+                            return
+                        delta = self.parse_event(event, data)
+                        if delta:
+                            yield delta
+            except httpx.HTTPError as e:
+                raise LLMProviderError(f"Provider stream failed: {e!r}") from e
+        raise LLMProviderError("Provider stream ended without a final event")
+
+
+class OpenAIClient(_HTTPLLMClient):
+    """OpenAI-compatible chat completions API."""
+
+    default_base_url = "https://api.openai.com/v1"
+    default_model = "gpt-4o-mini"
+    path = "/chat/completions"
+
+    def headers(self) -> dict:
+        return {"Authorization": f"Bearer {self.api_key}"}
+
+    def payload(self, prompt: str, stream: bool) -> dict:
+        payload = {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings.ai_max_tokens,
+            "stream": stream,
+        }
+        if stream:
+            # Ask for a final chunk with token usage
+            payload["stream_options"] = {"include_usage": True}
+        return payload
+
+    def _report(self, usage: Optional[dict]):
+        if usage:
+            _report_usage(usage.get("prompt_tokens"), usage.get("completion_tokens"))
+
+    def parse_response(self, body: dict) -> str:
+        self._report(body.get("usage"))
+        return body["choices"][0]["message"]["content"] or ""
+
+    def is_final_event(self, event: str, data: str) -> bool:
+        return data == "[DONE]"
+
+    def parse_event(self, event: str, data: str) -> Optional[str]:
+        chunk = json.loads(data)
+        if "error" in chunk:
+            raise LLMProviderError(f"Provider error: {chunk['error']}")
+        self._report(chunk.get("usage"))
+        choices = chunk.get("choices") or [{}]
+        return (choices[0].get("delta") or {}).get("content")
+
+
+class AnthropicClient(_HTTPLLMClient):
+    """Anthropic-compatible messages API."""
+
+    default_base_url = "https://api.anthropic.com"
+    default_model = "claude-3-5-haiku-latest"
+    path = "/v1/messages"
+
+    def headers(self) -> dict:
+        return {
+            "x-api-key": self.api_key,
+            "anthropic-version": settings.ai_anthropic_version,
+        }
+
+    def payload(self, prompt: str, stream: bool) -> dict:
+        return {
+            "model": self.model_name,
+            "messages": [{"role": "user", "content": prompt}],
+            "max_tokens": settings.ai_max_tokens,
+            "stream": stream,
+        }
+
+    def parse_response(self, body: dict) -> str:
+        usage = body.get("usage") or {}
+        _report_usage(usage.get("input_tokens"), usage.get("output_tokens"))
+        return "".join(
+            block.get("text", "") for block in body.get("content", []) if block.get("type") == "text"
+        )
+
+    def is_final_event(self, event: str, data: str) -> bool:
+        return event == "message_stop"
+
+    def parse_event(self, event: str, data: str) -> Optional[str]:
+        if event == "error":
+            raise LLMProviderError(f"Provider error: {data}")
+        if event == "message_start":
+            usage = json.loads(data).get("message", {}).get("usage") or {}
+            _report_usage(usage.get("input_tokens"), usage.get("output_tokens"))
+        elif event == "message_delta":
+            # Cumulative output tokens so far
+            usage = json.loads(data).get("usage") or {}
+            _report_usage(output_tokens=usage.get("output_tokens"))
+        if event != "content_block_delta":
+            return None
+        delta = json.loads(data).get("delta", {})
+        return delta.get("text") if delta.get("type") == "text_delta" else None
+
+
+def create_llm_client(
+    provider: str,
+    api_key: str = "",
+    model: str = "",
+    base_url: str = "",
+    **options,
+) -> LLMClient:
+    """Build a new client for ``provider``."""
 
-def get_llm_client(provider: str, api_key: str = "") -> LLMClient:
-    """Factory function to get the appropriate LLM client."""
-    
     if provider == "stub":
-        return StubLLMClient()
-    elif provider == "openai":
+        return StubLLMClient(model or "stub", **options)
+    elif provider in ("openai", "anthropic"):
         if not api_key:
-            raise ValueError("OpenAI API key required")
-        return OpenAIClient(api_key)
+            raise ValueError(f"{provider} API key required")
+        client_class = OpenAIClient if provider == "openai" else AnthropicClient
+        return client_class(api_key, model, base_url)
+    elif provider == "router":
+        # Imported here because the router builds its backends with this factory
+        from llm_router import RouterLLMClient
+        return RouterLLMClient.from_settings()
     else:
         raise ValueError(f"Unknown AI provider: {provider}")
+
+
+def llm_client_stats() -> List[dict]:
+    """Backend statistics of the clients created so far (never creates one)."""
+    stats = []
+    for client in list(_llm_clients.values()):
+        if hasattr(client, "stats"):
+            stats.extend(client.stats())
+    return stats
+
+
+def get_llm_client(provider: str, api_key: str = "") -> LLMClient:
+    """Return the process-wide client for ``provider``, creating it once."""
+
+    key = (provider, api_key)
+    client = _llm_clients.get(key)
+    if client is None:
+        client = create_llm_client(provider, api_key, settings.ai_model, settings.ai_base_url)
+        _llm_clients[key] = client
+    return client
@@ -0,0 +1,289 @@
+"""
+Routing LLM client with hedged requests and failover.
+
+``RouterLLMClient`` implements the ``LLMClient`` protocol over several
+backends (any provider ``create_llm_client`` can build, including the
+stub). Each backend keeps EWMAs of its latency and error rate, and
+backends are tried fastest-healthy first:
+
+- If the first backend hasn't answered (or, when streaming, produced its
+  first token) within its recent latency percentile, the request is
+  hedged to the next backend. Whichever answers first wins and the other
+  is cancelled.
+- Errors and timeouts before a response fail over to the next backend.
+  Once a stream has yielded chunks it can't switch, so later errors are
+  raised.
+
+Every decision is appended to the current request's ``RouteLog``.
+"""
+from collections import deque
+from contextvars import ContextVar
+from typing import AsyncIterator, List, Optional
+import asyncio
+import json
+import logging
+import time
+
+from config import settings
+from llm_client import LLMClient, LLMProviderError, create_llm_client
+
+logger = logging.getLogger(__name__)
+
+
+class RouteLog:
+    """Routing decisions made for one request."""
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.events: List[dict] = []
+        self.winner: Optional["Backend"] = None
+
+    def record(self, event: str, backend: "Backend", **details):
+        self.events.append({
+            "event": event,
+            "backend": backend.name,
+            "elapsed_ms": round((time.monotonic() - self.started) * 1000, 1),
+            **details,
+        })
+
+    @property
+    def model_name(self) -> Optional[str]:
+        return self.winner.client.model_name if self.winner else None
+
+
+_route_log: ContextVar[Optional[RouteLog]] = ContextVar("route_log", default=None)
+
+
+def start_route_log() -> RouteLog:
+    """Begin recording routing decisions for the current request."""
+    log = RouteLog()
+    _route_log.set(log)
+    return log
+
+
+def report(request_id: str, log: RouteLog):
+    """Log the routing decisions made for a request, if it was routed."""
+    if log.events:
+        logger.info(f"AI routing for {request_id}: {json.dumps(log.events)}")
+
+
+def _current_log() -> RouteLog:
+    # Requests that didn't start a log still route; decisions are just dropped
+    return _route_log.get() or RouteLog()
+
+
+class Backend:
+    """A routed client plus its live latency and error statistics."""
+
+    def __init__(self, name: str, client: LLMClient):
+        self.name = name
+        self.client = client
+        self.latency_ewma: Optional[float] = None
+        self.error_ewma = 0.0
+        self.latencies = deque(maxlen=settings.ai_router_latency_window)
+        self.requests = 0
+        self.failures = 0
+
+    def record_success(self, latency: float):
+        alpha = settings.ai_router_ewma_alpha
+        self.requests += 1
+        self.latencies.append(latency)
+        self.latency_ewma = latency if self.latency_ewma is None else (
+            alpha * latency + (1 - alpha) * self.latency_ewma
+        )
+        self.error_ewma = (1 - alpha) * self.error_ewma
+
+    def record_cancelled(self, elapsed: float):
+        """A hedge loser took at least ``elapsed``; use that as a latency sample."""
+        alpha = settings.ai_router_ewma_alpha
+        self.latency_ewma = elapsed if self.latency_ewma is None else (
+            alpha * max(elapsed, self.latency_ewma) + (1 - alpha) * self.latency_ewma
+        )
+
+    def record_failure(self, new_request: bool = True):
+        alpha = settings.ai_router_ewma_alpha
+        self.requests += new_request
+        self.failures += 1
+        self.error_ewma = alpha + (1 - alpha) * self.error_ewma
+
+    def score(self) -> float:
+        """Expected latency, counting each error as a full timeout."""
+        return (self.latency_ewma or 0.0) + self.error_ewma * settings.ai_router_timeout_seconds
+
+    def hedge_delay(self) -> float:
+        """Seconds to wait on this backend before hedging to the next one."""
+        low = settings.ai_router_hedge_min_delay_ms / 1000
+        high = settings.ai_router_hedge_max_delay_ms / 1000
+        if not self.latencies:
+            return high
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, int(len(ordered) * settings.ai_router_hedge_percentile))
+        return min(high, max(low, ordered[index]))
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "model": self.client.model_name,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1) if self.latency_ewma is not None else None,
+            "error_ewma": round(self.error_ewma, 3),
+            "hedge_delay_ms": round(self.hedge_delay() * 1000, 1),
+            "requests": self.requests,
+            "failures": self.failures,
+        }
+
+
+class RouterLLMClient:
+    """``LLMClient`` that spreads requests over several backends."""
+
+    def __init__(self, backends: List[Backend]):
+        if not backends:
+            raise ValueError("The router needs at least one backend (AI_ROUTER_BACKENDS)")
+        self.backends = backends
+        self.model_name = "router"
+
+    @classmethod
+    def from_settings(cls) -> "RouterLLMClient":
+        backends = []
+        for i, config in enumerate(settings.ai_router_backends):
+            options = dict(config)
+            name = options.pop("name", None) or f"{options.get('provider')}-{i}"
+            backends.append(Backend(name, create_llm_client(**options)))
+        return cls(backends)
+
+    def ranked(self) -> List[Backend]:
+        return sorted(self.backends, key=lambda backend: backend.score())
+
+    def stats(self) -> List[dict]:
+        return [backend.stats() for backend in self.backends]
+
+    async def generate(
+        self,
+        prompt: str,
+        stream: bool = False
+    ) -> AsyncIterator[str] | str:
+        if stream:
+            return self._generate_stream(prompt)
+        _, result = await self._race(prompt, self._call)
+        return result
+
+    async def _call(self, backend: Backend, prompt: str) -> str:
+        """Full (non-streamed) response from one backend."""
+        start = time.monotonic()
+        try:
+            result = await asyncio.wait_for(
+                backend.client.generate(prompt, stream=False),
+                timeout=settings.ai_router_timeout_seconds,
+            )
+        except asyncio.CancelledError:
+            backend.record_cancelled(time.monotonic() - start)
+            raise
+        except Exception:
+            backend.record_failure()
+            raise
+        backend.record_success(time.monotonic() - start)
+        return result
+
+    async def _open_stream(self, backend: Backend, prompt: str):
+        """Start a stream on one backend and wait for its first chunk."""
+        start = time.monotonic()
+        try:
+            chunks = (await backend.client.generate(prompt, stream=True)).__aiter__()
+            try:
+                first = await asyncio.wait_for(
+                    chunks.__anext__(), timeout=settings.ai_router_timeout_seconds
+                )
+            except StopAsyncIteration:
+                first = None
+        except asyncio.CancelledError:
+            backend.record_cancelled(time.monotonic() - start)
+            raise
+        except Exception:
+            backend.record_failure()
+            raise
+        # Time to first token is what hedging should beat
+        backend.record_success(time.monotonic() - start)
+        return chunks, first
+
+    async def _race(self, prompt: str, attempt):
+        """
+        Run ``attempt(backend, prompt)`` on the best backend, hedging and
+        failing over to the next ones. Returns the winning backend and the
+        first successful result.
+        """
+        log = _current_log()
+        order = self.ranked()
+        pending = {}
+        launched = 0
+        hedged = False
+        errors = []
+
+        def launch(reason: str):
+            nonlocal launched
+            backend = order[launched]
+            launched += 1
+            pending[asyncio.create_task(attempt(backend, prompt))] = backend
+            log.record("start", backend, reason=reason)
+
+        launch("primary")
+        try:
+            while pending:
+                has_spare = launched < len(order)
+                can_hedge = settings.ai_router_hedge_enabled and not hedged and has_spare
+                # Hedge on the delay of the backend being waited on, which
+                # after a failover isn't the first one
+                timeout = None
+                if can_hedge and len(pending) == 1:
+                    timeout = next(iter(pending.values())).hedge_delay()
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+                if not done:
+                    hedged = True
+                    launch("hedge")
+                    continue
+
+                for task in done:
+                    backend = pending.pop(task)
+                    error = task.exception()
+                    if error is None:
+                        log.winner = backend
+                        log.record("win", backend)
+                        return backend, task.result()
+                    errors.append(error)
+                    log.record("error", backend, error=repr(error))
+
+                    if launched < len(order):
+                        launch("failover")
+        finally:
+            for task, backend in pending.items():
+                task.cancel()
+                log.record("cancel", backend)
+            await self._discard(pending)
+
+        raise LLMProviderError(f"All {len(order)} AI backends failed: {errors[-1]!r}")
+
+    async def _discard(self, tasks):
+        """Wait for cancelled losers and close any stream that opened anyway."""
+        for task in tasks:
+            try:
+                result = await task
+            except BaseException:
+                continue
+            if isinstance(result, tuple):
+                await result[0].aclose()
+
+    async def _generate_stream(self, prompt: str) -> AsyncIterator[str]:
+        backend, (chunks, first) = await self._race(prompt, self._open_stream)
+        try:
+            if first is None:
+                return
+            yield first
+            async for chunk in chunks:
+                yield chunk
+        except LLMProviderError:
+            # Chunks were already sent, so there's no failing over now
+            backend.record_failure(new_request=False)
+            raise
+        finally:
+            await chunks.aclose()
@@ -1,15 +1,45 @@
-from fastapi import FastAPI, Depends, HTTPException
-from fastapi.responses import StreamingResponse
+from fastapi import FastAPI, Depends, Header, HTTPException
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import Optional
+from contextlib import asynccontextmanager
+import asyncio
 import uuid
 
 from config import settings
-from dependencies import get_current_user, fetch_node_context, save_ai_message, check_rate_limit
-from llm_client import get_llm_client
+from dependencies import get_current_user, fetch_node_context, require_service_token
+from message_writer import enqueue_ai_message, writer as message_writer
+from rate_limit import check_rate_limit
+from redis_client import start_redis_client, close_redis_client
+import background
+import context_builder
+import llm_router
+import response_cache
+import singleflight
+import sse
+from tokens import count_tokens_async, preload_encoding
+from llm_client import get_llm_client, close_llm_clients, llm_client_stats, start_usage_record, LLMProviderError
+from http_client import start_django_client, close_django_client, pool_stats
 
-app = FastAPI(title="Study Tree AI Service")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared connection pools on startup and close them on shutdown."""
+    await start_django_client()
+    await start_redis_client()
+    await message_writer.start()
+    # Tokenizer files may be downloaded; keep that off the first request
+    await asyncio.to_thread(preload_encoding, settings.ai_model)
+    yield
+    await sse.close_relays()
+    await message_writer.stop()
+    await close_llm_clients()
+    await close_redis_client()
+    await close_django_client()
+
+
+app = FastAPI(title="Study Tree AI Service", lifespan=lifespan)
 
 # CORS
 app.add_middleware(
@@ -18,13 +48,20 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Request-ID"],
 )
 
 
+# Keep proxies from buffering or caching event streams
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+
 class AIRequest(BaseModel):
     """Request model for AI generation."""
     additional_context: Optional[str] = None
     stream: bool = False
+    # Generate on a Celery worker and follow it via /ai/streams/{request_id}
+    background: bool = False
 
 
 class AIResponse(BaseModel):
@@ -46,6 +83,16 @@ async def root():
     }
 
 
+@app.get("/metrics", dependencies=[Depends(require_service_token)])
+async def metrics():
+    """Connection pool statistics (internal; send ``X-Service-Token``)."""
+    return {
+        "django_pool": pool_stats(),
+        "ai_message_writer": message_writer.stats,
+        "ai_backends": llm_client_stats(),
+    }
+
+
 @app.post("/ai/nodes/{node_id}/explain")
 async def explain_node(
     node_id: int,
@@ -91,6 +138,20 @@ async def summarize_node(
     )
 
 
+@app.get("/ai/streams/{request_id}")
+async def resume_stream(
+    request_id: str,
+    last_event_id: Optional[str] = Header(default=None),
+    current_user: dict = Depends(get_current_user)
+):
+    """Resume a streamed response after the ``Last-Event-ID`` the client got."""
+    offset = int(last_event_id) if last_event_id and last_event_id.isdigit() else 0
+    events = await sse.resume_events(request_id, current_user.get("user_id"), offset)
+    if events is None:
+        raise HTTPException(status_code=404, detail="Stream not found or expired")
+    return StreamingResponse(events, media_type="text/event-stream", headers=SSE_HEADERS)
+
+
 async def generate_ai_response(
     node_id: int,
     message_type: str,
@@ -101,61 +162,141 @@ async def generate_ai_response(
     
     user_id = current_user.get("user_id")
     
-    # Rate limiting
-    await check_rate_limit(user_id)
-    
     # Fetch node context
     node_data = await fetch_node_context(node_id, user_id)
     
-    # Build prompt based on type
-    prompt = build_prompt(message_type, node_data, request.additional_context)
+    # Rate limiting: user, endpoint and tree limits together, once the
+    # node's tree is known
+    await check_rate_limit(user_id, endpoint=message_type, tree_id=node_data.get("tree"))
+    
+    # Build prompt from the node's place in its tree, within the token budget
+    context = await context_builder.build_context(node_data)
+    prompt = build_prompt(message_type, context, request.additional_context)
     
     # Generate response
     llm_client = get_llm_client(settings.ai_provider, settings.ai_api_key)
+    model_name = llm_client.model_name
     
     request_id = str(uuid.uuid4())
+    route_log = llm_router.start_route_log()
+    usage = start_usage_record()
+    # Set once this request calls the provider itself; cache hits and
+    # single-flight followers didn't pay for their response
+    billed = False
+    
+    async def token_counts(response_text: str):
+        """
+        Provider-reported usage when available, else our tokenizer's count;
+        0 when another request paid for the response.
+        """
+        if not billed:
+            return 0, 0
+        used_model = route_log.model_name or model_name
+        tokens_in = usage.input_tokens
+        tokens_out = usage.output_tokens
+        if tokens_in is None:
+            tokens_in = await count_tokens_async(prompt, used_model)
+        if tokens_out is None:
+            tokens_out = await count_tokens_async(response_text, used_model)
+        return tokens_in, tokens_out
+    
+    # Identical requests (same node version, type and prompt) share one key
+    generation_key = response_cache.build_cache_key(
+        message_type, prompt, model_name, str(node_data.get("updated_at", ""))
+    )
+    
+    # Serve repeated prompts for an unchanged node from the response cache
+    cache_key = None
+    cached_response = None
+    if response_cache.is_cacheable(message_type):
+        cache_key = generation_key
+        cached_response = await response_cache.get_cached_response(cache_key)
+    
+    if request.background and cached_response is None:
+        await background.submit_generation(request_id, user_id, node_id, message_type, prompt)
+        return JSONResponse(
+            status_code=202,
+            content={
+                "request_id": request_id,
+                "status": "queued",
+                "stream_url": f"/ai/streams/{request_id}",
+            },
+        )
+    
+    async def upstream_stream():
+        nonlocal billed
+        billed = True
+        async for chunk in await llm_client.generate(prompt, stream=True):
+            yield chunk
+    
+    async def upstream_full():
+        nonlocal billed
+        billed = True
+        yield await llm_client.generate(prompt, stream=False)
     
     if request.stream:
         # Streaming response
-        async def generate_stream():
-            full_response = []
-            async for chunk in await llm_client.generate(prompt, stream=True):
-                full_response.append(chunk)
-                yield f"data: {chunk}\n\n"
+        if cached_response is not None:
+            chunks = response_cache.replay_stream(cached_response)
+        else:
+            # Concurrent identical requests fan out from one upstream stream
+            chunks = singleflight.coalesced_stream(f"stream:{generation_key}", upstream_stream)
+        
+        async def complete(complete_response: str):
+            if cache_key and cached_response is None:
+                await response_cache.set_cached_response(cache_key, complete_response)
+            llm_router.report(request_id, route_log)
+            tokens_in, tokens_out = await token_counts(complete_response)
             
-            # Save complete response to Django
-            complete_response = "".join(full_response)
-            await save_ai_message(
+            # Queue for persistence in Django
+            await enqueue_ai_message(
                 node_id=node_id,
                 message_type=message_type,
                 prompt=prompt,
                 response=complete_response,
-                model_name=f"{settings.ai_provider}-stub",
-                tokens_in=len(prompt.split()),
-                tokens_out=len(complete_response.split()),
+                model_name=route_log.model_name or model_name,
+                tokens_in=tokens_in,
+                tokens_out=tokens_out,
                 user_id=user_id,
                 request_id=request_id
             )
-            
-            yield f"data: [DONE]\n\n"
         
+        # Generation runs on its own so it's saved even if the client leaves
+        relay = sse.Relay(request_id, user_id, chunks, on_complete=complete)
         return StreamingResponse(
-            generate_stream(),
-            media_type="text/event-stream"
+            relay.events(),
+            media_type="text/event-stream",
+            headers=SSE_HEADERS | {"X-Request-ID": request_id},
         )
     else:
         # Non-streaming response
-        response_text = await llm_client.generate(prompt, stream=False)
+        if cached_response is not None:
+            response_text = cached_response
+        else:
+            try:
+                response_text = "".join([
+                    chunk async for chunk in singleflight.coalesced_stream(generation_key, upstream_full)
+                ])
+            except LLMProviderError as e:
+                raise HTTPException(status_code=502, detail=f"AI provider error: {e}")
+            finally:
+                llm_router.report(request_id, route_log)
+            if cache_key:
+                await response_cache.set_cached_response(cache_key, response_text)
+        
+        # The backend that actually answered, when routed
+        model_name = route_log.model_name or model_name
+        tokens_in, tokens_out = await token_counts(response_text)
         
-        # Save to Django
-        ai_message = await save_ai_message(
+        # Queue for persistence in Django
+        await enqueue_ai_message(
             node_id=node_id,
             message_type=message_type,
             prompt=prompt,
             response=response_text,
-            model_name=f"{settings.ai_provider}-stub",
-            tokens_in=len(prompt.split()),
-            tokens_out=len(response_text.split()),
+            model_name=model_name,
+            tokens_in=tokens_in,
+            tokens_out=tokens_out,
             user_id=user_id,
             request_id=request_id
         )
@@ -163,21 +304,15 @@ async def generate_ai_response(
         return AIResponse(
             request_id=request_id,
             response=response_text,
-            model_name=f"{settings.ai_provider}-stub",
-            tokens_in=len(prompt.split()),
-            tokens_out=len(response_text.split())
+            model_name=model_name,
+            tokens_in=tokens_in,
+            tokens_out=tokens_out
         )
 
 
-def build_prompt(message_type: str, node_data: dict, additional_context: Optional[str] = None) -> str:
-    """Build prompt for AI generation."""
-    
-    title = node_data.get("title", "")
-    user_notes = node_data.get("user_notes", "")
+def build_prompt(message_type: str, context: str, additional_context: Optional[str] = None) -> str:
+    """Build prompt for AI generation from assembled node context."""
     
-    context = f"Title: {title}\n"
-    if user_notes:
-        context += f"Notes: {user_notes}\n"
     if additional_context:
         context += f"Additional Context: {additional_context}\n"
     
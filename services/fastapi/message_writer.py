@@ -0,0 +1,213 @@
+"""
+Write-behind persistence of AI messages.
+
+Finished generations are appended to a Redis stream instead of being
+POSTed to Django inline, so clients get ``[DONE]`` as soon as the last
+token is produced. A background writer in each worker reads the stream
+through a consumer group, persists messages in batches and acknowledges
+them only once Django has stored them. Messages left unacknowledged (a
+failed write or a crashed worker) are reclaimed and retried; Django
+de-duplicates on ``request_id`` so retries are safe.
+"""
+from typing import List, Optional
+import asyncio
+import json
+import logging
+import os
+import socket
+import redis
+
+from fastapi import HTTPException
+
+from config import settings
+from dependencies import save_ai_messages_bulk
+from redis_client import get_redis
+
+
+STREAM_KEY = "ai_messages:pending"
+DEAD_LETTER_KEY = "ai_messages:dead"
+GROUP = "ai-message-writers"
+
+# Seconds to wait after an error, doubling up to the maximum
+ERROR_BACKOFF = 1.0
+MAX_ERROR_BACKOFF = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+async def persist_messages(messages: List[dict]) -> List[bool]:
+    """Store a batch of messages in Django. Returns a success flag per message."""
+    try:
+        results = await save_ai_messages_bulk(messages)
+    except HTTPException as e:
+        logger.warning(f"Failed to persist {len(messages)} AI messages: {e.detail}")
+        return [False] * len(messages)
+
+    flags = []
+    for result in results:
+        # Duplicates were stored by an earlier attempt
+        ok = result["status"] in ("created", "duplicate")
+        if not ok:
+            logger.warning(f"Failed to persist AI message {result.get('request_id')}: {result.get('errors')}")
+        flags.append(ok)
+    return flags
+
+
+async def enqueue_ai_message(**message):
+    """Queue an AI message for persistence (same arguments as ``save_ai_message``)."""
+    if not settings.ai_message_write_behind:
+        await save_ai_messages_bulk([message])
+        return
+
+    try:
+        await get_redis().xadd(
+            STREAM_KEY,
+            {"payload": json.dumps(message)},
+            maxlen=settings.ai_message_queue_maxlen,
+            approximate=True,
+        )
+        writer.stats["queued"] += 1
+    except redis.RedisError as e:
+        # Never lose a message because the queue is down: write it inline
+        logger.warning(f"Redis error queueing AI message, saving inline: {e}")
+        await save_ai_messages_bulk([message])
+
+
+class MessageWriter:
+    """Background consumer that drains the pending-message stream."""
+
+    def __init__(self):
+        self.consumer = f"{socket.gethostname()}-{os.getpid()}"
+        self.stats = {"queued": 0, "persisted": 0, "failed": 0, "dead_lettered": 0}
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+
+    async def start(self):
+        if not settings.ai_message_write_behind or self._task is not None:
+            return
+
+        try:
+            await get_redis().xgroup_create(STREAM_KEY, GROUP, id="0", mkstream=True)
+        except redis.ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        except redis.RedisError as e:
+            logger.warning(f"Redis error creating AI message consumer group: {e}")
+
+        self._stopping = False
+        self._spawn()
+
+    def _spawn(self):
+        self._task = asyncio.create_task(self._run())
+        self._task.add_done_callback(self._on_done)
+
+    def _on_done(self, task: asyncio.Task):
+        """Restart the consumer if it died while it should be running."""
+        if task is not self._task or self._stopping or task.cancelled():
+            return
+        logger.error("AI message writer stopped unexpectedly, restarting", exc_info=task.exception())
+        self._spawn()
+
+    async def stop(self):
+        """Stop after draining what is already queued for this worker."""
+        if self._task is None:
+            return
+        self._stopping = True
+        try:
+            await asyncio.wait_for(self._task, timeout=settings.ai_message_flush_interval_ms / 1000 + 5)
+        except asyncio.TimeoutError:
+            self._task.cancel()
+        self._task = None
+
+    async def _run(self):
+        backoff = ERROR_BACKOFF
+        while True:
+            try:
+                await self._reclaim_stale()
+                drained = await self._drain_new()
+                if self._stopping and drained == 0:
+                    return
+                backoff = ERROR_BACKOFF
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # Unacknowledged entries are retried (or dead-lettered) later,
+                # so keep consuming whatever went wrong
+                logger.exception("Error in AI message writer")
+                if self._stopping:
+                    return
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, MAX_ERROR_BACKOFF)
+
+    async def _drain_new(self) -> int:
+        entries = await get_redis().xreadgroup(
+            GROUP,
+            self.consumer,
+            {STREAM_KEY: ">"},
+            count=settings.ai_message_batch_size,
+            block=None if self._stopping else settings.ai_message_flush_interval_ms,
+        )
+        if not entries:
+            return 0
+        batch = entries[0][1]
+        await self._persist_entries(batch)
+        return len(batch)
+
+    async def _reclaim_stale(self):
+        """Retry messages whose delivery was never acknowledged."""
+        client = get_redis()
+        pending = await client.xpending_range(
+            STREAM_KEY,
+            GROUP,
+            min="-",
+            max="+",
+            count=settings.ai_message_batch_size,
+            idle=settings.ai_message_retry_idle_ms,
+        )
+        if not pending:
+            return
+
+        retry_ids = []
+        for entry in pending:
+            if entry["times_delivered"] > settings.ai_message_max_retries:
+                await self._dead_letter(entry["message_id"])
+            else:
+                retry_ids.append(entry["message_id"])
+
+        if retry_ids:
+            claimed = await client.xclaim(
+                STREAM_KEY,
+                GROUP,
+                self.consumer,
+                min_idle_time=settings.ai_message_retry_idle_ms,
+                message_ids=retry_ids,
+            )
+            await self._persist_entries([entry for entry in claimed if entry[1]])
+
+    async def _dead_letter(self, message_id: str):
+        client = get_redis()
+        entries = await client.xrange(STREAM_KEY, min=message_id, max=message_id)
+        if entries:
+            await client.xadd(DEAD_LETTER_KEY, entries[0][1])
+        await client.xack(STREAM_KEY, GROUP, message_id)
+        await client.xdel(STREAM_KEY, message_id)
+        self.stats["dead_lettered"] += 1
+
+    async def _persist_entries(self, entries):
+        if not entries:
+            return
+
+        messages = [json.loads(fields["payload"]) for _, fields in entries]
+        results = await persist_messages(messages)
+
+        done = [entry_id for (entry_id, _), ok in zip(entries, results) if ok]
+        if done:
+            client = get_redis()
+            await client.xack(STREAM_KEY, GROUP, *done)
+            await client.xdel(STREAM_KEY, *done)
+
+        self.stats["persisted"] += len(done)
+        self.stats["failed"] += len(entries) - len(done)
+
+
+writer = MessageWriter()
@@ -0,0 +1,125 @@
+"""
+Atomic sliding-window rate limiting in Redis.
+
+Every limit is a sorted set of request timestamps. A single Lua script
+trims old entries, checks all limits that apply to a request and records
+the request only if every limit has room, so concurrent requests can't
+race past a limit.
+"""
+from typing import List, Optional, Tuple
+import logging
+import uuid
+import redis
+
+from fastapi import HTTPException, status
+
+from config import settings
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+WINDOW_MS = 60_000
+
+# KEYS: one sorted set per limit
+# ARGV: member, then (window_ms, limit) per key
+# Returns {allowed, retry_after_ms, failing_key_index}
+SLIDING_WINDOW_LUA = """
+local t = redis.call('TIME')
+local now = tonumber(t[1]) * 1000 + math.floor(tonumber(t[2]) / 1000)
+local member = ARGV[1]
+
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[i * 2])
+    local limit = tonumber(ARGV[i * 2 + 1])
+    redis.call('ZREMRANGEBYSCORE', key, 0, now - window)
+    if redis.call('ZCARD', key) >= limit then
+        local oldest = redis.call('ZRANGE', key, 0, 0, 'WITHSCORES')
+        local retry_after = window
+        if oldest[2] then
+            retry_after = tonumber(oldest[2]) + window - now
+        end
+        return {0, retry_after, i}
+    end
+end
+
+for i, key in ipairs(KEYS) do
+    local window = tonumber(ARGV[i * 2])
+    redis.call('ZADD', key, now, member)
+    redis.call('PEXPIRE', key, window)
+end
+
+return {1, 0, 0}
+"""
+
+_script = None
+
+
+def _get_script():
+    global _script
+    client = get_redis()
+    # Re-register if the shared client was recreated (e.g. app restart)
+    if _script is None or _script.registered_client is not client:
+        _script = client.register_script(SLIDING_WINDOW_LUA)
+    return _script
+
+
+async def acquire(limits: List[Tuple[str, int]], window_ms: int = WINDOW_MS) -> Tuple[bool, int, Optional[str]]:
+    """
+    Record one request against every ``(key, limit)`` pair atomically.
+
+    Returns ``(allowed, retry_after_ms, failing_key)``.
+    """
+    limits = [(key, limit) for key, limit in limits if limit > 0]
+    if not limits:
+        return True, 0, None
+    
+    args = [uuid.uuid4().hex]
+    for _, limit in limits:
+        args.extend([window_ms, limit])
+    
+    allowed, retry_after, index = await _get_script()(
+        keys=[key for key, _ in limits],
+        args=args,
+    )
+    failing_key = limits[index - 1][0] if index else None
+    return bool(allowed), int(retry_after), failing_key
+
+
+async def _enforce(limits: List[Tuple[str, int]]):
+    try:
+        allowed, retry_after_ms, _ = await acquire(limits)
+    except redis.RedisError as e:
+        # Log error but don't fail the request
+        logger.warning(f"Redis error in rate limiting: {e}")
+        return
+    
+    if not allowed:
+        retry_after = max(1, -(-retry_after_ms // 1000))
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Rate limit exceeded. Please try again later.",
+            headers={"Retry-After": str(retry_after)},
+        )
+
+
+async def check_rate_limit(user_id: int, endpoint: Optional[str] = None, tree_id: Optional[int] = None):
+    """
+    Check the per-user limit and, if configured, the per-user endpoint limit
+    and the limit shared by all users of ``tree_id``.
+    
+    All of them are checked in one script, so a request refused by any
+    limit isn't counted against the others.
+    """
+    limits = [(f"rate_limit:user:{user_id}", settings.rate_limit_per_minute)]
+    
+    if endpoint and endpoint in settings.rate_limit_endpoint_per_minute:
+        limits.append((
+            f"rate_limit:user:{user_id}:endpoint:{endpoint}",
+            settings.rate_limit_endpoint_per_minute[endpoint],
+        ))
+    
+    if tree_id is not None:
+        limits.append((f"rate_limit:tree:{tree_id}", settings.rate_limit_tree_per_minute))
+    
+    await _enforce(limits)
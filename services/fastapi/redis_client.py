@@ -0,0 +1,47 @@
+"""
+Shared asyncio Redis client.
+
+A single connection pool is created at app startup and reused for rate
+limiting, caching and coordination, so nothing blocks the event loop.
+"""
+from typing import Optional
+import redis.asyncio as aioredis
+
+from config import settings
+
+
+_client: Optional[aioredis.Redis] = None
+
+
+def create_redis_client() -> aioredis.Redis:
+    pool = aioredis.ConnectionPool.from_url(
+        settings.redis_url,
+        max_connections=settings.redis_max_connections,
+        socket_timeout=settings.redis_socket_timeout,
+        socket_connect_timeout=settings.redis_socket_timeout,
+        decode_responses=True,
+    )
+    return aioredis.Redis(connection_pool=pool)
+
+
+async def start_redis_client():
+    """Create the shared client (called from the app lifespan)."""
+    global _client
+    if _client is None:
+        _client = create_redis_client()
+
+
+async def close_redis_client():
+    """Close pooled connections (called from the app lifespan)."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
+def get_redis() -> aioredis.Redis:
+    """Return the shared client, creating it lazily outside the app lifespan."""
+    global _client
+    if _client is None:
+        _client = create_redis_client()
+    return _client
@@ -0,0 +1,53 @@
+"""
+Redis cache of AI responses.
+
+Responses are keyed by a hash of the message type, the fully built prompt,
+the provider/model and the node's ``updated_at``, so any edit to the node
+produces a new key and stale answers simply age out via TTL. Eviction
+under memory pressure is left to Redis (``volatile-lru``).
+"""
+from typing import AsyncIterator, Optional
+import hashlib
+import logging
+import re
+import redis
+
+from config import settings
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+KEY_PREFIX = "ai_cache:"
+
+
+def is_cacheable(message_type: str) -> bool:
+    return settings.ai_cache_enabled and message_type in settings.ai_cache_message_types
+
+
+def build_cache_key(message_type: str, prompt: str, model_name: str, node_version: str = "") -> str:
+    digest = hashlib.sha256(
+        "\x1f".join([message_type, settings.ai_provider, model_name, node_version, prompt]).encode()
+    ).hexdigest()
+    return f"{KEY_PREFIX}{digest}"
+
+
+async def get_cached_response(key: str) -> Optional[str]:
+    try:
+        return await get_redis().get(key)
+    except redis.RedisError as e:
+        logger.warning(f"Redis error reading AI cache: {e}")
+        return None
+
+
+async def set_cached_response(key: str, response: str):
+    try:
+        await get_redis().set(key, response, ex=settings.ai_cache_ttl_seconds)
+    except redis.RedisError as e:
+        logger.warning(f"Redis error writing AI cache: {e}")
+
+
+async def replay_stream(response: str) -> AsyncIterator[str]:
+    """Replay a cached response in word-sized chunks, whitespace and newlines intact."""
+    for piece in re.findall(r"\s+|\S+", response):
+        yield piece
@@ -0,0 +1,183 @@
+"""
+Single-flight coalescing of identical AI generations across workers.
+
+The first request for a key takes a Redis lock and becomes the leader: it
+runs the upstream generation and appends every chunk to a Redis stream.
+Concurrent requests for the same key become followers and read that
+stream from the beginning, so late joiners still get the full response
+and every subscriber sees chunks as soon as the leader produces them.
+
+If the leader fails before sending anything, its followers elect a new
+leader among themselves (the same lock), so one of them retries the
+generation for the rest. If Redis is unavailable, or no leader sticks
+after a few elections, followers fall back to generating on their own.
+"""
+from typing import AsyncIterator, Callable
+import logging
+import time
+import uuid
+import redis
+
+from config import settings
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+LOCK_PREFIX = "singleflight:lock:"
+STREAM_PREFIX = "singleflight:stream:"
+
+# How long a finished stream stays readable for followers still catching up
+FINISHED_STREAM_TTL_MS = 30_000
+
+# Leaders tried for one key before a follower generates on its own
+MAX_ELECTIONS = 3
+
+
+class LeaderFailed(Exception):
+    """The leader stopped before finishing the generation."""
+
+
+async def _lead(
+    key: str,
+    generation_id: str,
+    produce: Callable[[], AsyncIterator[str]],
+) -> AsyncIterator[str]:
+    client = get_redis()
+    stream_key = f"{STREAM_PREFIX}{key}:{generation_id}"
+    lock_ttl_ms = settings.ai_singleflight_lock_ttl_seconds * 1000
+    finished = False
+
+    async def publish(fields: dict, ttl_ms: int):
+        # One round trip per chunk
+        async with client.pipeline(transaction=False) as pipe:
+            pipe.xadd(stream_key, fields)
+            pipe.pexpire(stream_key, ttl_ms)
+            await pipe.execute()
+
+    async def release():
+        # Only release the lock if it's still ours
+        if await client.get(f"{LOCK_PREFIX}{key}") == generation_id:
+            await client.delete(f"{LOCK_PREFIX}{key}")
+
+    try:
+        async for chunk in produce():
+            try:
+                await publish({"chunk": chunk}, lock_ttl_ms)
+            except redis.RedisError as e:
+                logger.warning(f"Redis error publishing single-flight chunk: {e}")
+            yield chunk
+        finished = True
+    finally:
+        try:
+            if finished:
+                await publish({"done": "1"}, FINISHED_STREAM_TTL_MS)
+                await release()
+            else:
+                # Free the lock first, so followers that see the error can
+                # elect a new leader right away
+                await release()
+                await publish({"error": "1"}, FINISHED_STREAM_TTL_MS)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error finishing single-flight: {e}")
+
+
+def _poll_ms() -> int:
+    """
+    Longest XREAD block that returns within the shared pool's socket
+    timeout; a longer one fails with a timeout error instead of waiting.
+    """
+    block_ms = int(settings.ai_singleflight_wait_timeout_seconds * 1000)
+    if settings.redis_socket_timeout:
+        block_ms = min(block_ms, int(settings.redis_socket_timeout * 1000) // 2)
+    # 0 would block forever
+    return max(1, block_ms)
+
+
+async def _follow(key: str, generation_id: str) -> AsyncIterator[str]:
+    client = get_redis()
+    stream_key = f"{STREAM_PREFIX}{key}:{generation_id}"
+    poll_ms = _poll_ms()
+    last_id = "0"
+    deadline = time.monotonic() + settings.ai_singleflight_wait_timeout_seconds
+
+    while True:
+        entries = await client.xread({stream_key: last_id}, block=poll_ms, count=100)
+        if not entries:
+            if time.monotonic() < deadline:
+                continue
+            # No progress for a whole wait period: is the leader still alive?
+            if await client.get(f"{LOCK_PREFIX}{key}") == generation_id:
+                deadline = time.monotonic() + settings.ai_singleflight_wait_timeout_seconds
+                continue
+            # It may have finished (and released the lock) just now
+            entries = await client.xread({stream_key: last_id}, count=100)
+            if not entries:
+                raise LeaderFailed(key)
+
+        deadline = time.monotonic() + settings.ai_singleflight_wait_timeout_seconds
+        for entry_id, fields in entries[0][1]:
+            last_id = entry_id
+            if "chunk" in fields:
+                yield fields["chunk"]
+            elif "done" in fields:
+                return
+            else:
+                raise LeaderFailed(key)
+
+
+async def coalesced_stream(
+    key: str,
+    produce: Callable[[], AsyncIterator[str]],
+) -> AsyncIterator[str]:
+    """
+    Yield the chunks of ``produce()``, sharing one upstream generation
+    between all concurrent callers with the same ``key``.
+    """
+    if not settings.ai_singleflight_enabled:
+        async for chunk in produce():
+            yield chunk
+        return
+
+    client = get_redis()
+    lock_key = f"{LOCK_PREFIX}{key}"
+
+    for _ in range(MAX_ELECTIONS):
+        generation_id = uuid.uuid4().hex
+        try:
+            acquired = await client.set(
+                lock_key,
+                generation_id,
+                nx=True,
+                px=settings.ai_singleflight_lock_ttl_seconds * 1000,
+            )
+            leader_id = generation_id if acquired else await client.get(lock_key)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error in single-flight: {e}")
+            break
+
+        if acquired:
+            async for chunk in _lead(key, generation_id, produce):
+                yield chunk
+            return
+
+        if leader_id is None:
+            # The lock was released in between; try to take it
+            continue
+
+        yielded = False
+        try:
+            async for chunk in _follow(key, leader_id):
+                yielded = True
+                yield chunk
+            return
+        except (LeaderFailed, redis.RedisError) as e:
+            # Chunks already sent can't be taken back
+            if yielded:
+                raise
+            if isinstance(e, redis.RedisError):
+                logger.warning(f"Single-flight leader unavailable, generating directly: {e!r}")
+                break
+            logger.warning(f"Single-flight leader failed, electing a new one: {e!r}")
+
+    async for chunk in produce():
+        yield chunk
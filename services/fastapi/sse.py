@@ -0,0 +1,266 @@
+"""
+Server-Sent Events output stage for streamed AI responses.
+
+Provider chunks are often a single word, so writing one SSE event per
+chunk means a write (and a proxy flush) per token. Instead:
+
+- A ``Relay`` runs the generation in its own task, so it finishes (and
+  the message is saved) even if the client disconnects. It also appends
+  the text to a short-lived Redis buffer so a reconnecting client can
+  resume from ``GET /ai/streams/{request_id}``. Celery workers publish
+  background generations to the same buffer. Its queue to the live
+  connection is bounded (``ai_stream_relay_queue_size``), so a slow client
+  slows the upstream read; a client that stops reading for
+  ``ai_stream_client_timeout_seconds`` or disconnects is dropped and the
+  generation finishes into the buffer only.
+- ``frame_events`` coalesces chunks into one event per
+  ``ai_stream_coalesce_ms`` window or ``ai_stream_max_frame_bytes``,
+  splits multi-line text into several ``data:`` lines so newlines survive
+  the framing, and sends a heartbeat comment when the stream is idle.
+
+Event ids are the UTF-8 byte offset of the text sent so far. A client
+that reconnects with ``Last-Event-ID`` gets only the text after it.
+"""
+from typing import AsyncIterator, Awaitable, Callable, Optional, Set
+import asyncio
+import json
+import logging
+import time
+import redis
+
+from config import settings
+from redis_client import get_redis
+
+logger = logging.getLogger(__name__)
+
+
+BUFFER_PREFIX = "ai_stream:"
+
+QUEUED = "queued"  # waiting for a Celery worker (see background.py)
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+
+# Sent after the last frame; clients stop reading here
+DONE_EVENT = "data: [DONE]\n\n"
+
+_relays: Set[asyncio.Task] = set()
+
+
+def format_event(data: str, event_id: Optional[str] = None, event: Optional[str] = None) -> str:
+    """Encode one SSE event, one ``data:`` line per line of ``data``."""
+    lines = []
+    if event:
+        lines.append(f"event: {event}")
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    # The SSE spec treats \r\n, \r and \n all as line breaks
+    for line in data.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        lines.append(f"data: {line}")
+    return "\n".join(lines) + "\n\n"
+
+
+def error_event(message: str) -> str:
+    return format_event(json.dumps({"detail": message}), event="error")
+
+
+def _keys(request_id: str):
+    return f"{BUFFER_PREFIX}{request_id}:text", f"{BUFFER_PREFIX}{request_id}:meta"
+
+
+class _End:
+    """Queue sentinel: the generation finished, with ``error`` if it failed."""
+
+    def __init__(self, error: Optional[str] = None):
+        self.error = error
+
+
+class Relay:
+    """
+    Runs a streamed generation to completion independently of the client.
+
+    Chunks are handed to the live connection through ``queue`` (read with
+    ``events()``) and appended to the request's resume buffer in Redis at
+    most every ``ai_stream_coalesce_ms``.
+    """
+
+    def __init__(
+        self,
+        request_id: str,
+        user_id,
+        chunks: AsyncIterator[str],
+        on_complete: Callable[[str], Awaitable[None]],
+    ):
+        self.request_id = request_id
+        self.user_id = str(user_id)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=settings.ai_stream_relay_queue_size)
+        self.detached = False
+        self.task = asyncio.create_task(self._run(chunks, on_complete))
+        _relays.add(self.task)
+        self.task.add_done_callback(_relays.discard)
+
+    async def _run(self, chunks: AsyncIterator[str], on_complete: Callable[[str], Awaitable[None]]):
+        parts = []
+        unsaved = []
+        last_flush = time.monotonic()
+        interval = settings.ai_stream_coalesce_ms / 1000
+        await self._save([], RUNNING)
+        try:
+            async for chunk in chunks:
+                parts.append(chunk)
+                unsaved.append(chunk)
+                await self._send(chunk)
+                if time.monotonic() - last_flush >= interval:
+                    await self._save(unsaved, RUNNING)
+                    unsaved, last_flush = [], time.monotonic()
+        except Exception as e:
+            logger.exception(f"AI stream {self.request_id} failed: {e!r}")
+            await self._save(unsaved, FAILED)
+            await self._send(_End(error="AI provider error"))
+            return
+
+        await self._save(unsaved, DONE)
+        await self._send(_End())
+        try:
+            await on_complete("".join(parts))
+        except Exception as e:
+            logger.exception(f"Error finishing AI stream {self.request_id}: {e!r}")
+
+    async def _send(self, item):
+        """Hand ``item`` to the live connection, waiting while its queue is full."""
+        if self.detached:
+            return
+        try:
+            await asyncio.wait_for(self.queue.put(item), settings.ai_stream_client_timeout_seconds)
+        except asyncio.TimeoutError:
+            logger.warning(f"AI stream {self.request_id}: client stopped reading, continuing without it")
+            self.detach()
+
+    def detach(self):
+        """Stop feeding the live connection; the generation still finishes."""
+        self.detached = True
+        # Frees a put that's waiting on the full queue
+        while not self.queue.empty():
+            self.queue.get_nowait()
+
+    async def events(self) -> AsyncIterator[str]:
+        """SSE events for the live connection."""
+        try:
+            async for event in frame_events(self.queue):
+                yield event
+        finally:
+            self.detach()
+
+    async def _save(self, chunks, status: str):
+        text_key, meta_key = _keys(self.request_id)
+        ttl = settings.ai_stream_resume_ttl_seconds
+        try:
+            async with get_redis().pipeline(transaction=True) as pipe:
+                if chunks:
+                    pipe.append(text_key, "".join(chunks))
+                    pipe.expire(text_key, ttl)
+                pipe.hset(meta_key, mapping={"user_id": self.user_id, "status": status})
+                pipe.expire(meta_key, ttl)
+                await pipe.execute()
+        except redis.RedisError as e:
+            # Only resuming is affected; the live stream carries on
+            logger.warning(f"Redis error buffering AI stream: {e}")
+
+
+async def frame_events(queue: asyncio.Queue, offset: int = 0) -> AsyncIterator[str]:
+    """
+    Turn chunks from ``queue`` into coalesced SSE events, ending with
+    ``[DONE]`` (or an ``error`` event) when an ``_End`` arrives.
+    """
+    window = settings.ai_stream_coalesce_ms / 1000
+    max_bytes = settings.ai_stream_max_frame_bytes
+    heartbeat = settings.ai_stream_heartbeat_seconds
+    pending = []
+    pending_bytes = 0
+    deadline = None
+
+    def flush() -> str:
+        nonlocal offset, pending, pending_bytes, deadline
+        text = "".join(pending)
+        offset += pending_bytes
+        pending, pending_bytes, deadline = [], 0, None
+        return format_event(text, event_id=str(offset))
+
+    while True:
+        timeout = heartbeat if deadline is None else max(0.0, deadline - time.monotonic())
+        try:
+            item = await asyncio.wait_for(queue.get(), timeout)
+        except asyncio.TimeoutError:
+            # A comment keeps idle connections (and proxies) from timing out
+            yield flush() if pending else ": ping\n\n"
+            continue
+
+        if isinstance(item, _End):
+            if pending:
+                yield flush()
+            yield error_event(item.error) if item.error else DONE_EVENT
+            return
+
+        if not item:
+            continue
+        pending.append(item)
+        pending_bytes += len(item.encode())
+        if deadline is None:
+            deadline = time.monotonic() + window
+        if pending_bytes >= max_bytes:
+            yield flush()
+
+
+async def resume_events(request_id: str, user_id, offset: int) -> Optional[AsyncIterator[str]]:
+    """
+    Events for a buffered stream after byte ``offset``, following it
+    until it finishes. None if there's no such stream for this user.
+    """
+    text_key, meta_key = _keys(request_id)
+    client = get_redis()
+    meta = await client.hgetall(meta_key)
+    if not meta or meta.get("user_id") != str(user_id):
+        return None
+
+    queue: asyncio.Queue = asyncio.Queue()
+    poll = settings.ai_stream_coalesce_ms / 1000
+
+    async def tail():
+        position = offset
+        try:
+            while True:
+                status = await client.hget(meta_key, "status")
+                # GETRANGE counts bytes, which is what event ids are
+                text = await client.getrange(text_key, position, -1)
+                if text:
+                    position += len(text.encode())
+                    queue.put_nowait(text)
+                if status == DONE:
+                    queue.put_nowait(_End())
+                    return
+                if status not in (QUEUED, RUNNING):
+                    queue.put_nowait(_End(error="AI stream is no longer available"))
+                    return
+                await asyncio.sleep(poll)
+        except redis.RedisError as e:
+            logger.warning(f"Redis error resuming AI stream: {e}")
+            queue.put_nowait(_End(error="AI stream is no longer available"))
+
+    async def events():
+        task = asyncio.create_task(tail())
+        try:
+            async for event in frame_events(queue, offset):
+                yield event
+        finally:
+            task.cancel()
+
+    return events()
+
+
+async def close_relays(timeout: float = 10.0):
+    """Give in-flight generations a chance to finish on shutdown."""
+    if not _relays:
+        return
+    _, pending = await asyncio.wait(set(_relays), timeout=timeout)
+    for task in pending:
+        task.cancel()
@@ -0,0 +1,134 @@
+import asyncio
+import os
+import sys
+import time
+
+import fakeredis.aioredis
+import pytest
+
+# Modules are imported flat, as uvicorn runs them from this directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis_client  # noqa: E402
+from config import settings  # noqa: E402
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def fake_redis(monkeypatch):
+    """Make ``get_redis`` return a fakeredis client."""
+    client = fakeredis.aioredis.FakeRedis(decode_responses=True)
+    monkeypatch.setattr(redis_client, "_client", client)
+    return client
+
+
+class BlockingRedisServer:
+    """
+    Just enough of a Redis server (GET/SET and XADD/XREAD over RESP) to
+    make blocking reads really block, which fakeredis doesn't do.
+    """
+
+    def __init__(self):
+        self.values = {}
+        self.streams = {}
+        self.changed = asyncio.Event()
+        self.server = None
+
+    @property
+    def url(self):
+        host, port = self.server.sockets[0].getsockname()[:2]
+        return f"redis://{host}:{port}/0"
+
+    def xadd(self, key, fields):
+        entries = self.streams.setdefault(key, [])
+        entries.append((f"{len(entries) + 1}-0", fields))
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def _after(self, key, last_id):
+        seq = int(last_id.split("-")[0])
+        return [entry for entry in self.streams.get(key, []) if int(entry[0].split("-")[0]) > seq]
+
+    async def _xread(self, args):
+        options = [arg.upper() for arg in args]
+        block = int(args[options.index("BLOCK") + 1]) if "BLOCK" in options else None
+        streams = args[options.index("STREAMS") + 1:]
+        key, last_id = streams[0], streams[1]
+        deadline = time.monotonic() + (block or 0) / 1000
+        while True:
+            entries = self._after(key, last_id)
+            remaining = deadline - time.monotonic()
+            if entries or block is None or remaining <= 0:
+                break
+            try:
+                await asyncio.wait_for(self.changed.wait(), remaining)
+            except asyncio.TimeoutError:
+                pass
+        if not entries:
+            return b"*-1\r\n"
+        reply = [b"*1\r\n*2\r\n", _bulk(key), f"*{len(entries)}\r\n".encode()]
+        for entry_id, fields in entries:
+            reply.append(b"*2\r\n" + _bulk(entry_id) + f"*{len(fields) * 2}\r\n".encode())
+            reply.extend(_bulk(part) for item in fields.items() for part in item)
+        return b"".join(reply)
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                args = []
+                for _ in range(int(line[1:])):
+                    length = int((await reader.readline())[1:])
+                    args.append((await reader.readexactly(length + 2))[:-2].decode())
+                command = args[0].upper()
+                if command == "XREAD":
+                    reply = await self._xread(args[1:])
+                elif command == "GET":
+                    value = self.values.get(args[1])
+                    reply = b"$-1\r\n" if value is None else _bulk(value)
+                elif command == "SET":
+                    self.values[args[1]] = args[2]
+                    reply = b"+OK\r\n"
+                else:
+                    reply = b"+OK\r\n"
+                writer.write(reply)
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, "127.0.0.1", 0)
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+
+def _bulk(value):
+    data = value.encode() if isinstance(value, str) else value
+    return b"$%d\r\n%s\r\n" % (len(data), data)
+
+
+@pytest.fixture
+async def blocking_redis(monkeypatch):
+    """
+    A client built like the app's on ``BlockingRedisServer``, with a short
+    socket timeout so reads blocking longer than that would fail fast.
+    """
+    server = BlockingRedisServer()
+    await server.start()
+    monkeypatch.setattr(settings, "redis_url", server.url)
+    monkeypatch.setattr(settings, "redis_socket_timeout", 0.2)
+    client = redis_client.create_redis_client()
+    monkeypatch.setattr(redis_client, "_client", client)
+    yield server
+    await client.aclose()
+    await server.stop()
@@ -0,0 +1,63 @@
+import asyncio
+
+import pytest
+
+import llm_router
+from config import settings
+from llm_client import LLMProviderError
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClient:
+    def __init__(self, delay=0.0, fail=False):
+        self.model_name = "fake"
+        self.delay = delay
+        self.fail = fail
+    
+    async def generate(self, prompt, stream=False):
+        await asyncio.sleep(self.delay)
+        if self.fail:
+            raise LLMProviderError("down")
+        return prompt
+
+
+def backend(name, client, latency):
+    result = llm_router.Backend(name, client)
+    result.latencies.extend([latency] * 10)
+    result.latency_ewma = latency
+    return result
+
+
+async def test_hedge_delay_follows_failover(monkeypatch):
+    monkeypatch.setattr(settings, "ai_router_hedge_enabled", True)
+    monkeypatch.setattr(settings, "ai_router_hedge_min_delay_ms", 10)
+    monkeypatch.setattr(settings, "ai_router_hedge_max_delay_ms", 1000)
+    # The first backend fails fast; the second needs 0.2s and usually does,
+    # so it must not be hedged after the first one's 10ms
+    router = llm_router.RouterLLMClient([
+        backend("fast", FakeClient(fail=True), 0.01),
+        backend("slow", FakeClient(delay=0.2), 0.5),
+        backend("spare", FakeClient(delay=0.3), 0.6),
+    ])
+    log = llm_router.start_route_log()
+    
+    assert await router.generate("hi") == "hi"
+    
+    assert [(event["event"], event["backend"]) for event in log.events] == [
+        ("start", "fast"), ("error", "fast"), ("start", "slow"), ("win", "slow"),
+    ]
+
+
+async def test_hedges_slow_primary(monkeypatch):
+    monkeypatch.setattr(settings, "ai_router_hedge_enabled", True)
+    monkeypatch.setattr(settings, "ai_router_hedge_min_delay_ms", 10)
+    router = llm_router.RouterLLMClient([
+        backend("stuck", FakeClient(delay=5), 0.01),
+        backend("ok", FakeClient(), 0.02),
+    ])
+    log = llm_router.start_route_log()
+    
+    assert await router.generate("hi") == "hi"
+    assert log.winner.name == "ok"
+    assert ("cancel", "stuck") in [(event["event"], event["backend"]) for event in log.events]
@@ -0,0 +1,77 @@
+import asyncio
+
+import pytest
+
+import message_writer
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def fast_writer(monkeypatch, fake_redis):
+    monkeypatch.setattr(settings, "ai_message_write_behind", True)
+    monkeypatch.setattr(settings, "ai_message_flush_interval_ms", 20)
+    monkeypatch.setattr(message_writer, "ERROR_BACKOFF", 0.01)
+
+    # fakeredis answers a blocking XREADGROUP at once; block like Redis
+    # would, or the writer never yields to the test
+    drain_new = message_writer.MessageWriter._drain_new
+
+    async def blocking_drain_new(self):
+        drained = await drain_new(self)
+        if not drained:
+            await asyncio.sleep(settings.ai_message_flush_interval_ms / 1000)
+        return drained
+
+    monkeypatch.setattr(message_writer.MessageWriter, "_drain_new", blocking_drain_new)
+
+
+async def wait_for(condition, timeout=2.0):
+    deadline = asyncio.get_running_loop().time() + timeout
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "timed out"
+        await asyncio.sleep(0.01)
+
+
+async def test_writer_keeps_consuming_after_an_unexpected_error(monkeypatch, fake_redis):
+    calls = []
+
+    async def persist(messages):
+        calls.append(messages)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+        return [True] * len(messages)
+
+    monkeypatch.setattr(message_writer, "persist_messages", persist)
+    # Retry the failed delivery straight away instead of after 30s idle
+    monkeypatch.setattr(settings, "ai_message_retry_idle_ms", 0)
+    writer = message_writer.MessageWriter()
+    await writer.start()
+    try:
+        await message_writer.get_redis().xadd(message_writer.STREAM_KEY, {"payload": '{"request_id": "r1"}'})
+        await wait_for(lambda: writer.stats["persisted"] == 1)
+        assert calls == [[{"request_id": "r1"}]] * 2
+        assert not writer._task.done()
+    finally:
+        await writer.stop()
+
+
+async def test_writer_task_is_restarted_if_it_dies(monkeypatch):
+    runs = []
+    original = message_writer.MessageWriter._run
+
+    async def run(self):
+        runs.append(1)
+        if len(runs) == 1:
+            raise RuntimeError("killed")
+        await original(self)
+
+    monkeypatch.setattr(message_writer.MessageWriter, "_run", run)
+    writer = message_writer.MessageWriter()
+    await writer.start()
+    try:
+        await wait_for(lambda: len(runs) == 2)
+        assert not writer._task.done()
+    finally:
+        await writer.stop()
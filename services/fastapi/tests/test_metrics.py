@@ -0,0 +1,24 @@
+from fastapi.testclient import TestClient
+
+import llm_client
+from config import settings
+from main import app
+
+client = TestClient(app)
+
+
+def test_metrics_requires_service_token():
+    assert client.get("/metrics").status_code == 403
+    assert client.get("/metrics", headers={"X-Service-Token": "wrong"}).status_code == 403
+
+
+def test_metrics_without_llm_client(monkeypatch):
+    # No client has been created and none can be (no API key)
+    monkeypatch.setattr(settings, "ai_provider", "openai")
+    monkeypatch.setattr(settings, "ai_api_key", "")
+    monkeypatch.setattr(llm_client, "_llm_clients", {})
+    
+    response = client.get("/metrics", headers={"X-Service-Token": settings.django_service_token})
+    
+    assert response.status_code == 200
+    assert response.json()["ai_backends"] == []
@@ -0,0 +1,33 @@
+import pytest
+from fastapi import HTTPException
+
+import rate_limit
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_tree_rejection_does_not_use_user_slot(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_per_minute", 2)
+    monkeypatch.setattr(settings, "rate_limit_endpoint_per_minute", {})
+    monkeypatch.setattr(settings, "rate_limit_tree_per_minute", 1)
+    
+    await rate_limit.check_rate_limit(1, tree_id=10)
+    with pytest.raises(HTTPException) as exc:
+        await rate_limit.check_rate_limit(1, tree_id=10)
+    
+    assert exc.value.status_code == 429
+    assert await fake_redis.zcard("rate_limit:user:1") == 1
+    # The refused request left room for one in another tree
+    await rate_limit.check_rate_limit(1, tree_id=11)
+
+
+async def test_user_limit(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "rate_limit_per_minute", 1)
+    monkeypatch.setattr(settings, "rate_limit_tree_per_minute", 5)
+    
+    await rate_limit.check_rate_limit(2, tree_id=20)
+    with pytest.raises(HTTPException):
+        await rate_limit.check_rate_limit(2, tree_id=21)
+    
+    assert await fake_redis.zcard("rate_limit:tree:21") == 0
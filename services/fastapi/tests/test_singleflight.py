@@ -0,0 +1,67 @@
+import asyncio
+
+import pytest
+
+import singleflight
+from config import settings
+from llm_client import LLMProviderError
+
+pytestmark = pytest.mark.anyio
+
+
+async def collect(stream):
+    return [chunk async for chunk in stream]
+
+
+async def test_followers_share_one_generation(fake_redis):
+    calls = []
+    
+    async def produce():
+        calls.append(1)
+        for chunk in ("a", "b", "c"):
+            await asyncio.sleep(0.01)
+            yield chunk
+    
+    results = await asyncio.gather(*(collect(singleflight.coalesced_stream("k", produce)) for _ in range(3)))
+    
+    assert results == [["a", "b", "c"]] * 3
+    assert len(calls) == 1
+
+
+async def test_followers_elect_a_new_leader(fake_redis, monkeypatch):
+    monkeypatch.setattr(settings, "ai_singleflight_wait_timeout_seconds", 0.05)
+    calls = []
+    
+    async def produce():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        if len(calls) == 1:
+            raise LLMProviderError("upstream down")
+        yield "ok"
+    
+    results = await asyncio.gather(
+        *(collect(singleflight.coalesced_stream("k", produce)) for _ in range(4)),
+        return_exceptions=True,
+    )
+    
+    assert isinstance(results[0], LLMProviderError)
+    assert results[1:] == [["ok"]] * 3
+    # One retry for all followers, not one each
+    assert len(calls) == 2
+
+
+async def test_follower_waits_longer_than_socket_timeout(blocking_redis, monkeypatch):
+    # The leader is quiet for longer than the client's 0.2s socket timeout
+    monkeypatch.setattr(settings, "ai_singleflight_wait_timeout_seconds", 2.0)
+    blocking_redis.values["singleflight:lock:k"] = "leader"
+    stream_key = "singleflight:stream:k:leader"
+    
+    async def quiet_leader():
+        await asyncio.sleep(0.6)
+        blocking_redis.xadd(stream_key, {"chunk": "a"})
+        blocking_redis.xadd(stream_key, {"done": "1"})
+    
+    leader = asyncio.create_task(quiet_leader())
+    
+    assert await collect(singleflight._follow("k", "leader")) == ["a"]
+    await leader
@@ -0,0 +1,53 @@
+import asyncio
+
+import pytest
+
+import sse
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def small_queue(monkeypatch, fake_redis):
+    monkeypatch.setattr(settings, "ai_stream_relay_queue_size", 4)
+    monkeypatch.setattr(settings, "ai_stream_client_timeout_seconds", 0.2)
+
+
+def words(count, produced):
+    async def chunks():
+        for i in range(count):
+            produced.append(i)
+            yield f"w{i} "
+    return chunks()
+
+
+async def test_relay_waits_for_a_slow_client():
+    produced, completed = [], []
+
+    async def on_complete(text):
+        completed.append(text)
+
+    relay = sse.Relay("r1", 1, words(100, produced), on_complete)
+    await asyncio.sleep(0.05)
+    # Nothing read yet: the upstream is held at the queue bound
+    assert len(produced) <= settings.ai_stream_relay_queue_size + 1
+
+    events = [event async for event in relay.events()]
+    await relay.task
+    assert events[-1] == sse.DONE_EVENT
+    assert completed == ["".join(f"w{i} " for i in range(100))]
+
+
+async def test_relay_finishes_without_a_client(fake_redis):
+    produced, completed = [], []
+
+    async def on_complete(text):
+        completed.append(text)
+
+    relay = sse.Relay("r2", 1, words(100, produced), on_complete)
+    await asyncio.wait_for(relay.task, 2)
+    assert relay.detached
+    assert len(produced) == 100
+    assert await fake_redis.hget("ai_stream:r2:meta", "status") == sse.DONE
+    assert len(await fake_redis.get("ai_stream:r2:text")) == len(completed[0])
@@ -0,0 +1,34 @@
+import pytest
+
+import context_builder
+import tokens
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_long_texts_are_counted_off_the_event_loop(monkeypatch):
+    calls = []
+    
+    async def to_thread(func, *args):
+        calls.append(args)
+        return func(*args)
+    
+    monkeypatch.setattr(tokens.asyncio, "to_thread", to_thread)
+    
+    assert await tokens.count_tokens_async("word " * 10) > 0
+    assert calls == []
+    
+    text = "word " * (tokens.OFFLOAD_CHARS // 5 + 1)
+    assert await tokens.count_tokens_async(text, "gpt-4o") == tokens.count_tokens(text, "gpt-4o")
+    assert calls == [(text, "gpt-4o")]
+
+
+def test_notes_skipped_when_title_fills_budget(monkeypatch):
+    monkeypatch.setattr(settings, "ai_context_token_budget", 5)
+    node = {"id": 1, "title": "A title far longer than the budget allows", "user_notes": "Some notes"}
+    
+    context = context_builder.assemble_context(node, None, [])
+    
+    assert "Notes" not in context
+    assert "Some notes" not in context
@@ -0,0 +1,61 @@
+import asyncio
+
+import pytest
+
+import main
+from config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+class FakeClient:
+    model_name = "fake"
+    
+    def __init__(self):
+        self.calls = 0
+    
+    async def generate(self, prompt, stream=False):
+        self.calls += 1
+        await asyncio.sleep(0.05)
+        return "An answer"
+
+
+@pytest.fixture
+def generation(fake_redis, monkeypatch):
+    """Run ``generate_ai_response`` without Django; returns the enqueued messages."""
+    client = FakeClient()
+    saved = []
+    
+    async def fetch_node_context(node_id, user_id):
+        return {"id": node_id, "tree": 1, "title": "Node", "updated_at": "v1"}
+    
+    async def allow(*args, **kwargs):
+        pass
+    
+    async def enqueue_ai_message(**message):
+        saved.append(message)
+    
+    monkeypatch.setattr(main, "fetch_node_context", fetch_node_context)
+    monkeypatch.setattr(main, "check_rate_limit", allow)
+    monkeypatch.setattr(main, "get_llm_client", lambda *args: client)
+    monkeypatch.setattr(main, "enqueue_ai_message", enqueue_ai_message)
+    monkeypatch.setattr(settings, "ai_cache_message_types", ["explain"])
+    monkeypatch.setattr(settings, "ai_cache_enabled", True)
+    
+    async def generate():
+        return await main.generate_ai_response(1, "explain", main.AIRequest(stream=False), {"user_id": 7})
+    
+    generate.client = client
+    generate.saved = saved
+    return generate
+
+
+async def test_only_the_generating_request_reports_tokens(generation):
+    leader, follower = await asyncio.gather(generation(), generation())
+    cached = await generation()
+    
+    assert generation.client.calls == 1
+    billed = [message["tokens_out"] > 0 for message in generation.saved]
+    assert sorted(billed) == [False, False, True]
+    assert (leader.tokens_out > 0) != (follower.tokens_out > 0)
+    assert (cached.tokens_in, cached.tokens_out) == (0, 0)
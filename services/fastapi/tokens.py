@@ -0,0 +1,87 @@
+"""
+Token counting for prompt budgeting and usage accounting.
+
+``estimate_tokens`` is a cheap character-based estimate used where speed
+matters more than accuracy (prompt budgeting). ``count_tokens`` uses the
+model's real tokenizer when the optional ``tiktoken`` package is installed
+and falls back to the estimate otherwise. Provider-reported usage, when
+available, takes precedence over both (see ``llm_client.UsageRecord``).
+
+Encodings are loaded at startup (``preload_encoding``) and long texts are
+tokenized on a worker thread (``count_tokens_async``), so neither blocks
+the event loop.
+"""
+from functools import lru_cache
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 4
+
+# Texts longer than this are tokenized off the event loop
+OFFLOAD_CHARS = 20_000
+
+# Encoding for models tiktoken doesn't know (e.g. Anthropic); close enough
+FALLBACK_ENCODING = "cl100k_base"
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimated number of tokens in ``text``."""
+    if not text:
+        return 0
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+@lru_cache(maxsize=32)
+def _encoding_for(model_name: str):
+    try:
+        import tiktoken
+    except ImportError:
+        return None
+    try:
+        try:
+            return tiktoken.encoding_for_model(model_name)
+        except KeyError:
+            return tiktoken.get_encoding(FALLBACK_ENCODING)
+    except Exception as e:
+        # Encodings are downloaded on first use; offline hosts fall back
+        logger.warning(f"Could not load tokenizer, estimating token counts: {e}")
+        return None
+
+
+def count_tokens(text: str, model_name: str = "") -> int:
+    """Number of tokens in ``text`` for ``model_name``."""
+    if not text:
+        return 0
+    encoding = _encoding_for(model_name)
+    if encoding is None:
+        return estimate_tokens(text)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+async def count_tokens_async(text: str, model_name: str = "") -> int:
+    """``count_tokens`` that runs on a worker thread for long texts."""
+    if text and len(text) > OFFLOAD_CHARS:
+        return await asyncio.to_thread(count_tokens, text, model_name)
+    return count_tokens(text, model_name)
+
+
+def preload_encoding(model_name: str = ""):
+    """Load (and on first use download) the tokenizer for ``model_name``."""
+    _encoding_for(model_name)
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut ``text`` to about ``max_tokens`` tokens, preferring a word boundary."""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    if max_tokens <= 0:
+        return ""
+
+    limit = max_tokens * CHARS_PER_TOKEN - 1
+    cut = text[:limit]
+    boundary = cut.rfind(" ")
+    if boundary > limit * 0.8:
+        cut = cut[:boundary]
+    return cut.rstrip() + "…"